@@ -0,0 +1,158 @@
+"""
+benchmark of the checkoutSvnExternals strategies
+
+Creates a local file:// repository with many small libraries, and checks out
+the same set of pinned externals (defined in .svnExternals.yml) with every
+strategy into a fresh working copy: first an initial checkout, next a resync
+of the unchanged externals. After each run all externals must be checked out,
+without leaving local modifications in the working copy.
+
+    python -m git_svn.benchmarkExternals --externals 200 --jobs 8
+"""
+from __future__ import print_function
+import sys
+import os
+import argparse
+import pathlib
+import subprocess
+import tempfile
+import time
+
+from git_svn.debug import *
+from git_svn import trash
+
+STRATEGIES = ('wrapper', 'svn-externals')
+
+
+def parse_cli_args():
+    """parse the script input arguments"""
+    parser = argparse.ArgumentParser(description=r"""benchmark the checkoutSvnExternals strategies""")
+
+    parser.add_argument("-d", "--debug",
+                    help="enable debug output",
+                    action="store_true")
+
+    parser.add_argument("--externals",
+                        help="number of externals",
+                        type=int,
+                        default=100)
+
+    parser.add_argument("--files",
+                        help="number of files per external",
+                        type=int,
+                        default=10)
+
+    parser.add_argument("-j", "--jobs",
+                        help="number of concurrent jobs of the wrapper strategy",
+                        type=int,
+                        default=4)
+
+    parser.add_argument("--keep",
+                        help="keep the benchmark repository and working copies",
+                        action="store_true")
+
+    args = parser.parse_args()
+
+    # register custom exception handler
+    h = ExceptionHandle(args.debug)
+    sys.excepthook = h.exception_handler
+
+    DebugLog.enabled = args.debug
+    with DebugLogScopedPush("cli arguments:"):
+        DebugLog.print(str(args))
+
+    return args
+
+
+def _run(cmd, cwd=None):
+    DebugLog.print(str(cmd))
+    subprocess.check_call(cmd, cwd=cwd, stdout=subprocess.DEVNULL)
+
+
+def createRepository(root, externals, files):
+    """create a repository with a trunk and `externals` libraries, return its url"""
+    repoPath = os.path.join(root, 'repo')
+    _run(['svnadmin', 'create', repoPath])
+    url = pathlib.Path(repoPath).as_uri()
+
+    tree = os.path.join(root, 'import')
+    os.makedirs(os.path.join(tree, 'trunk'))
+    for i in range(externals):
+        libPath = os.path.join(tree, 'libs', 'lib' + str(i))
+        os.makedirs(libPath)
+        for j in range(files):
+            with open(os.path.join(libPath, 'file{}.txt'.format(j)), 'wt') as f:
+                f.write("lib {} file {}\n".format(i, j) * 100)
+
+    _run(['svn', 'import', '-q', '-m', 'benchmark data', tree, url])
+    return url
+
+
+def createWc(root, url, name, externals):
+    """checkout the trunk and define the pinned externals in its .svnExternals.yml"""
+    wcPath = os.path.join(root, name)
+    _run(['svn', 'checkout', '-q', url + '/trunk', wcPath])
+
+    with open(os.path.join(wcPath, '.svnExternals.yml'), 'wt') as f:
+        f.write("svnRepoUrl: {}\n".format(url))
+        f.write("externals:\n")
+        for i in range(externals):
+            f.write("  - path: ext{}\n".format(i))
+            f.write("    externalDefinition: ^/libs/lib{}@1\n".format(i))
+    return wcPath
+
+
+def timeSync(wcPath, strategy, jobs):
+    """the duration in seconds of a checkoutSvnExternals run"""
+    cmd = [sys.executable, '-c', 'from git_svn.checkoutSvnExternals import main; main()',
+           '--strategy', strategy]
+    if strategy != 'svn-externals':
+        # the svn-externals strategy always syncs all externals in a single svn process
+        cmd += ['--full-sync', '-j', str(jobs)]
+    ts = time.time()
+    _run(cmd, cwd=wcPath)
+    return time.time() - ts
+
+
+def verifySync(wcPath, externals, files):
+    """check that every external is checked out and the working copy has no local modifications"""
+    for i in range(externals):
+        for j in range(files):
+            path = os.path.join(wcPath, 'ext' + str(i), 'file{}.txt'.format(j))
+            if not os.path.isfile(path):
+                raise Exception("external not checked out: " + path)
+
+    cmd = ['svn', 'status', '--quiet', '--depth', 'empty', '--ignore-externals', wcPath]
+    DebugLog.print(str(cmd))
+    status = subprocess.check_output(cmd).decode()
+    if status.strip():
+        raise Exception("the working copy is left modified:\n" + status)
+
+
+def main():
+    args = parse_cli_args()
+
+    root = tempfile.mkdtemp(prefix='git-svn-benchmark-')
+    try:
+        url = createRepository(root, args.externals, args.files)
+
+        print("{} externals of {} files".format(args.externals, args.files))
+        print("{:<15} {:>10} {:>10}".format("strategy", "checkout", "resync"))
+        for strategy in STRATEGIES:
+            wcPath = createWc(root, url, 'wc-' + strategy, args.externals)
+            checkoutDuration = timeSync(wcPath, strategy, args.jobs)
+            verifySync(wcPath, args.externals, args.files)
+            resyncDuration = timeSync(wcPath, strategy, args.jobs)
+            verifySync(wcPath, args.externals, args.files)
+            print("{:<15} {:>9.1f}s {:>9.1f}s".format(strategy, checkoutDuration, resyncDuration), flush=True)
+    finally:
+        if args.keep:
+            print("benchmark data: " + root)
+        else:
+            trash.RemoveTree(root)
+
+    sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
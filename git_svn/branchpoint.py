@@ -0,0 +1,168 @@
+"""
+lookup of the svn branch point of HEAD
+
+The branch point is the most recent git-svn commit (i.e. with a git-svn-id
+trailer) in the first-parent ancestry of HEAD, just like `git svn` itself finds
+the upstream of a branch. The ancestry is walked over a single
+`git cat-file --batch` stream, which stops at the first git-svn commit.
+
+Results are memoized per process and persisted in the git-svn-branchpoint.json
+file of the git dir by HEAD commit. A walk also stops at any commit of which the
+branch point is already known, e.g. the previous HEAD. A HEAD without branch
+point (e.g. in a shallow clone) is only memoized per process, since fetching
+more history can change it.
+
+Like git-svn, the last git-svn-id line of a commit message counts, e.g. a message
+that quotes the id of another commit is still attributed to its own trailer.
+"""
+import json
+import os
+import re
+import subprocess
+import tempfile
+import threading
+
+from git_svn.debug import DebugLog
+from git_svn import gitmeta
+
+# git-svn-id: <url>@<rev> <uuid>
+GIT_SVN_ID_REGEX = re.compile(r"^\s*git-svn-id: (\S+)@([0-9]+) (\S+)\s*$", re.MULTILINE)
+
+BRANCHPOINT_FILE = 'git-svn-branchpoint.json'
+
+# number of HEAD commits of which the branch point is persisted
+MAX_ENTRIES = 256
+
+
+class CommitReader:
+    """reads commits from a `git cat-file --batch` process"""
+
+    def __init__(self):
+        cmd = ['git', 'cat-file', '--batch']
+        DebugLog.print(str(cmd))
+        self._process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def read(self, sha):
+        """return a (parents, message) tuple of the commit, None if it is missing (e.g. a shallow clone)"""
+        self._process.stdin.write(sha.encode() + b'\n')
+        self._process.stdin.flush()
+
+        header = self._process.stdout.readline().decode().split()
+        if len(header) == 2 and header[1] == 'missing':
+            return None
+        if len(header) != 3 or header[1] != 'commit':
+            raise Exception("not a commit: " + sha)
+        data = self._process.stdout.read(int(header[2]) + 1)[:-1].decode('utf-8', errors='replace')
+
+        (headers, sep, message) = data.partition('\n\n')
+        parents = [line[len('parent '):] for line in headers.splitlines() if line.startswith('parent ')]
+        return (parents, message)
+
+    def close(self):
+        self._process.stdin.close()
+        self._process.stdout.close()
+        self._process.wait()
+
+
+class BranchPoints:
+    """the known branch points of a repository by commit sha"""
+
+    _forGitDir = {}
+    _lock = threading.Lock()
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        # HEAD commits without branch point, not persisted
+        self._missing = set()
+        self._lock = threading.RLock()
+        if path is not None and os.path.isfile(path):
+            try:
+                with open(path, 'rt') as f:
+                    self.entries = {k: v for (k, v) in json.load(f).items() if v}
+            except (OSError, ValueError, AttributeError) as e:
+                DebugLog.print("ignoring corrupt branch point file {}: {}".format(path, e))
+
+    @staticmethod
+    def forGitDir(gitDir):
+        """the process wide branch points of a git dir"""
+        key = os.path.normcase(os.path.abspath(gitDir))
+        with BranchPoints._lock:
+            if key not in BranchPoints._forGitDir:
+                BranchPoints._forGitDir[key] = BranchPoints(os.path.join(gitDir, BRANCHPOINT_FILE))
+            return BranchPoints._forGitDir[key]
+
+    def find(self, headSha):
+        """the (git_sha, url, svn_rev, uuid) branch point of a commit, None if there is none"""
+        with self._lock:
+            return self._find(headSha)
+
+    def _find(self, headSha):
+        if headSha in self.entries:
+            return tuple(self.entries[headSha])
+        if headSha in self._missing:
+            return None
+
+        walked = []
+        branchPoint = None
+        with CommitReader() as reader:
+            sha = headSha
+            while sha is not None:
+                if sha in self.entries:
+                    branchPoint = tuple(self.entries[sha])
+                    break
+
+                walked.append(sha)
+                commit = reader.read(sha)
+                if commit is None:
+                    break
+                (parents, message) = commit
+                matches = list(GIT_SVN_ID_REGEX.finditer(message))
+                if matches:
+                    m = matches[-1]
+                    branchPoint = (sha, m.group(1), int(m.group(2)), m.group(3))
+                    break
+                sha = parents[0] if parents else None
+
+        DebugLog.print("branch point of {}: {} ({} commits walked)".format(headSha, branchPoint, len(walked)))
+        if branchPoint is None:
+            self._missing.add(headSha)
+            return None
+
+        self.entries[headSha] = list(branchPoint)
+        self.save()
+        return branchPoint
+
+    def save(self):
+        if self.path is None:
+            return
+
+        # keep the most recently added entries
+        entries = dict(list(self.entries.items())[-MAX_ENTRIES:])
+        try:
+            (fd, tmpPath) = tempfile.mkstemp(dir=os.path.dirname(self.path), prefix='.tmp')
+            with os.fdopen(fd, 'wt') as f:
+                json.dump(entries, f)
+            os.replace(tmpPath, self.path)
+        except OSError as e:
+            DebugLog.print("failed to save the branch points: " + str(e))
+
+
+def _getHeadSha():
+    sha = gitmeta.ResolveRef('HEAD')
+    if sha:
+        return sha
+    cmd = ['git', 'rev-parse', 'HEAD']
+    DebugLog.print(str(cmd))
+    return subprocess.check_output(cmd).decode().strip()
+
+
+def GetBranchPoint(gitDir, headSha=None):
+    """the (git_sha, url, svn_rev, uuid) branch point of HEAD (or headSha), None if there is none"""
+    return BranchPoints.forGitDir(gitDir).find(headSha or _getHeadSha())
@@ -0,0 +1,252 @@
+"""
+persistent on-disk cache for the results of immutable svn queries
+
+The answer of an svn query never changes once all its revisions are pinned,
+e.g. `svn info -r 123 url@123`. Such results are stored in a content addressed
+cache, i.e. one file per query named by the sha1 of the query, such that every
+run (and every tool) only asks the svn server once.
+
+The cache lives in $GIT_SVN_CACHE_DIR, which can be shared between working
+copies and concurrent CI jobs, or else in the git-svn-cache folder of the git dir
+(or .svn folder) of the current working copy. The least recently used entries are
+evicted once the cache grows beyond $GIT_SVN_CACHE_MAX_SIZE bytes.
+"""
+import atexit
+import hashlib
+import json
+import os
+import re
+import subprocess
+import tempfile
+import threading
+
+from git_svn.debug import DebugLog
+from git_svn import wcdb
+from git_svn import gitmeta
+
+DEFAULT_MAX_SIZE = 64 * 1024 * 1024
+
+# number of puts after which the size of the cache is counted again, since
+# other processes sharing the cache directory add entries as well
+RECOUNT_INTERVAL = 256
+
+# the fan-out folders of the entries, other files (e.g. the date and externals
+# indexes next to the entries) are not part of the LRU cache
+_ENTRY_DIR_REGEX = re.compile(r'^[0-9a-f]{2}$')
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+
+class FileLock:
+    """exclusive inter-process lock on a lock file
+
+    usage: `with FileLock(path): ...`
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def __enter__(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._file = open(self.path, 'a+b')
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+        else:
+            self._file.seek(0)
+            msvcrt.locking(self._file.fileno(), msvcrt.LK_LOCK, 1)
+        return self
+
+    def __exit__(self, type, value, traceback):
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        else:
+            self._file.seek(0)
+            msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+        self._file.close()
+        self._file = None
+
+
+_adminDir = {}
+
+def GetAdminDir():
+    """the folder where git-svn keeps local state for the current working copy
+
+    i.e. the git dir of a git repo, or else the .svn folder of an svn working copy.
+    return None if cwd is neither.
+    """
+    cwd = os.getcwd()
+    if cwd not in _adminDir:
+        gitDir = gitmeta.FindGitDir(cwd)
+        if gitDir is not None:
+            _adminDir[cwd] = os.path.abspath(gitDir)
+            return _adminDir[cwd]
+        try:
+            output = subprocess.check_output(['git', 'rev-parse', '--git-dir'], stderr=subprocess.DEVNULL).decode()
+            _adminDir[cwd] = os.path.abspath(output.strip())
+        except (subprocess.CalledProcessError, OSError):
+            wcRoot = wcdb.FindWcRoot(cwd)
+            _adminDir[cwd] = os.path.join(wcRoot, '.svn') if wcRoot is not None else None
+    return _adminDir[cwd]
+
+
+class SvnCache:
+    """content addressed cache of immutable query results
+
+    a cache without a directory is disabled, i.e. every lookup is a miss.
+    """
+
+    _default = None
+
+    def __init__(self, directory, maxSize=DEFAULT_MAX_SIZE):
+        self.directory = directory
+        self.maxSize = maxSize
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # running total of the entry sizes, None until the entries are counted
+        self._size = None
+        self._putsSinceCount = 0
+
+    @staticmethod
+    def default():
+        """the process wide cache as configured by the environment"""
+        if SvnCache._default is None:
+            directory = os.environ.get('GIT_SVN_CACHE_DIR')
+            if not directory:
+                adminDir = GetAdminDir()
+                directory = os.path.join(adminDir, 'git-svn-cache') if adminDir else None
+
+            maxSize = int(os.environ.get('GIT_SVN_CACHE_MAX_SIZE', DEFAULT_MAX_SIZE))
+            SvnCache._default = SvnCache(directory, maxSize)
+            atexit.register(lambda: DebugLog.print(SvnCache._default.stats()))
+        return SvnCache._default
+
+    @staticmethod
+    def key(*parts):
+        """the cache key of a query described by its (json serializable) parts"""
+        return hashlib.sha1(json.dumps(parts).encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, key):
+        """return the cached bytes, None on a cache miss"""
+        if self.directory is None:
+            self._count(False)
+            return None
+
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            # mark the entry as recently used
+            os.utime(path, None)
+        except OSError:
+            self._count(False)
+            return None
+
+        self._count(True)
+        return data
+
+    def put(self, key, data):
+        """store bytes in the cache"""
+        if self.directory is None:
+            return
+
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # write to a temp file first, such that concurrent readers never see a partial entry
+        (fd, tmpPath) = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmpPath, path)
+
+        # only count the entries when the cache might have grown beyond its budget
+        with self._lock:
+            if self._size is not None:
+                self._size += len(data)
+            self._putsSinceCount += 1
+            needsCount = (self._size is None or self._size > self.maxSize
+                          or self._putsSinceCount >= RECOUNT_INTERVAL)
+        if needsCount:
+            self.evict()
+
+    def getOrCompute(self, keyParts, compute):
+        """return the cached bytes of the query, compute() and store them on a cache miss"""
+        key = SvnCache.key(*keyParts)
+        data = self.get(key)
+        if data is None:
+            DebugLog.print("svn cache miss: " + str(keyParts))
+            data = compute()
+            self.put(key, data)
+        return data
+
+    def getJson(self, keyParts):
+        data = self.get(SvnCache.key(*keyParts))
+        return json.loads(data.decode()) if data is not None else None
+
+    def putJson(self, keyParts, value):
+        self.put(SvnCache.key(*keyParts), json.dumps(value).encode())
+
+    def evict(self):
+        """remove the least recently used entries until the cache fits in maxSize"""
+        if self.directory is None:
+            return
+
+        with FileLock(os.path.join(self.directory, '.lock')):
+            entries = self._scanEntries()
+            totalSize = sum(size for (mtime, size, path) in entries)
+
+            if totalSize > self.maxSize:
+                entries.sort()
+                for (mtime, size, path) in entries:
+                    if totalSize <= self.maxSize:
+                        break
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        continue
+                    totalSize -= size
+
+        with self._lock:
+            self._size = totalSize
+            self._putsSinceCount = 0
+
+    def _scanEntries(self):
+        """the (mtime, size, path) of all entries in the fan-out folders"""
+        entries = []
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return entries
+
+        for name in names:
+            folder = os.path.join(self.directory, name)
+            if not _ENTRY_DIR_REGEX.match(name) or not os.path.isdir(folder):
+                continue
+            for f in os.listdir(folder):
+                if f.startswith('.'):
+                    continue
+                path = os.path.join(folder, f)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def stats(self):
+        return "svn cache {}: {} hits, {} misses".format(self.directory, self.hits, self.misses)
@@ -7,6 +7,9 @@ import argparse
 import subprocess
 from xml.etree import ElementTree as ET
 from git_svn import svn,git
+from git_svn import dateindex
+from git_svn import externals
+from git_svn import preflight
 
 if sys.version_info < (3,5):
     print("Script is being run with a too old version of Python. Needs 3.5.")
@@ -31,6 +34,16 @@ http://svnbook.red-bean.com/en/1.7/svn.tour.revs.specifiers.html""")
     parser.add_argument("-N", "--dry-run",
                         help="Do not perform any actions, only simulate them.",
                         action="store_true")
+
+    parser.add_argument("-j", "--jobs",
+                        help="number of externals to checkout/update concurrently",
+                        type=int,
+                        default=1)
+
+    parser.add_argument("--server-jobs",
+                        help="max number of concurrent historic revision lookups per svn server",
+                        type=int,
+                        default=4)
     parser.add_argument('-r', "--revision",
                         help="revision date e.g. {2006-02-17 15:30}")
 
@@ -50,13 +63,13 @@ http://svnbook.red-bean.com/en/1.7/svn.tour.revs.specifiers.html""")
     
     return args
 
-def DeriveHistoricSvnExternals(historicDateRevStr, svnExternal):
-    """Derive historic SvnExternal."""
+def DeriveHistoricSvnExternals(historicDateRevStr, svnExternal, reposRoot=None):
+    """Derive historic SvnExternal.
+
+    externals inside reposRoot are resolved with its local date index."""
     
     # obtain the external head revision at the given time
-    text = subprocess.check_output(['svn', 'info', '--xml','-r', historicDateRevStr , svnExternal.QualifiedUrl])
-    infoXml = ET.fromstring(text)
-    revStr = infoXml.find('entry/commit').get('revision')
+    revStr = svn.ResolveDateRev(svnExternal.QualifiedUrl, historicDateRevStr, reposRoot)
 
     # return copy of svn External with overrules operative and peg revision
     return svn.SvnExternal(svnExternal.hostRepoUrl,
@@ -80,21 +93,31 @@ def main():
     if not args.revision.startswith('{') or not args.revision.endswith('}'):
         raise Exception("invalid date revision : " + args.revision)
 
-    if git.IsGitWc() and git.IsGitWcDirty():
+    checks = preflight.RunPreflight()
+
+    if checks.isGitWc and checks.isGitWcDirty:
         raise Exception("""git working copy is dirty.
 please first commit or stash your local changes so they can't be lost.""")
 
-    if not svn.IsSvnWc():
+    if not checks.isSvnWc:
         raise Exception("cwd is not an svn working copy: " + os.getcwd())
 
-    if svn.IsSvnWcDirty():
+    if checks.isSvnWcDirty:
         raise Exception("""svn working copy is dirty.
 please first commit or shelve your local changes so they can't be lost.""")
 
     # obtain historic commit rev 
-    text = subprocess.check_output(['svn', 'info', '--xml','-r', args.revision])
-    infoXml = ET.fromstring(text)
-    rev = infoXml.find('entry').get('revision')
+    reposRoot = svn.GetSvnRepoUrl()
+    date = dateindex.NormalizeSvnDate(args.revision)
+    rev = None
+    if date is not None:
+        rev = dateindex.SvnDateIndex.forRepo(reposRoot).RevAtDate(date)
+    if rev is not None:
+        rev = str(rev)
+    else:
+        text = subprocess.check_output(['svn', 'info', '--xml','-r', args.revision])
+        infoXml = ET.fromstring(text)
+        rev = infoXml.find('entry').get('revision')
 
     print("update to rev: "+ rev)
 
@@ -103,7 +126,7 @@ please first commit or shelve your local changes so they can't be lost.""")
         sys.exit(0)
 
     # update WC
-    if git.IsGitSvnRepo():
+    if checks.isGitSvnRepo:
         commit_sha = git.GetAssociatedGitShaForSvnRev(int(rev))
         git.checkout(commit_sha)   
     else:
@@ -112,23 +135,18 @@ please first commit or shelve your local changes so they can't be lost.""")
     # do historic checkout for each of the externals
     # obtains externals for current WC
     externalDefinitions = []
-    if git.IsGitSvnRepo():
+    if checks.isGitSvnRepo:
         externalDefinitions = git.GetSvnExternalsFromGitSvnBridge()
     else:
         externalDefinitions = svn.GetSvnExternalsFromLocalSvnWc()
     print("#externals: " + str(len(externalDefinitions)))
 
-    # generate the list of historic externals
-    historicExternals = []
-    for d  in externalDefinitions:
-        print(d.svnWCFolderPath + " : " + str(d))
-        historicExternal = DeriveHistoricSvnExternals(args.revision, d)
-        print("  -> " + str(historicExternal))
-        historicExternals.append(historicExternal)
-
-    # checkout/update the historic externals in the SVN WC
-    for externalDef in historicExternals:
-        print(externalDef.svnWCFolderPath + " " + str(externalDef))
-        svn.checkoutSvnExternal(externalDef)               
+    # derive the historic externals concurrently and check them out as soon as they are known
+    succeeded = externals.CheckoutDerivedExternals(externalDefinitions,
+                                                   lambda d: DeriveHistoricSvnExternals(args.revision, d, reposRoot),
+                                                   jobs=args.jobs,
+                                                   jobsPerServer=args.server_jobs)
+    if not succeeded:
+        sys.exit(1)
 
     sys.exit(0)
@@ -3,10 +3,11 @@ import sys
 import os
 from git_svn.debug import *
 import argparse
-import subprocess
 from xml.etree import ElementTree as ET
 from git_svn.git import *
 from git_svn.svn import *
+from git_svn import dateindex
+from git_svn import externals
 
 if sys.version_info < (3,5):
     print("Script is being run with a too old version of Python. Needs 3.5.")
@@ -31,6 +32,16 @@ def parse_cli_args():
                         help="Do not perform any actions, only simulate them.",
                         action="store_true")
 
+    parser.add_argument("-j", "--jobs",
+                        help="number of externals to checkout/update concurrently",
+                        type=int,
+                        default=1)
+
+    parser.add_argument("--server-jobs",
+                        help="max number of concurrent historic revision lookups per svn server",
+                        type=int,
+                        default=4)
+
     args = parser.parse_args()
 
 
@@ -54,15 +65,16 @@ def DeriveHistoricSvnExternals(historicRev:int, svnExternal):
     external HEAD revision at the time of `historicRev`. """
     # obtain dateRev specifier of the historic Revision
     assert type(svnExternal) is  SvnExternal
-    text = subprocess.check_output(['svn', 'info', '--xml','-r', str(historicRev), svnExternal.hostRepoUrl])
-    infoXml = ET.fromstring(text)
-    dateRevStr = infoXml.find('entry/commit/date').text
+    reposRoot = GetReposRootForUrl(svnExternal.hostRepoUrl)
+    dateRevStr = dateindex.SvnDateIndex.forRepo(reposRoot).DateOfRev(historicRev)
+    if dateRevStr is None:
+        text = GetPinnedSvnInfoXml(svnExternal.hostRepoUrl, historicRev)
+        infoXml = ET.fromstring(text)
+        dateRevStr = infoXml.find('entry/commit/date').text
     dateRevStr = '{' + dateRevStr + '}'
     
     # obtain the external head revision at the given time
-    text = subprocess.check_output(['svn', 'info', '--xml','-r', dateRevStr , svnExternal.QualifiedUrl])
-    infoXml = ET.fromstring(text)
-    revStr = infoXml.find('entry/commit').get('revision')
+    revStr = ResolveDateRev(svnExternal.QualifiedUrl, dateRevStr, reposRoot)
 
     # return copy of svn External with overrules operative and peg revision
     return SvnExternal(svnExternal.hostRepoUrl,
@@ -91,21 +103,13 @@ def main():
 
     print("#externals: " + str(len(externalDefinitions)))
 
-    # generate the list of historic externals
-    historicExternals = []
-    for d  in externalDefinitions:
-        print(d.svnWCFolderPath + " : " + str(d))
-        historicExternal = DeriveHistoricSvnExternals(historicRev, d)
-        print("  -> " + str(historicExternal))
-        historicExternals.append(historicExternal)
-
-    # stop if dry run
-    if args.dry_run:
-        sys.exit(0)
-
-    # checkout/update the historic externals in the SVN WC
-    for externalDef in historicExternals:
-        print(externalDef.svnWCFolderPath + " " + str(externalDef))
-        checkoutSvnExternal(externalDef)               
+    # derive the historic externals concurrently and check them out as soon as they are known
+    succeeded = externals.CheckoutDerivedExternals(externalDefinitions,
+                                                   lambda d: DeriveHistoricSvnExternals(historicRev, d),
+                                                   jobs=args.jobs,
+                                                   jobsPerServer=args.server_jobs,
+                                                   dry_run=args.dry_run)
+    if not succeeded:
+        sys.exit(1)
 
     sys.exit(0)
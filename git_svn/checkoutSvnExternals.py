@@ -1,10 +1,15 @@
 from __future__ import print_function
 import sys
 import os
+import itertools
+import time
 from git_svn.debug import *
 import argparse
 from git_svn.git import *
 from git_svn.svn import *
+from git_svn import externals
+from git_svn import manifest
+from git_svn import wcdb
 import yaml
 
 if sys.version_info < (3,5):
@@ -39,6 +44,27 @@ def parse_cli_args():
                         help="ci environment, e.g. discard all local changes in existing externals",
                         action="store_true")
 
+    parser.add_argument("-j", "--jobs",
+                        help="number of externals to checkout/update concurrently",
+                        type=int,
+                        default=1)
+
+    parser.add_argument("--full-sync",
+                        help="checkout/update all externals, even the ones that are unchanged since the last sync",
+                        action="store_true")
+
+    parser.add_argument("--export",
+                        help="export externals pinned to a peg revision instead of checking them out, i.e. without svn metadata (read-only use, e.g. ci)",
+                        action="store_true")
+
+    parser.add_argument("--strategy",
+                        help="""wrapper: checkout/update each external with its own svn invocations (default).
+                        svn-externals: set the definitions as a local svn:externals property and let a single
+                        svn update of the working copy fetch all of them, requires an svn working copy and always
+                        syncs all externals (i.e. no --export, --full-sync or --jobs)""",
+                        choices=['wrapper', 'svn-externals'],
+                        default='wrapper')
+
     args = parser.parse_args()
 
 
@@ -80,26 +106,82 @@ externals:
     return svnExternals
 
 
+def checkoutWithSvn(externalDefinitions, dry_run):
+    """the svn-externals strategy, svn itself materialises all externals"""
+    if not IsSvnWc():
+        raise Exception("the svn-externals strategy requires an svn working copy: " + os.getcwd())
+
+    externalDefinitions = list(externalDefinitions)
+    print("#externals: " + str(len(externalDefinitions)))
+    for externalDef in externalDefinitions:
+        print(externalDef.svnWCFolderPath + " : " + FormatSvnExternalsDefinition(externalDef))
+
+    if dry_run:
+        return
+
+    ts = time.time()
+    CheckoutSvnExternalsWithSvn(externalDefinitions, wcdb.FindWcRoot() or ".")
+    print("#externals: {} ok ({:.1f} sec)".format(len(externalDefinitions), time.time() - ts), flush=True)
+
+
 def main():
     args = parse_cli_args()
+    if args.strategy == 'svn-externals' and (args.export or args.full_sync or args.jobs != 1):
+        raise Exception("--export, --full-sync and --jobs are not supported by the svn-externals strategy")
+
     if os.path.isfile(args.svnExternalsConfigFile):
         externalDefinitions = parseSvnExternalsConfigFile(args.svnExternalsConfigFile)
     elif IsGitSvnRepo():    
         # if therws is a git-svn repo then lets assume it is the main Working copy
         # and git in favor of svn 
-        externalDefinitions = GetSvnExternalsFromGitSvnBridge()
+        externalDefinitions = IterSvnExternalsFromGitSvnBridge()
     elif IsSvnWc():
         # use svn WC info if available
-        externalDefinitions = GetSvnExternalsFromLocalSvnWc()
+        externalDefinitions = IterSvnExternalsFromLocalSvnWc()
     else:
         raise Exception("cwd is not a git-svn bridge nor an svn working copy")
 
-    print("#externals: " + str(len(externalDefinitions)))
-
-    for externalDef in externalDefinitions:
-        print(externalDef.svnWCFolderPath + " : " + str(externalDef))
-        
-        if not args.dry_run:
-            checkoutSvnExternal(externalDef, discard_local_changes = args.ci)               
+    if args.strategy == 'svn-externals':
+        checkoutWithSvn(externalDefinitions, args.dry_run)
+        sys.exit(0)
+
+    pool = None
+    if not args.dry_run:
+        syncManifest = manifest.ExternalsManifest.default()
+        pool = externals.SvnExternalsCheckout(args.jobs,
+                                              discard_local_changes = args.ci,
+                                              manifest = None if args.full_sync else syncManifest,
+                                              export = args.export)
+
+    # the externals of a folder are checked out while the ones of the next folders
+    # are still being discovered
+    count = 0
+    try:
+        for (svnWCFolderPath, group) in itertools.groupby(externalDefinitions, key=lambda e: e.svnWCFolderPath):
+            group = list(group)
+            for externalDef in group:
+                print(externalDef.svnWCFolderPath + " : " + str(externalDef), flush=True)
+            count += len(group)
+            if pool is not None:
+                pool.submit(group)
+    except BaseException:
+        # let the checkouts that already started finish
+        if pool is not None:
+            pool.wait()
+        raise
+
+    print("#externals: " + str(count))
+
+    if args.dry_run:
+        sys.exit(0)
+
+    results = pool.wait()
+
+    # record what is checked out, such that the next sync can skip it
+    syncManifest.update(results)
+    syncManifest.save()
+
+    if not externals.printCheckoutReport(results):
+        sys.exit(1)
 
     sys.exit(0)
@@ -0,0 +1,209 @@
+"""
+local (revision, date) index of an svn repository
+
+Resolving an svn date revision ({2018-10-22 14:15}) or looking up the date of
+a revision normally costs an `svn info` round trip to the server. This index
+records the date of every revision of a repository (obtained with one streamed
+`svn log --xml -q` pass) such that both lookups become a local bisection.
+The index is stored next to the SvnCache and is updated incrementally, i.e.
+only the revisions committed since the last update are fetched.
+"""
+import calendar
+import hashlib
+import os
+import re
+import subprocess
+import threading
+import time
+from bisect import bisect_right
+from xml.etree import ElementTree as ET
+
+from git_svn.debug import DebugLog
+from git_svn import cache
+
+# svn log dates, e.g. 2018-10-22T14:15:34.123456Z
+# dates in this normalized UTC format can be compared as strings
+_DATE_FORMAT = "{:04d}-{:02d}-{:02d}T{:02d}:{:02d}:{:02d}.{:06d}Z"
+
+# the svn date revision formats that are supported, i.e. ISO-8601 like
+#   {2006-02-17}, {2006-02-17 15:30}, {2006-02-17T15:30:00.5Z}, {2006-02-17 15:30+0230}, ...
+_DATE_REGEX = re.compile(r"""^\{?\s*
+    (\d{4})-?(\d{2})-?(\d{2})
+    (?:[T ](\d{2}):?(\d{2})(?::?(\d{2})(?:\.(\d{1,6}))?)?)?
+    \s*(Z|[+-]\d{2}:?\d{2})?
+    \s*\}?$""", re.VERBOSE)
+
+
+def NormalizeSvnDate(text):
+    """convert an svn date (revision) into the normalized UTC date format
+
+    a date without timezone is in local time, just like svn interprets it.
+    return None if the date format is not supported.
+    """
+    m = _DATE_REGEX.match(text.strip())
+    if m is None:
+        return None
+
+    (year, month, day, hour, minute, second, fraction, tz) = m.groups()
+    fields = (int(year), int(month), int(day), int(hour or 0), int(minute or 0), int(second or 0))
+    micro = int((fraction or "0").ljust(6, '0'))
+
+    if tz is None:
+        timestamp = time.mktime(fields + (0, 0, -1))
+    else:
+        timestamp = calendar.timegm(fields + (0, 0, 0))
+        if tz != 'Z':
+            offset = int(tz[1:3]) * 3600 + int(tz[-2:]) * 60
+            timestamp += -offset if tz[0] == '+' else offset
+
+    utc = time.gmtime(timestamp)
+    return _DATE_FORMAT.format(utc.tm_year, utc.tm_mon, utc.tm_mday, utc.tm_hour, utc.tm_min, utc.tm_sec, micro)
+
+
+def UtcNow(offset=0):
+    """the current time (plus offset seconds) in the normalized UTC date format"""
+    utc = time.gmtime(time.time() + offset)
+    return _DATE_FORMAT.format(utc.tm_year, utc.tm_mon, utc.tm_mday, utc.tm_hour, utc.tm_min, utc.tm_sec, 0)
+
+
+class SvnDateIndex:
+    """the (revision, date) pairs of all revisions of an svn repository"""
+
+    _indexes = {}
+    _indexesLock = threading.Lock()
+
+    def __init__(self, reposRoot, path=None):
+        self.reposRoot = reposRoot
+        self.path = path
+        self.revs = []
+        self.dates = []
+        self._lock = threading.RLock()
+        self._isUpToDate = False
+
+        if path is not None and os.path.isfile(path):
+            self._load()
+
+    @staticmethod
+    def forRepo(reposRoot):
+        """the (process wide) index of a repository root url"""
+        with SvnDateIndex._indexesLock:
+            if reposRoot not in SvnDateIndex._indexes:
+                directory = cache.SvnCache.default().directory
+                path = None
+                if directory is not None:
+                    name = hashlib.sha1(reposRoot.encode()).hexdigest()
+                    path = os.path.join(directory, 'revdates', name)
+                SvnDateIndex._indexes[reposRoot] = SvnDateIndex(reposRoot, path)
+            return SvnDateIndex._indexes[reposRoot]
+
+    def _load(self):
+        with open(self.path, 'rt') as f:
+            for line in f:
+                (rev, sep, date) = line.strip().partition(' ')
+                if not sep:
+                    # partially written line of an interrupted update
+                    break
+                self._append(int(rev), date)
+
+    def _append(self, rev, date):
+        if self.revs and rev <= self.revs[-1]:
+            return
+        self.revs.append(rev)
+        self.dates.append(date)
+
+    def _parseLog(self, stream):
+        """yield the (rev, date) pairs of an `svn log --xml -q` output stream"""
+        for (event, el) in ET.iterparse(stream, events=('end',)):
+            if el.tag != 'logentry':
+                continue
+            dateEl = el.find('date')
+            if dateEl is not None and dateEl.text:
+                yield (int(el.get('revision')), dateEl.text)
+            el.clear()
+
+    def _fetch(self, startRev):
+        """fetch the (rev, date) pairs of all revisions since startRev with a streamed svn log
+
+        a failing svn log leaves the index as is, such that the caller falls back
+        to asking svn itself.
+        """
+        cmd = ['svn', 'log', '--xml', '-q', '-r', '{}:HEAD'.format(startRev), self.reposRoot]
+        DebugLog.print(str(cmd))
+        try:
+            p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        except OSError as e:
+            DebugLog.print("svn log failed: " + str(e))
+            return []
+
+        entries = []
+        try:
+            for (rev, date) in self._parseLog(p.stdout):
+                entries.append((rev, date))
+        except ET.ParseError:
+            # e.g. there are no revisions since startRev, svn only reports an error
+            pass
+        p.stdout.close()
+        err = p.stderr.read()
+        p.wait()
+        if p.returncode != 0:
+            DebugLog.print("svn log failed: " + err.decode(errors='replace'))
+        return entries
+
+    def update(self):
+        """add all revisions that were committed since the last update"""
+        with self._lock:
+            if self._isUpToDate:
+                return
+
+            lockPath = self.path + '.lock' if self.path else None
+            with (cache.FileLock(lockPath) if lockPath else _NoLock()):
+                # another process might have updated the index in the mean time
+                if self.path is not None and os.path.isfile(self.path):
+                    self._load()
+
+                newEntries = self._fetch(self.revs[-1] + 1 if self.revs else 0)
+                for (rev, date) in newEntries:
+                    self._append(rev, date)
+
+                if self.path is not None and newEntries:
+                    os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                    with open(self.path, 'at') as f:
+                        for (rev, date) in newEntries:
+                            f.write("{} {}\n".format(rev, date))
+
+            DebugLog.print("svn date index of {}: {} revisions".format(self.reposRoot, len(self.revs)))
+            self._isUpToDate = True
+
+    def DateOfRev(self, rev):
+        """the svn date of a revision, None if the revision doesn't exist"""
+        rev = int(rev)
+        with self._lock:
+            if not self.revs or rev > self.revs[-1]:
+                self.update()
+
+            idx = bisect_right(self.revs, rev) - 1
+            if idx < 0 or self.revs[idx] != rev:
+                return None
+            return self.dates[idx]
+
+    def RevAtDate(self, date):
+        """the youngest revision committed at or before the (normalized) date
+
+        i.e. the revision svn resolves a date revision to, None if there is none
+        """
+        with self._lock:
+            if not self.dates or date > self.dates[-1]:
+                self.update()
+
+            idx = bisect_right(self.dates, date) - 1
+            if idx < 0:
+                return None
+            return self.revs[idx]
+
+
+class _NoLock:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        pass
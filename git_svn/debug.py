@@ -1,6 +1,7 @@
 from __future__ import print_function
 
 import sys
+import threading
 import traceback
 
 class ExceptionHandle:
@@ -28,30 +29,38 @@ class DebugLogScopedPush:
         if(self.msg is not None):
             DebugLog.print(self.msg)
             
-        self.originalIndentLvl = DebugLog.indentLvl
+        self.originalIndentLvl = DebugLog.getIndentLvl()
         DebugLog.push()
     
     def __exit__(self, type, value, traceback):
         DebugLog.pop()
-        assert(DebugLog.indentLvl == self.originalIndentLvl)
+        assert(DebugLog.getIndentLvl() == self.originalIndentLvl)
 
 
 class DebugLog:
-    """An indentation aware debug log stream"""
+    """An indentation aware debug log stream
 
-    indentLvl = 0
+    The indentation level is tracked per thread such that concurrent workers
+    (e.g. parallel svn external checkouts) do not mess up each others nesting.
+    """
+
+    _thread = threading.local()
     enabled = False
 
+    @staticmethod
+    def getIndentLvl():
+        return getattr(DebugLog._thread, 'indentLvl', 0)
+
     @staticmethod
     def print(msg):
         # skip debug messages if debug mode is not enabled!
         if DebugLog.enabled:
-            print("|  "*DebugLog.indentLvl + msg, flush=True)
+            print("|  "*DebugLog.getIndentLvl() + msg, flush=True)
 
     @staticmethod
     def push():
-        DebugLog.indentLvl += 1
-        return DebugLog.indentLvl
+        DebugLog._thread.indentLvl = DebugLog.getIndentLvl() + 1
+        return DebugLog._thread.indentLvl
 
     @staticmethod
     def scopedPush(msg = None):
@@ -59,11 +68,11 @@ class DebugLog:
 
     @staticmethod
     def pop():
-        newIndentLvl = DebugLog.indentLvl - 1
+        newIndentLvl = DebugLog.getIndentLvl() - 1
 
         # indentLvl can't become negative
         if newIndentLvl < 0:
             newIndentLvl = 0
         
-        DebugLog.indentLvl = newIndentLvl
-        return DebugLog.indentLvl
\ No newline at end of file
+        DebugLog._thread.indentLvl = newIndentLvl
+        return newIndentLvl
\ No newline at end of file
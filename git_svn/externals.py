@@ -0,0 +1,424 @@
+"""
+concurrent checkout/update of svn externals
+
+independent externals are checked out by a bounded pool of worker threads,
+while externals nested inside another external wait for their parent.
+"""
+import os
+import threading
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from time import time
+
+from git_svn.debug import DebugLog
+from git_svn import svn
+from git_svn import trash
+from git_svn import wcdb
+
+
+class ExternalCheckoutResult:
+    """outcome of the checkout/update of a single svn external"""
+
+    @property
+    def succeeded(self):
+        return self.error is None
+
+    def __init__(self, svnExternal, error=None, duration=0.0, skipped=False):
+        self.svnExternal = svnExternal
+        self.error = error
+        self.duration = duration
+        self.skipped = skipped
+
+    def __str__(self):
+        if self.skipped:
+            return "[skip]   {} (unchanged)".format(self.svnExternal.WCPath)
+        if self.succeeded:
+            return "[ok]     {} ({:.1f} sec)".format(self.svnExternal.WCPath, self.duration)
+        return "[FAILED] {} : {}".format(self.svnExternal.WCPath, self.error)
+
+
+def _pathKey(svnExternal):
+    return os.path.normcase(os.path.normpath(svnExternal.WCPath))
+
+
+class SvnExternalsCheckout:
+    """bounded worker pool that checks out or updates svn externals concurrently
+
+    Externals are started as soon as they are submitted, unless they are nested
+    inside another known external. Such a nested external is only started once its
+    parent finished successfully, and it is reported as failed without being
+    attempted when the parent fails.
+
+    Externals that will only be submitted later on (e.g. because they still need
+    to be resolved) can be declared upfront with `expect`, such that nested
+    externals that are submitted earlier still wait for them.
+
+    Given an `ExternalsManifest`, externals that are unchanged since the sync that
+    recorded it are skipped without invoking svn. When local changes are discarded,
+    only the ones without local modifications (cf. wcdb.IsDirty) are skipped.
+
+    Clean existing checkouts that only need a revision bump are updated with a
+    single multi-target `svn update` per repository root and revision, such that
+    svn reuses one repository session for all of them. The externals of a batch
+    that fails are updated one by one instead.
+
+    With export, pinned dir externals are exported instead of checked out (cf.
+    svn.exportSvnExternal).
+    """
+
+    def __init__(self, jobs=1, discard_local_changes=False, manifest=None, export=False):
+        self.jobs = max(1, int(jobs))
+        self.discard_local_changes = discard_local_changes
+        self.manifest = manifest
+        self.export = export
+
+        # externals that were removed by an earlier run that died might still be in the trash
+        trash.ReclaimTrash()
+
+        self._executor = ThreadPoolExecutor(max_workers=self.jobs)
+        self._cv = threading.Condition(threading.RLock())
+
+        # all declared or submitted externals by their normalized WC path
+        self._known = {}
+        self._order = []
+        # externals that are expected, but not yet submitted (or failed)
+        self._expected = set()
+        # externals that still need to finish
+        self._unfinished = set()
+        # externals that wait for their parent to finish, by parent path
+        self._waiting = {}
+        self._results = {}
+        # already resolved svn info passed on to the checkout, by path
+        self._hints = {}
+        # repository root of the existing checkouts, by path
+        self._reposRoots = {}
+
+    def expect(self, svnExternals):
+        """declare externals that will be submitted (or failed) later on"""
+        with self._cv:
+            self._declare(svnExternals, expected=True)
+
+    def submit(self, svnExternals):
+        """schedule the checkout of the given externals"""
+        svnExternals = list(svnExternals)
+        with self._cv:
+            self._declare(svnExternals)
+            # nested externals are left alone since their parent can still change them
+            topLevel = [e for e in svnExternals if self._findParent(_pathKey(e)) is None]
+
+        # the svn queries run without holding the lock, such that the workers carry on meanwhile
+        try:
+            unchanged = set(_pathKey(e) for e in svnExternals if self._isUnchanged(e))
+            (hints, reposRoots) = self._resolve([e for e in topLevel if _pathKey(e) not in unchanged])
+        except Exception as error:
+            # don't leave declared externals behind that wait() would wait for forever
+            for e in svnExternals:
+                self._finish(e, error, 0.0)
+            raise
+
+        with self._cv:
+            self._hints.update(hints)
+            self._reposRoots.update(reposRoots)
+            batches = self._batchUpdates([e for e in svnExternals if _pathKey(e) not in unchanged])
+            batched = set(_pathKey(e) for batch in batches.values() for e in batch)
+
+            for e in svnExternals:
+                key = _pathKey(e)
+                parentKey = self._findParent(key)
+
+                if key in unchanged and (parentKey is None or self._isSkipped(parentKey)):
+                    # a parent that is checked out again could remove a nested external
+                    self._finish(e, None, 0.0, skipped=True)
+                elif key in batched:
+                    # started below, together with the rest of its batch
+                    pass
+                elif parentKey is None:
+                    self._start(e)
+                elif parentKey in self._unfinished:
+                    DebugLog.print("postpone {} until {} is done".format(key, parentKey))
+                    self._waiting.setdefault(parentKey, []).append(e)
+                elif not self._results[parentKey].succeeded:
+                    self._finish(e, Exception("parent external failed: " + self._known[parentKey].WCPath), 0.0)
+                else:
+                    self._start(e)
+
+            for ((reposRoot, rev), batch) in batches.items():
+                self._executor.submit(self._runBatch, batch, rev)
+
+    def fail(self, svnExternal, error):
+        """report an expected external as failed without checking it out"""
+        with self._cv:
+            self._declare([svnExternal])
+            self._finish(svnExternal, error, 0.0)
+
+    def wait(self):
+        """wait for all externals to finish
+
+        return the list of `ExternalCheckoutResult` in submission order
+        """
+        with self._cv:
+            while self._unfinished:
+                self._cv.wait()
+        self._executor.shutdown()
+        return [self._results[key] for key in self._order]
+
+    def _declare(self, svnExternals, expected=False):
+        """declare the externals, the submission (or failure) of an expected external replaces it
+
+        raise if any other external is already declared for one of the paths, whether it
+        is pending, running or done, before any of the externals is declared
+        """
+        keys = set()
+        for e in svnExternals:
+            key = _pathKey(e)
+            replacesExpected = not expected and key in self._expected
+            if key in keys or (key in self._known and not replacesExpected):
+                raise Exception("svn external path is defined twice: " + e.WCPath)
+            keys.add(key)
+
+        for e in svnExternals:
+            key = _pathKey(e)
+            if key not in self._known:
+                self._order.append(key)
+                self._unfinished.add(key)
+            self._known[key] = e
+            if expected:
+                self._expected.add(key)
+            else:
+                self._expected.discard(key)
+
+    def _isUnchanged(self, svnExternal):
+        """True if the external can be skipped, as recorded by the manifest"""
+        if self.manifest is None or not self.manifest.isUnchanged(svnExternal):
+            return False
+        # the manifest fingerprint doesn't cover edits of versioned files, which have to be reverted
+        return not self.discard_local_changes or wcdb.IsDirty(svnExternal.WCPath) is False
+
+    def _resolve(self, svnExternals):
+        """resolve the svn info needed by the checkout of all externals at once
+
+        i.e. a single `svn info` and `svn status` call for the existing checkouts and
+        one `svn info` call per operative revision for the new ones, instead of
+        several calls per external.
+        return the (hints, repository roots) by path, it doesn't need the lock.
+        """
+        hints = {}
+        reposRoots = {}
+        existing = []
+        new = []
+        for e in svnExternals:
+            if os.path.isdir(e.WCPath) or os.path.isfile(e.WCPath):
+                existing.append(e)
+            elif not os.path.exists(e.WCPath):
+                new.append(e)
+
+        existingInfos = svn.GetSvnInfoForTargets([e.WCPath for e in existing])
+        dirtyMap = svn.GetSvnWcDirtyMap([e.WCPath for e in existing if existingInfos[e.WCPath] is not None])
+        for e in existing:
+            info = existingInfos[e.WCPath]
+            if info is not None:
+                reposRoots[_pathKey(e)] = info.reposRoot
+                hints[_pathKey(e)] = {'existingUrl': info.url}
+                if dirtyMap.get(e.WCPath) is not None:
+                    hints[_pathKey(e)]['isDirty'] = dirtyMap[e.WCPath]
+
+        for (e, info) in svn.GetSvnInfoForExternals(new).items():
+            if info is not None:
+                hints[_pathKey(e)] = {'svnInfo': info}
+
+        return (hints, reposRoots)
+
+    def _batchUpdates(self, svnExternals):
+        """group the clean existing checkouts that only need an update
+
+        i.e. top-level externals of which the checkout has the right url and no local
+        changes, by (repository root, revision). Groups of a single external are left
+        to the regular checkout.
+        """
+        batches = {}
+        if self.export:
+            # existing checkouts might get replaced by an export
+            return batches
+
+        for e in svnExternals:
+            key = _pathKey(e)
+            hint = self._hints.get(key, {})
+            if self._findParent(key) is not None or hint.get('isDirty') is not False:
+                continue
+            if self._reposRoots.get(key) is None:
+                continue
+            if (e.operativeRev is not None) and (e.pegRev != e.operativeRev):
+                continue
+            try:
+                if e.QualifiedUrl != hint.get('existingUrl'):
+                    continue
+            except NotImplementedError:
+                continue
+            batches.setdefault((self._reposRoots[key], e.pegRev), []).append(e)
+
+        return {k: batch for (k, batch) in batches.items() if len(batch) > 1}
+
+    def _runBatch(self, svnExternals, rev):
+        ts = time()
+        try:
+            svn.UpdateSvnWcs([e.WCPath for e in svnExternals], rev)
+        except Exception as error:
+            DebugLog.print("batched svn update failed, updating the externals one by one: " + str(error))
+            with self._cv:
+                for e in svnExternals:
+                    self._start(e)
+            return
+
+        duration = time() - ts
+        for e in svnExternals:
+            with self._cv:
+                self._hints.pop(_pathKey(e), None)
+            self._finish(e, None, duration)
+
+    def _isSkipped(self, key):
+        return key in self._results and self._results[key].skipped
+
+    def _findParent(self, key):
+        """the nearest known external that contains the given path"""
+        parentKey = None
+        for candidate in self._known:
+            if key.startswith(candidate + os.sep):
+                if parentKey is None or len(candidate) > len(parentKey):
+                    parentKey = candidate
+        return parentKey
+
+    def _start(self, svnExternal):
+        self._executor.submit(self._run, svnExternal)
+
+    def _run(self, svnExternal):
+        ts = time()
+        try:
+            with self._cv:
+                hints = self._hints.pop(_pathKey(svnExternal), {})
+            exported = self.export and svn.exportSvnExternal(svnExternal, self.discard_local_changes,
+                                                             svnInfo=hints.get('svnInfo'))
+            if not exported:
+                svn.checkoutSvnExternal(svnExternal, discard_local_changes=self.discard_local_changes, **hints)
+            error = None
+        except Exception as e:
+            error = e
+        self._finish(svnExternal, error, time() - ts)
+
+    def _finish(self, svnExternal, error, duration, skipped=False):
+        with self._cv:
+            key = _pathKey(svnExternal)
+            result = ExternalCheckoutResult(svnExternal, error, duration, skipped)
+            self._results[key] = result
+            self._unfinished.discard(key)
+            DebugLog.print(str(result))
+
+            for child in self._waiting.pop(key, []):
+                if result.succeeded:
+                    self._start(child)
+                else:
+                    self._finish(child, Exception("parent external failed: " + svnExternal.WCPath), 0.0)
+
+            self._cv.notify_all()
+
+
+def printCheckoutReport(results):
+    """print a combined success/failure report, return True if all succeeded"""
+    failed = [r for r in results if not r.succeeded]
+    skipped = [r for r in results if r.skipped]
+
+    for r in results:
+        print(str(r))
+    print("#externals: {} ok, {} skipped, {} failed".format(
+        len(results) - len(failed) - len(skipped), len(skipped), len(failed)), flush=True)
+
+    return len(failed) == 0
+
+
+def DeriveExternals(svnExternals, derive, jobsPerServer=4):
+    """derive (e.g. pin to a historic revision) all externals concurrently
+
+    derive(svnExternal) returns the derived SvnExternal. At most jobsPerServer
+    derivations run concurrently per svn server, and externals that share the
+    same qualified url are only derived once.
+
+    generator that yields a (svnExternal, derived, error) tuple as soon as
+    an external is derived, such that its checkout can start right away.
+    """
+    # group the externals that share the same qualified url
+    groups = {}
+    for e in svnExternals:
+        try:
+            key = (e.hostRepoUrl, e.QualifiedUrl)
+        except Exception as error:
+            # e.g. relative urls that are not supported, only this external fails
+            yield (e, None, error)
+            continue
+        groups.setdefault(key, []).append(e)
+
+    servers = set(urllib.parse.urlparse(qualifiedUrl).netloc for (hostRepoUrl, qualifiedUrl) in groups)
+    semaphores = {server: threading.Semaphore(max(1, jobsPerServer)) for server in servers}
+
+    def run(e):
+        with semaphores[urllib.parse.urlparse(e.QualifiedUrl).netloc]:
+            return derive(e)
+
+    workers = max(1, jobsPerServer) * max(1, len(servers))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(run, group[0]): group for group in groups.values()}
+
+        for future in as_completed(futures):
+            group = futures[future]
+            try:
+                derived = future.result()
+                error = None
+            except Exception as e:
+                derived = None
+                error = e
+
+            for e in group:
+                if derived is None:
+                    yield (e, None, error)
+                elif e is group[0]:
+                    yield (e, derived, None)
+                else:
+                    # reuse the revisions derived for the first external with this url
+                    yield (e, svn.SvnExternal(e.hostRepoUrl,
+                                              e.svnWCFolderPath,
+                                              derived.operativeRev,
+                                              e.url,
+                                              derived.pegRev,
+                                              e.path), None)
+
+
+def CheckoutDerivedExternals(svnExternals, derive, jobs=1, jobsPerServer=4, dry_run=False):
+    """derive all externals concurrently and checkout each derived external as soon as it is known
+
+    i.e. the checkout of the first externals overlaps with the derivation of the others.
+    a dry run only prints the derived externals.
+    return True if all externals were derived (and checked out) successfully
+    """
+    pool = None
+    if not dry_run:
+        pool = SvnExternalsCheckout(jobs)
+        # nested externals must wait for their parent, even if it is derived later
+        pool.expect(svnExternals)
+
+    derivationFailed = False
+    for (svnExternal, derived, error) in DeriveExternals(svnExternals, derive, jobsPerServer):
+        if error is not None:
+            print(svnExternal.svnWCFolderPath + " : " + str(svnExternal))
+            print("  -> failed: " + str(error))
+            derivationFailed = True
+            if pool is not None:
+                pool.fail(svnExternal, error)
+            continue
+
+        print(svnExternal.svnWCFolderPath + " : " + str(svnExternal))
+        print("  -> " + str(derived))
+        if pool is not None:
+            pool.submit([derived])
+
+    if pool is None:
+        return not derivationFailed
+
+    return printCheckoutReport(pool.wait())
@@ -0,0 +1,433 @@
+"""
+fetch an svn branch into the git-svn bridge with git fast-import
+
+`git svn fetch` requests a single revision per round trip and writes every
+object with a separate git command. This backend streams a dump of the branch
+(`svnrdump dump`, or `svnadmin dump` for a file:// repository root) through the
+incremental svndump parser straight into a single `git fast-import` process.
+
+The imported commits get the same git-svn-id trailers as git-svn commits, and the
+rev_map and unhandled.log of the tracking ref are written in the git-svn format,
+such that all other git-svn commands keep working on the fetched branch.
+
+Only copies from within the fetched branch can be represented. svnrdump already
+turns copies from outside of the dumped path into plain adds, but a whole
+repository `svnadmin dump` can't do that, hence it is only used for a branch at
+the repository root.
+"""
+import calendar
+import glob
+import os
+import re
+import subprocess
+import time
+import urllib.parse
+import urllib.request
+from bisect import bisect_right
+
+from git_svn.debug import DebugLog
+from git_svn import revmap
+from git_svn import svndump
+from git_svn import unhandledlog
+
+# properties git-svn does not report in unhandled.log
+_SKIP_PROPS = ('svn:executable', 'svn:special', 'svn:wc:ra_dav:version-url')
+
+
+def _quote(path):
+    """C-style quote a path for a fast-import command"""
+    path = path.encode('utf-8')
+    return b'"' + path.replace(b'\\', b'\\\\').replace(b'"', b'\\"').replace(b'\n', b'\\n') + b'"'
+
+
+def _svnDateToUnix(date):
+    """seconds since the epoch of an svn date, e.g. 2018-10-22T14:15:34.123456Z"""
+    return calendar.timegm(time.strptime(date[:19], "%Y-%m-%dT%H:%M:%S"))
+
+
+class FastImport:
+    """a running `git fast-import` process
+
+    ls and cat-blob responses are read back from its stdout.
+    """
+
+    def __init__(self, marksPath, cwd=None):
+        cmd = ['git', 'fast-import', '--quiet', '--done', '--export-marks=' + marksPath]
+        DebugLog.print(str(cmd))
+        self.marksPath = marksPath
+        self.process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, cwd=cwd)
+
+    def write(self, data):
+        self.process.stdin.write(data)
+
+    def _readLine(self):
+        line = self.process.stdout.readline()
+        if not line:
+            raise Exception("git fast-import terminated unexpectedly")
+        return line.rstrip(b'\n')
+
+    def ls(self, path, dataref=None):
+        """return the (mode, sha) of path, None if it doesn't exist
+
+        without dataref path is looked up in the commit that is being imported.
+        """
+        if dataref is None:
+            self.write(b'ls ' + _quote(path) + b'\n')
+        else:
+            self.write(b'ls ' + dataref.encode() + b' ' + _quote(path) + b'\n')
+        self.process.stdin.flush()
+
+        line = self._readLine()
+        if line.startswith(b'missing '):
+            return None
+        (info, sep, responsePath) = line.partition(b'\t')
+        (mode, type, sha) = info.decode().split(' ')
+        return (mode, sha)
+
+    def catBlob(self, sha):
+        """return the content of a blob"""
+        self.write(b'cat-blob ' + sha.encode() + b'\n')
+        self.process.stdin.flush()
+
+        (responseSha, type, size) = self._readLine().decode().split(' ')
+        if type != 'blob':
+            raise Exception("git fast-import can't find blob: " + sha)
+        data = self.process.stdout.read(int(size) + 1)
+        return data[:-1]
+
+    def finish(self):
+        """end the stream and return the {mark: commit sha} of all imported commits"""
+        self.write(b'done\n')
+        self.process.stdin.close()
+        self.process.stdout.close()
+        if self.process.wait() != 0:
+            raise Exception("git fast-import failed with exit code: " + str(self.process.returncode))
+
+        marks = {}
+        with open(self.marksPath, 'rt') as f:
+            for line in f:
+                (mark, sha) = line.split()
+                marks[mark] = sha
+        os.remove(self.marksPath)
+        return marks
+
+    def abort(self):
+        """terminate fast-import without updating any ref"""
+        # with --done fast-import bails out on a stream without a done command
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+        self.process.stdout.close()
+        self.process.wait()
+
+
+class DumpImporter:
+    """import the revisions of an svn dump of a branch as commits of its git-svn tracking ref"""
+
+    def __init__(self, fastImport, branchUrl, branchPath, gitRef, parentSha=None, revMap=None, ignoreRegex=None, dirProps=None):
+        self.fastImport = fastImport
+        self.branchUrl = branchUrl.rstrip('/')
+        self.branchPath = branchPath.strip('/')
+        self.gitRef = gitRef
+        self.parentSha = parentSha
+        # rev_map of the previously fetched revisions
+        self.revMap = revMap
+        self.ignoreRegex = re.compile(ignoreRegex) if ignoreRegex else None
+        self.uuid = None
+        self.lastRev = None
+        # committed svn revisions in import order
+        self.revs = []
+        self.unhandled = []
+        # the dir properties by branch relative path, as of the previously fetched revisions
+        self._dirProps = {path: dict(props) for (path, props) in (dirProps or {}).items()}
+        self._revision = None
+        self._commitOpen = False
+        self._propChanges = []
+
+    def importDump(self, stream):
+        """import all revisions of a binary dump stream"""
+        parser = svndump.DumpParser(stream)
+        for record in parser.records():
+            if isinstance(record, svndump.DumpRevision):
+                self._endRevision()
+                self.uuid = parser.uuid
+                self._revision = record
+                self.lastRev = record.number
+            else:
+                self._node(record)
+        self._endRevision()
+
+    def _relPath(self, path):
+        """path relative to the branch, None if it's outside of the branch or ignored"""
+        path = path.strip('/')
+        if self.branchPath == "":
+            relPath = path
+        elif path == self.branchPath:
+            relPath = ""
+        elif path.startswith(self.branchPath + '/'):
+            relPath = path[len(self.branchPath) + 1:]
+        else:
+            return None
+
+        if relPath and self.ignoreRegex is not None and self.ignoreRegex.search(relPath + '/'):
+            return None
+        return relPath
+
+    def _commitRef(self, rev):
+        """the dataref of the commit of the branch at svn revision rev"""
+        idx = bisect_right(self.revs, rev)
+        if idx > 0:
+            return ':' + str(self.revs[idx - 1])
+
+        sha = self.revMap.FindSha(rev, before=True) if self.revMap is not None else None
+        if sha is None:
+            raise Exception("no commit found for r{} of {}".format(rev, self.branchUrl))
+        return sha
+
+    def _copySource(self, node):
+        """the (dataref, path) of the copy source of a node"""
+        srcPath = self._relPath(node.copyfromPath)
+        if srcPath is None or srcPath == "":
+            raise Exception("r{}: copy from outside of the fetched branch is not supported: {} -> {}".format(
+                self._revision.number, node.copyfromPath, node.path))
+        return (self._commitRef(node.copyfromRev), srcPath)
+
+    def _openCommit(self):
+        if self._commitOpen:
+            return
+        self._commitOpen = True
+
+        props = self._revision.props
+        author = props.get('svn:author') or '(no author)'
+        ident = '{} <{}@{}> {} +0000'.format(author, author, self.uuid,
+                                            _svnDateToUnix(props['svn:date']) if 'svn:date' in props else 0)
+        log = props.get('svn:log', '').rstrip()
+        message = (log + '\n\n' if log else '') + 'git-svn-id: {}@{} {}\n'.format(self.branchUrl, self._revision.number, self.uuid)
+        message = message.encode('utf-8')
+
+        fi = self.fastImport
+        fi.write('commit {}\nmark :{}\nauthor {}\ncommitter {}\n'.format(
+            self.gitRef, self._revision.number, ident, ident).encode('utf-8'))
+        fi.write(b'data ' + str(len(message)).encode() + b'\n' + message + b'\n')
+        if not self.revs and self.parentSha is not None:
+            fi.write(b'from ' + self.parentSha.encode() + b'\n')
+
+    def _endRevision(self):
+        if not self._commitOpen:
+            return
+
+        self.fastImport.write(b'\n')
+        self.revs.append(self._revision.number)
+        self.unhandled.append('r{}'.format(self._revision.number))
+        self.unhandled.extend(line for (path, prop, line) in sorted(self._propChanges))
+        self._commitOpen = False
+        self._propChanges = []
+
+    def _node(self, node):
+        relPath = self._relPath(node.path)
+        if relPath is None:
+            return
+        self._openCommit()
+        DebugLog.print("r{}: {}".format(self._revision.number, node))
+
+        fi = self.fastImport
+        if node.action in ('delete', 'replace'):
+            if relPath == "":
+                fi.write(b'deleteall\n')
+            else:
+                fi.write(b'D ' + _quote(relPath) + b'\n')
+            for path in list(self._dirProps):
+                if relPath == "" or path == relPath or path.startswith(relPath + '/'):
+                    del self._dirProps[path]
+            if node.action == 'delete':
+                return
+
+        kind = node.kind
+        if kind is None:
+            entry = fi.ls(relPath)
+            kind = 'dir' if entry is not None and entry[0] == '040000' else 'file'
+
+        if kind == 'dir':
+            self._dir(relPath, node)
+        else:
+            self._file(relPath, node)
+
+    def _dir(self, relPath, node):
+        if node.copyfromPath is not None:
+            (dataref, srcPath) = self._copySource(node)
+            entry = self.fastImport.ls(srcPath, dataref)
+            if entry is None:
+                raise Exception("r{}: copy source not found: {}@{}".format(self._revision.number, node.copyfromPath, node.copyfromRev))
+            self.fastImport.write(b'M 040000 ' + entry[1].encode() + b' ' + _quote(relPath) + b'\n')
+
+        if node.props is not None:
+            self._changeDirProps(relPath, node)
+
+    def _changeDirProps(self, relPath, node):
+        """record dir property changes in unhandled.log, just like git-svn does"""
+        oldProps = self._dirProps.get(relPath, {})
+        if node.propDelta:
+            newProps = dict(oldProps)
+            newProps.update(node.props)
+            for name in node.deletedProps:
+                newProps.pop(name, None)
+        else:
+            newProps = dict(node.props)
+
+        ppath = urllib.parse.quote(relPath or '.', safe='/')
+        for name in sorted(set(oldProps) | set(newProps)):
+            if name in _SKIP_PROPS or name.startswith('svn:entry:') or oldProps.get(name) == newProps.get(name):
+                continue
+            record = '  {}dir_prop: {} {}'.format('+' if name in newProps else '-', ppath, urllib.parse.quote(name, safe=':'))
+            if name in newProps:
+                record += ' ' + urllib.parse.quote(newProps[name], safe='')
+            self._propChanges.append((relPath, name, record))
+
+        self._dirProps[relPath] = newProps
+
+    def _file(self, relPath, node):
+        fi = self.fastImport
+
+        base = None
+        if node.copyfromPath is not None:
+            (dataref, srcPath) = self._copySource(node)
+            base = fi.ls(srcPath, dataref)
+            if base is None:
+                raise Exception("r{}: copy source not found: {}@{}".format(self._revision.number, node.copyfromPath, node.copyfromRev))
+        elif node.action == 'change':
+            base = fi.ls(relPath)
+
+        executable = base is not None and base[0] == '100755'
+        special = base is not None and base[0] == '120000'
+        if node.props is not None:
+            if node.propDelta:
+                executable = (executable or 'svn:executable' in node.props) and 'svn:executable' not in node.deletedProps
+                special = (special or 'svn:special' in node.props) and 'svn:special' not in node.deletedProps
+            else:
+                executable = 'svn:executable' in node.props
+                special = 'svn:special' in node.props
+        mode = b'120000' if special else (b'100755' if executable else b'100644')
+
+        baseIsLink = base is not None and base[0] == '120000'
+        if node.text is None and base is not None and baseIsLink == special:
+            # content is unchanged, reuse the blob
+            fi.write(b'M ' + mode + b' ' + base[1].encode() + b' ' + _quote(relPath) + b'\n')
+            return
+
+        if node.text is not None and not node.textDelta:
+            content = node.text
+        else:
+            content = b''
+            if base is not None:
+                content = fi.catBlob(base[1])
+                if baseIsLink:
+                    # svn stores a symlink as a special file with 'link <target>' content
+                    content = b'link ' + content
+            if node.text is not None:
+                content = svndump.ApplySvnDiff(content, node.text)
+
+        if special and content.startswith(b'link '):
+            content = content[len(b'link '):]
+
+        fi.write(b'M ' + mode + b' inline ' + _quote(relPath) + b'\n')
+        fi.write(b'data ' + str(len(content)).encode() + b'\n' + content + b'\n')
+
+
+def _findRevMap(gitDir, gitRef):
+    """path of the existing rev_map of a tracking ref, None if there is none"""
+    paths = glob.glob(revmap.GetRevMapPath(gitDir, gitRef, '*'))
+    return paths[0] if paths else None
+
+
+def _dumpCommand(reposRoot, branchPath, startRev, incremental):
+    revRange = '{}:HEAD'.format(startRev)
+    if reposRoot.startswith('file://') and branchPath.strip('/') == "":
+        reposPath = urllib.request.url2pathname(urllib.parse.urlparse(reposRoot).path)
+        cmd = ['svnadmin', 'dump', '--quiet', '-r', revRange, reposPath]
+    else:
+        branchUrl = reposRoot.rstrip('/') + ('/' + branchPath.strip('/') if branchPath.strip('/') else '')
+        cmd = ['svnrdump', 'dump', '--quiet', '-r', revRange, branchUrl]
+
+    if incremental:
+        cmd.append('--incremental')
+    return cmd
+
+
+def ImportDump(gitDir, stream, branchUrl, branchPath, gitRef, parentSha=None, revMap=None, ignoreRegex=None, dumpProcess=None):
+    """import a binary dump stream into the git-svn tracking ref of a branch
+
+    the ref, its rev_map and its unhandled.log are only updated if the whole
+    dump (and the dumpProcess producing it) succeeds.
+    return the DumpImporter
+    """
+    # an incremental import continues from the dir properties recorded by the previous fetches,
+    # otherwise changes of them (e.g. a deleted svn:externals) can't be told apart
+    logPath = unhandledlog.GetUnhandledLogPath(gitDir, gitRef)
+    dirProps = None
+    if parentSha is not None and os.path.isfile(logPath):
+        dirProps = unhandledlog.ReadDirProps(logPath)
+
+    fastImport = FastImport(os.path.join(gitDir, 'git-svn-fast-import.marks'))
+    importer = DumpImporter(fastImport, branchUrl, branchPath, gitRef, parentSha, revMap, ignoreRegex, dirProps)
+    try:
+        importer.importDump(stream)
+        if dumpProcess is not None:
+            dumpProcess.stdout.close()
+            if dumpProcess.wait() != 0:
+                raise Exception("{} failed with exit code: {}".format(dumpProcess.args[0], dumpProcess.returncode))
+    except BaseException:
+        if dumpProcess is not None:
+            dumpProcess.kill()
+            dumpProcess.wait()
+        fastImport.abort()
+        raise
+
+    marks = fastImport.finish()
+    if importer.lastRev is None:
+        return importer
+
+    # record the fetched revisions just like git-svn does
+    records = [(rev, marks[':' + str(rev)]) for rev in importer.revs]
+    if not records or records[-1][0] != importer.lastRev:
+        records.append((importer.lastRev, None))
+    revmap.AppendRevMap(revmap.GetRevMapPath(gitDir, gitRef, importer.uuid), records)
+
+    with open(logPath, 'at', encoding='utf-8', newline='\n') as f:
+        for line in importer.unhandled:
+            f.write(line + '\n')
+
+    return importer
+
+
+def Fetch(gitDir, reposRoot, branchPath, gitRef, startRev=0, ignoreRegex=None):
+    """fetch all revisions of an svn branch since startRev into its git-svn tracking ref
+
+    a branch with an existing rev_map is fetched incrementally from its last fetched revision.
+    """
+    branchUrl = reposRoot.rstrip('/') + ('/' + branchPath.strip('/') if branchPath.strip('/') else '')
+
+    revMapPath = _findRevMap(gitDir, gitRef)
+    revMap = revmap.RevMap(revMapPath) if revMapPath is not None else None
+    parentSha = None
+    incremental = False
+    if revMap is not None and revMap.MaxRev() is not None:
+        parentSha = revMap.FindSha(revMap.MaxRev(), before=True)
+        startRev = revMap.MaxRev() + 1
+        incremental = parentSha is not None
+
+    cmd = _dumpCommand(reposRoot, branchPath, startRev, incremental)
+    print("fetching {} from r{} with {}".format(branchUrl, startRev, cmd[0]), flush=True)
+    DebugLog.print(str(cmd))
+
+    try:
+        dump = subprocess.Popen(cmd, stdout=subprocess.PIPE)
+        importer = ImportDump(gitDir, dump.stdout, branchUrl, branchPath, gitRef, parentSha, revMap, ignoreRegex, dump)
+    finally:
+        if revMap is not None:
+            revMap.close()
+
+    if importer.lastRev is None:
+        print("no new revisions")
+    else:
+        print("fetched {} commits up to r{}".format(len(importer.revs), importer.lastRev))
@@ -2,8 +2,15 @@ import subprocess
 from git_svn.debug import DebugLog
 from git_svn import timeit
 from git_svn import svn
+from git_svn import revmap
+from git_svn import unhandledlog
+from git_svn import gitmeta
+from git_svn import branchpoint
 import os
-import re
+import urllib.parse
+
+# git-svn-id: <url>@<rev> <uuid>
+GIT_SVN_ID_REGEX = branchpoint.GIT_SVN_ID_REGEX
 
 @timeit
 def IsGitWc():
@@ -23,6 +30,10 @@ def IsGitWcDirty():
 
 @timeit
 def IsGitSvnRepo():
+    urls = gitmeta.GetConfigValues('svn-remote.svn.url')
+    if urls is not None:
+        return len(urls) > 0
+
     try: 
         subprocess.check_output(['git','config', '--local', '--get-regexp', 'svn-remote.svn.url'])
         return True
@@ -32,7 +43,28 @@ def IsGitSvnRepo():
         return False
 
 
+def _isAmbiguousBranchName(branchName):
+    """True if git would abbreviate refs/heads/<branchName> differently, i.e. another ref has the same short name"""
+    if branchName == 'HEAD':
+        return True
+    for ref in ('refs/' + branchName, 'refs/tags/' + branchName,
+                'refs/remotes/' + branchName, 'refs/remotes/' + branchName + '/HEAD'):
+        # None, i.e. can't tell, is ambiguous as well
+        if gitmeta.ResolveRef(ref) != "":
+            return True
+    return False
+
 def GetCurrentGitBranch():
+    head = gitmeta.GetHeadRef()
+    if head is not None:
+        if not head.startswith('refs/'):
+            # detached HEAD
+            return 'HEAD'
+        if head.startswith('refs/heads/') and gitmeta.ResolveRef(head):
+            branchName = head[len('refs/heads/'):]
+            if not _isAmbiguousBranchName(branchName):
+                return branchName
+
     output = subprocess.check_output(['git', 'rev-parse', '--abbrev-ref', '@']).decode()
     output = output.splitlines()
     assert len(output) == 1
@@ -45,7 +77,82 @@ def GitCountCommits(start, end):
     return len(output.splitlines())
 
 
+def GetGitDir():
+    gitDir = gitmeta.FindGitDir()
+    if gitDir is not None:
+        return os.path.abspath(gitDir)
+
+    output = subprocess.check_output(['git', 'rev-parse', '--git-dir']).decode()
+    return os.path.abspath(output.strip())
+
+def GetGitSvnBranchPoint():
+    """find the most recent git-svn commit in the first-parent history of HEAD
+
+    return a (git_sha:str, url:str, svn_rev:int, uuid:str) tuple
+    """
+    branchPoint = branchpoint.GetBranchPoint(GetGitDir())
+    if branchPoint is None:
+        raise Exception("no git-svn commit found in the history of HEAD")
+    return branchPoint
+
+def GetGitSvnRefForUrl(url):
+    """return the git-svn tracking ref (e.g. refs/remotes/git-svn/trunk) of an svn branch url
+
+    return None if the url is not tracked by the git-svn bridge
+    """
+    try:
+        cmd = ['git', 'config', '--get-regexp', r'^svn-remote\.svn\.(url|fetch)$']
+        output = subprocess.check_output(cmd).decode()
+    except subprocess.CalledProcessError:
+        return None
+
+    svnUrl = None
+    fetchDefs = []
+    for line in output.splitlines():
+        (key, sep, value) = line.partition(' ')
+        if key == 'svn-remote.svn.url':
+            svnUrl = value
+        else:
+            fetchDefs.append(value)
+
+    if svnUrl is None:
+        return None
+
+    url = urllib.parse.unquote(url).rstrip('/')
+    for fetchDef in fetchDefs:
+        (path, sep, ref) = fetchDef.rpartition(':')
+        branchUrl = urllib.parse.unquote(svnUrl).rstrip('/')
+        if path:
+            branchUrl += '/' + urllib.parse.unquote(path).strip('/')
+        if branchUrl == url:
+            return ref
+    return None
+
+def OpenRevMapForBranchPoint():
+    """open the git-svn rev_map of the svn branch HEAD is based on
+
+    return a (branch point, RevMap) tuple, with RevMap None if it doesn't exist
+    """
+    branchPoint = GetGitSvnBranchPoint()
+    (sha, url, svn_rev, uuid) = branchPoint
+
+    ref = GetGitSvnRefForUrl(url)
+    if ref is None:
+        DebugLog.print("no git-svn ref tracks: " + url)
+        return (branchPoint, None)
+
+    return (branchPoint, revmap.OpenRevMap(GetGitDir(), ref, uuid))
+
+@timeit
 def GetAssociatedGitShaForSvnRev(rev_int):
+    (branchPoint, revMap) = OpenRevMapForBranchPoint()
+    if revMap is not None:
+        with revMap:
+            commitSha = revMap.FindSha(rev_int)
+        if commitSha is None:
+            raise Exception("no git commit found for svn revision r" + str(rev_int))
+        return commitSha
+
     output = subprocess.check_output(['git', 'svn', 'find-rev', 'r'+str(rev_int)]).decode()
     output = output.splitlines()
     assert len(output) == 1
@@ -60,22 +167,10 @@ def checkout(commit_sha):
 @timeit
 def GetGitSvnBranchPointRev():
     # find the git commit where HEAD branched of from the SVN branch
-    cmd =  ['git', 'log', '--grep=^git-svn-id:', '--date-order', '-1', "--format=%H"]
-    DebugLog.print(str(cmd))
-    output = subprocess.check_output(cmd).decode()
-    DebugLog.print(output)
-    output = output.splitlines()
-    assert len(output) == 1
-    gitSvnBranchPoint_gitSHA = output[0]
-    
-    # determine the Svn commit revision associated with the branch point
-    cmd  = ['git', 'svn' , 'find-rev', '-B', str(gitSvnBranchPoint_gitSHA)]
-    DebugLog.print(str(cmd))
-    output = subprocess.check_output(cmd).decode()
-    DebugLog.print(output)    
-    output = output.splitlines()
-    assert len(output) == 1
-    gitSvnBranchPoint_SvnRev = output[0]
+    # its svn revision is recorded in the git-svn-id of the commit message,
+    # which is exactly what `git svn find-rev <sha>` would report.
+    (gitSvnBranchPoint_gitSHA, url, svn_rev, uuid) = GetGitSvnBranchPoint()
+    gitSvnBranchPoint_SvnRev = str(svn_rev)
     DebugLog.print("git-svn branchpoint (git-Sha - svn-Rev): " + gitSvnBranchPoint_gitSHA + " - " + gitSvnBranchPoint_SvnRev)
     return (gitSvnBranchPoint_gitSHA, gitSvnBranchPoint_SvnRev)
 
@@ -87,34 +182,136 @@ def find_svn_branch_point_for_current_gitbranch():
     # find the git commit where HEAD branched of from the SVN branch
     # i.e. find the most recent contained commit with a log entry as follows
     # git-svn-id: http://vsrv-bele-svn1/svn/Software/Main/NMAPI/NMAPI_Main@72264 cfd94225-6148-4c34-bb2a-21ea3148c527
-    cmd =  ['git', 'log', '--grep=^git-svn-id:', '--date-order', '-1']
-    
-    DebugLog.print(str(cmd))
-    output = subprocess.check_output(cmd).decode()
-    m = re.search(r"git-svn-id: ([^@]*)@([0-9]*)", output)
-    url = m.group(1)
-    svn_rev = int(m.group(2))
+    (sha, url, svn_rev, uuid) = GetGitSvnBranchPoint()
     return (url, svn_rev)
 
 def GetGitSvnUrl():
+    urls = gitmeta.GetConfigValues('svn-remote.svn.url')
+    if urls:
+        return urls[-1]
+
+    # not in the repository config, yet it might still be in the global or system one
     output = subprocess.check_output(['git', 'config',  '--get', 'svn-remote.svn.url']).decode()
     output = output.splitlines()
     assert(len(output)==1)
     url = output[0]
     return url
 
+# {(gitDir, ref, uuid): (url, svn_rev) or None} copy sources looked up by this process
+_copySources = {}
+
+def GetGitSvnCopySource(ref, url, uuid):
+    """the (url, svn_rev) an svn branch was copied from, as followed by git-svn
+
+    i.e. the git-svn-id of the parent of the first git-svn commit of the branch url,
+    which is the first record of the rev_map, or else found in the history of the ref.
+    return None if that commit has no parent git-svn commit
+    """
+    gitDir = GetGitDir()
+    key = (gitDir, ref, uuid)
+    if key not in _copySources:
+        _copySources[key] = _findGitSvnCopySource(gitDir, ref, url, uuid)
+    return _copySources[key]
+
+def _findGitSvnCopySource(gitDir, ref, url, uuid):
+    firstSha = None
+    revMap = revmap.OpenRevMap(gitDir, ref, uuid)
+    if revMap is not None:
+        with revMap:
+            firstSha = revMap.FindSha(0, after=True)
+
+    if firstSha is None:
+        # the git-svn-id urls are uri escaped
+        url = urllib.parse.unquote(url).rstrip('/')
+        for (sha, commitUrl, svn_rev, commitUuid) in revmap.ReadGitSvnIds(ref):
+            if urllib.parse.unquote(commitUrl).rstrip('/') == url:
+                firstSha = sha
+        if firstSha is None:
+            return None
+
+    cmd = ['git', 'log', '-1', '--format=%P', firstSha, '--']
+    DebugLog.print(str(cmd))
+    parents = subprocess.check_output(cmd).decode().split()
+    if not parents:
+        return None
+
+    gitSvnIds = revmap.ReadGitSvnIds(parents[0])
+    try:
+        parentId = next(gitSvnIds, None)
+    finally:
+        gitSvnIds.close()
+    if parentId is None:
+        return None
+    (sha, parentUrl, parentRev, parentUuid) = parentId
+    return (parentUrl, parentRev)
+
+def _getSvnExternalsPropertiesFromUnhandledLog(url, svn_rev, uuid):
+    """the svn:externals properties of an svn branch at svn_rev, by branch relative path
+
+    a branch copy only records the properties that changed since the copy, the
+    inherited ones are looked up in the unhandled.log of its copy source.
+    return None if an unhandled.log is not available
+    """
+    ref = GetGitSvnRefForUrl(url)
+    if ref is None:
+        DebugLog.print("no git-svn ref tracks: " + url)
+        return None
+
+    logPath = unhandledlog.GetUnhandledLogPath(GetGitDir(), ref)
+    if not os.path.isfile(logPath):
+        DebugLog.print("no unhandled.log found: " + logPath)
+        return None
+
+    base = None
+    copySource = GetGitSvnCopySource(ref, url, uuid)
+    if copySource is not None:
+        (sourceUrl, copyRev) = copySource
+        DebugLog.print("{} was copied from {}@{}".format(url, sourceUrl, copyRev))
+        base = _getSvnExternalsPropertiesFromUnhandledLog(sourceUrl, copyRev, uuid)
+        if base is None:
+            return None
+
+    return unhandledlog.ExternalsIndex.forLog(logPath).ExternalsAt(svn_rev, base)
+
 @timeit
-def GetSvnExternalsFromGitSvnBridge():
+def GetSvnExternalsFromUnhandledLog(hostRepoUrl):
+    """the svn externals in effect at the git-svn branch point of HEAD, as recorded in unhandled.log
+
+    return None if the unhandled.log of the svn branch (or of the branch it was copied from) is not available
+    """
+    (sha, url, svn_rev, uuid) = GetGitSvnBranchPoint()
+    properties = _getSvnExternalsPropertiesFromUnhandledLog(url, svn_rev, uuid)
+    if properties is None:
+        return None
+
+    externalDefinitions = []
+    for path in sorted(properties):
+        svnWCFolderPath = unhandledlog.ToSvnWCFolderPath(path)
+        for line in properties[path].splitlines():
+            line = line.strip()
+            if len(line) == 0 or line.startswith('#'):
+                continue
+            externalDefinitions.append(svn.SvnExternal.parse(hostRepoUrl, svnWCFolderPath, line))
+    return externalDefinitions
+
+def IterSvnExternalsFromGitSvnBridge():
+    """generator yielding the svn externals of the git-svn branch as soon as they are parsed
+
+    the externals of a single folder are yielded consecutively, parent folders first
+    """
     hostRepoUrl = GetGitSvnUrl()
 
+    externalDefinitions = GetSvnExternalsFromUnhandledLog(hostRepoUrl)
+    if externalDefinitions is not None:
+        yield from externalDefinitions
+        return
+
     # get all the svn:externals properties recursively
     cmd = ['git', 'svn',  'show-externals']
-    out = subprocess.check_output(cmd).decode()
 
     # parse the output line by line fail in case or problems
     currentPathDef = ""
-    externalDefinitions = []
-    for line in out.splitlines():
+    for line in svn.StreamOutputLines(cmd):
         if len(line) ==0:
             continue
 
@@ -134,7 +331,8 @@ def GetSvnExternalsFromGitSvnBridge():
         svnWCFolderPath = currentPathDef
         svnWCFolderPath = '.'+ svnWCFolderPath
         svnWCFolderPath.replace("/", os.sep)
-        externaldef = svn.SvnExternal.parse(hostRepoUrl, svnWCFolderPath , externaldefString)
-        externalDefinitions.append(externaldef)
-    
-    return externalDefinitions
+        yield svn.SvnExternal.parse(hostRepoUrl, svnWCFolderPath , externaldefString)
+
+@timeit
+def GetSvnExternalsFromGitSvnBridge():
+    return list(IterSvnExternalsFromGitSvnBridge())
@@ -6,9 +6,15 @@ based on a git-svn bridge definition described in a .gitsvn.yml file
 import argparse
 import sys
 import os
+import re
 import subprocess
+import urllib.parse
 from git_svn.debug import *
 from git_svn import git
+from git_svn import gitmeta
+from git_svn import gittransaction
+from git_svn import preflight
+from git_svn import revmap
 import yaml
 
 # global script cli arguments
@@ -36,6 +42,11 @@ def parse_cli_arg():
                     help="enable debug output",
                     action="store_true")
 
+    parser.add_argument("-j", "--jobs",
+                        help="number of rev_maps to rebuild in parallel (default: number of cpus)",
+                        type=int,
+                        default=None)
+
 
     args = parser.parse_args()
 
@@ -58,10 +69,12 @@ def main():
     args = parse_cli_arg()
 
     # sanity checking
-    if not git.IsGitWc():
+    checks = preflight.RunPreflight(checkSvn=False)
+
+    if not checks.isGitWc:
         raise Exception("cwd is not a git directory: " + os.getcwd())
 
-    if git.IsGitWcDirty():
+    if checks.isGitWcDirty:
         raise Exception("git wc is dirty. please commit or stash local changes first.")
 
     if not os.path.isfile(".gitsvn.yml"):
@@ -70,28 +83,58 @@ def main():
     with open(".gitsvn.yml", "tr") as f:
         git_svn_def = GitSvnDef.parseConfig(f.read())
 
-   
-    git_svn_init(git_svn_def.url)
+
+    # read the local config and the branch refs once, and collect all changes in a single transaction
+    tx = gittransaction.Transaction(gittransaction.ReadConfigSnapshot(),
+                                    gittransaction.ReadRefs(['refs/remotes/git-svn', 'refs/remotes/' + args.git_remote]))
+
+    git_svn_init(tx, git_svn_def.url)
 
     # add config key and git branch ref for each branch
     for branchpath in git_svn_def.branches:
-        add_git_svn_branch_configuration(branchpath)
-        set_git_svn_branch_reference(branchpath, args.git_remote)
+        add_git_svn_branch_configuration(tx, branchpath)
+        set_git_svn_branch_reference(tx, branchpath, args.git_remote)
 
     # add the ignore-paths config key
-    add_git_svn_ignore_paths(git_svn_def.ignore_paths)
+    add_git_svn_ignore_paths(tx, git_svn_def.ignore_paths)
+
+    tx.commit(args.dry_run)
 
-    # trick git-svn into rebuilding the rev_map by querying the svn info
-    cli_cmd = ['git', 'svn', 'info']
-    DebugLog.print(str(cli_cmd))
+    # build the rev_map of every tracked branch from the git-svn-id of its commits,
+    # instead of tricking git-svn into rebuilding them one after the other by querying the svn info
+    branches = [(git_ref, git_svn_def.url.rstrip('/') + '/' + svn_path.strip('/'))
+                for (svn_path, git_ref) in _parseFetchDefs(tx.values('svn-remote.svn.fetch')).items()]
+    DebugLog.print("rebuilding the rev_maps of: " + str(branches))
     if args.dry_run:
         return
-    subprocess.call(cli_cmd)
+    for (git_ref, path) in revmap.BuildRevMaps(git.GetGitDir(), branches, args.jobs).items():
+        if path is None:
+            print("no git-svn commits found for: " + git_ref, flush=True)
 
 
 
 
-def git_svn_init(url):
+def canonicalize_svn_url(url):
+    """the url as `git svn init` stores it in svn-remote.svn.url (cf. canonicalize_url of git-svn)
+
+    i.e. a lower case scheme and host, without empty or '.' path segments and the
+    trailing '/', and the special characters of the path uri escaped.
+    """
+    m = re.match(r'^([^:]+)://([^/]*)(.*)$', url)
+    if m is None:
+        return url.rstrip('/')
+
+    (scheme, host, path) = m.groups()
+    segments = []
+    for segment in path.split('/'):
+        if segment in ('', '.'):
+            continue
+        # a '%' that doesn't start an escape sequence is escaped itself
+        segment = re.sub(r'%(?![0-9a-fA-F]{2})', '%25', segment)
+        segments.append(urllib.parse.quote(segment, safe="!$%&'()*+,:=@_`~-"))
+    return scheme.lower() + '://' + host.lower() + ''.join('/' + s for s in segments)
+
+def git_svn_init(tx, url):
     """initialization of the git-svn bridge
     
     this function is idempotent. It will initialize the git-svn bridge irrespective of wheter 
@@ -99,24 +142,15 @@ def git_svn_init(url):
 
     initialization will fail if the git repo has a git-svn bridge for another svn repo.
     """
-    global args
-    currentUrl = git_get_config_key("svn-remote.svn.url")
+    url = canonicalize_svn_url(url)
+    currentUrl = tx.get("svn-remote.svn.url")
     
     if currentUrl is None:
         print("initializing the git-svn bridge for: " + url, flush=True)
 
         # not a git-svn bridge yet, so initialize it
-        cli_cmd =["git", "svn",  "init", url]
-
-        DebugLog.print(str(cli_cmd))
-        if args.dry_run:
-            return
-        
-        output = subprocess.check_output(cli_cmd).decode()
-
-        # remove the nonsensical auto generated svn.remote.svn.fetch config keys
-        git_unsetall_config_key("svn-remote.svn.fetch")
-
+        # like `git svn init <url>` does, yet without its nonsensical auto generated svn-remote.svn.fetch config key
+        tx.setConfig("svn-remote.svn.url", url)
         return
 
     
@@ -127,15 +161,14 @@ def git_svn_init(url):
     assert currentUrl == url
     DebugLog.print("git-svn bridge is already initalized for: " + url)
 
-def add_git_svn_branch_configuration(svn_branch_path:str):
+def add_git_svn_branch_configuration(tx, svn_branch_path:str):
     """idenpotent git-svn branch configuration """
-    global args
 
     branch_name = os.path.basename(svn_branch_path)
 
     git_ref = "refs/remotes/git-svn/{}".format(branch_name)
 
-    svn_git_fetchMap = GitSvnConfigFetchDef()
+    svn_git_fetchMap = _parseFetchDefs(tx.values("svn-remote.svn.fetch"))
 
     if svn_branch_path in svn_git_fetchMap and git_ref == svn_git_fetchMap[svn_branch_path]:
         # nothign to do this config key already exists
@@ -157,19 +190,18 @@ Can't add second tracking branch reference: {}""".format(svn_git_fetchMap[svn_br
 the same branch reference can't track a second svn path: {}""".format("", svn_branch_path))
 
     # add the svn-remote.svn.fetch config key as it does not yet exists
-    git_add_config_key("svn-remote.svn.fetch", "%s:refs/remotes/git-svn/%s" % (svn_branch_path, branch_name))
+    tx.addConfig("svn-remote.svn.fetch", "%s:%s" % (svn_branch_path, git_ref))
 
 
-def set_git_svn_branch_reference(svn_branch_path:str, git_remote:str):
+def set_git_svn_branch_reference(tx, svn_branch_path:str, git_remote:str):
     """idempotent git-svn branch reference creation"""
-    global args
     branch_name = os.path.basename(svn_branch_path)
 
     svn_ref = "refs/remotes/git-svn/{}".format(branch_name)
     git_ref = "refs/remotes/{}/{}".format(git_remote, branch_name)
 
-    svn_ref_branch_hash = branch_exists(svn_ref)
-    git_ref_branch_hash = branch_exists(git_ref)
+    svn_ref_branch_hash = tx.resolveRef(svn_ref)
+    git_ref_branch_hash = tx.resolveRef(git_ref)
 
     # check if the git_ref exists
     if not git_ref_branch_hash:
@@ -183,13 +215,7 @@ Source branch reference does not exists: {}
         assert(git_ref_branch_hash)
         # create the svn branch ref based on the git branch ref
         print("Adding git-svn branch reference for: " + svn_branch_path, flush=True)
-        cli_cmd = ['git', 'update-ref', svn_ref, git_ref]
-
-        DebugLog.print(str(cli_cmd))
-        if args.dry_run:
-            return
-        output = subprocess.check_output(cli_cmd).decode()
-        DebugLog.print(output)
+        tx.updateRef(svn_ref, git_ref_branch_hash)
         return
 
 
@@ -214,13 +240,7 @@ Source branch reference does not exists: {}
             # assume the user know what he is doing
             # create the svn branch ref based on the git branch ref
             print("moving git-svn branch reference for: " + svn_branch_path, flush=True)
-            cli_cmd = ['git', 'update-ref', svn_ref, git_ref]
-
-            DebugLog.print(str(cli_cmd))
-            if args.dry_run:
-                return
-            output = subprocess.check_output(cli_cmd).decode()
-            DebugLog.print(output)
+            tx.updateRef(svn_ref, git_ref_branch_hash)
             return
     
     # BUG: all possible cases should have been handled.
@@ -230,12 +250,11 @@ Source branch reference does not exists: {}
 
 
 
-def add_git_svn_ignore_paths(ignore_paths:list):
+def add_git_svn_ignore_paths(tx, ignore_paths:list):
     """add the ignore_paths to the git-svn bridge config
     """
-    global args
 
-    ignore_paths_value = git_get_config_key("svn-remote.svn.ignore-paths")
+    ignore_paths_value = tx.get("svn-remote.svn.ignore-paths")
 
         
     if not ignore_paths:
@@ -252,7 +271,7 @@ def add_git_svn_ignore_paths(ignore_paths:list):
         elif args.force:
             # assume the user known what he is doing and delete the config key
             assert ignore_paths_value is not None
-            git_unset_config_key("svn-remote.svn.ignore-paths")
+            tx.unsetConfig("svn-remote.svn.ignore-paths")
             return
         
         # BUG: all cases should have been handled already!
@@ -267,7 +286,7 @@ def add_git_svn_ignore_paths(ignore_paths:list):
 
     if ignore_paths_value is None:
         # git setting is not yet set, so do so now   
-        git_set_config_key("svn-remote.svn.ignore-paths", desired_ignore_paths_value)
+        tx.setConfig("svn-remote.svn.ignore-paths", desired_ignore_paths_value)
         return
     elif ignore_paths_value == desired_ignore_paths_value:
         # Nothing to do: ignore-path is already configured!
@@ -280,7 +299,7 @@ def add_git_svn_ignore_paths(ignore_paths:list):
         raise Exception(msg.format(ignore_paths_value, desired_ignore_paths_value))
     elif args.force:
         assert ignore_paths_value != desired_ignore_paths_value
-        git_set_config_key("svn-remote.svn.ignore-paths", desired_ignore_paths_value)
+        tx.setConfig("svn-remote.svn.ignore-paths", desired_ignore_paths_value)
         return
 
         
@@ -288,115 +307,23 @@ def add_git_svn_ignore_paths(ignore_paths:list):
     assert False 
 
 
-
-def git_get_config_key(key:str) -> (None, str):
-    """get a local git configuration key value
-    return None if not set
-    return value otherwise (could be the empty string)"""
-
-    try:
-        cli = ["git", "config", "--local", "--get", key]
-        output = subprocess.check_output(cli).decode()
-        output = output.splitlines()
-        assert len(output) == 1
-        return output[0]
-
-    except subprocess.CalledProcessError as e:
-        assert e.returncode == 1 # a return code other then 1 means there is a bug!
-        return None
-
-def git_set_config_key(key:str, value:str):
-    """set a local git configuration key value"""
-    global args 
-    try:
-        print("setting config key {} = {}".format(key,value)) 
-
-        cli = ["git", "config", "--local", key, value]
-        DebugLog.print(str(cli))
-        if args.dry_run:
-            return
-        output = subprocess.check_output(cli).decode()
-        return
-
-    except subprocess.CalledProcessError as e:
-        assert e.returncode == 1 # a return code other then 1 means there is a bug!
-        return None
-
-def git_add_config_key(key:str, value:str):
-    """add a local git configuration key value"""
-    global args
-    try:
-        print("adding config key {} = {}".format(key,value)) 
-
-        cli = ["git", "config", "--local", "--add", key, value]
-        DebugLog.print(str(cli))
-        if args.dry_run:
-            return
-        output = subprocess.check_output(cli).decode()
-        return
-
-    except subprocess.CalledProcessError as e:
-        assert e.returncode == 1 # a return code other then 1 means there is a bug!
-        return None
-
-def git_unset_config_key(key:str):
-    """unset/delete a single key from a local git configuration """
-
-    try:
-        print("Unset/delete config key {}".format(key)) 
-
-        cli = ["git", "config", "--local", "--unset", key]
-        DebugLog.print(str(cli))
-        if args.dry_run:
-            return
-        output = subprocess.check_output(cli).decode()
-        return
-
-    except subprocess.CalledProcessError as e:
-        assert e.returncode == 1 # a return code other then 1 means there is a bug!
-        return None
-
-def git_unsetall_config_key(key:str):
-    """unset/delete all given keys from a local git configuration """
-    global args
-    try:
-        print("Unset/delete all config keys {}".format(key)) 
-        cli = ["git", "config", "--local", "--unset-all", key]
-        DebugLog.print(str(cli))
-        if args.dry_run:
-            return
-        output = subprocess.check_output(cli).decode()
-        return
-
-    except subprocess.CalledProcessError as e:
-        assert e.returncode == 1 # a return code other then 1 means there is a bug!
-        return None
-
-
-def branch_exists(git_ref:str) -> str:
-    """check if a certain branch exists
-    returns "" if it does not exists (which evaluates to False)
-    return the hash value if it does exists (which evaluates to True)"""
-    # this can be executed even in dry_run mode since it doesn't make any changes
-    try:
-        hash_value = subprocess.check_output(['git', 'show-ref', '--hash', '--verify', git_ref]).decode()
-        return hash_value
-    except subprocess.CalledProcessError as e:
-        return "" 
-
     
+def _parseFetchDefs(values):
+    git_svn_map = {}
+    for line in values:
+        [svn_path, git_ref] = line.split(':')
+        git_svn_map[svn_path] = git_ref
+    return git_svn_map
 
 def GitSvnConfigFetchDef():
+    values = gitmeta.GetConfigValues('svn-remote.svn.fetch')
+    if values is not None:
+        return _parseFetchDefs(values)
+
     try:
         # this can be executed even in dry_run mode since it doesn't make any changes
         output = subprocess.check_output(['git', 'config', '--local', '--get-all', 'svn-remote.svn.fetch']).decode()
-
-        git_svn_map = {}
-        for line in output.splitlines():
-            [svn_path, git_ref] = line.split(':')
-            git_svn_map[svn_path] = git_ref
-
-        return git_svn_map
+        return _parseFetchDefs(output.splitlines())
 
     except subprocess.CalledProcessError as e:
         assert e.returncode == 1 # a return code other then 1 means there is a bug!
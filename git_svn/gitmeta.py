@@ -0,0 +1,401 @@
+"""
+read-only access to the git metadata (HEAD, refs, packed-refs and config)
+
+Simple git queries are answered by reading the files of the git dir instead of
+spawning a git process. Worktrees (the `.git` file and `commondir`), loose and
+packed refs, and config includes (`include.path`, `includeIf` on `gitdir:` and
+`onbranch:`) are supported. Every query returns None if the answer can't be
+derived from the files (e.g. GIT_DIR and friends are set, a reftable ref store,
+an unsupported includeIf condition), in which case the git cli should be used
+instead.
+"""
+import os
+import re
+
+from git_svn.debug import DebugLog
+
+# environment variables that change where or how git finds its metadata
+_GIT_ENVIRONMENT = ('GIT_DIR', 'GIT_WORK_TREE', 'GIT_COMMON_DIR', 'GIT_CONFIG', 'GIT_CONFIG_PARAMETERS',
+                    'GIT_CONFIG_COUNT', 'GIT_CEILING_DIRECTORIES', 'GIT_NAMESPACE', 'GIT_REF_STORAGE')
+
+# refs that are stored per worktree, all other refs are shared by the worktrees
+_PER_WORKTREE_REFS = ('refs/bisect/', 'refs/worktree/', 'refs/rewritten/')
+
+_SHA_REGEX = re.compile(r"^(?:[0-9a-f]{40}|[0-9a-f]{64})$")
+_REF_REGEX = re.compile(r"^(?:HEAD|refs/[^\\\0]+)$")
+
+# maximum nesting of config includes and symbolic refs
+_MAX_DEPTH = 10
+
+
+class Unsupported(Exception):
+    """the git metadata can't be read without git itself"""
+
+
+def _readFile(path):
+    with open(path, 'rt', encoding='utf-8', newline='') as f:
+        return f.read().replace('\r\n', '\n')
+
+
+def FindGitDir(path="."):
+    """return the git dir of the repository that contains path (like `git rev-parse --git-dir`)
+
+    return None if no git dir is found or git would look elsewhere
+    """
+    if any(name in os.environ for name in _GIT_ENVIRONMENT):
+        return None
+
+    path = os.path.abspath(path)
+    try:
+        device = os.stat(path).st_dev
+    except OSError:
+        return None
+
+    while True:
+        dotGit = os.path.join(path, '.git')
+        if os.path.isdir(dotGit):
+            return dotGit if os.path.isfile(os.path.join(dotGit, 'HEAD')) else None
+        if os.path.isfile(dotGit):
+            # a worktree or submodule: "gitdir: <path>"
+            try:
+                content = _readFile(dotGit).strip()
+            except OSError:
+                return None
+            if not content.startswith('gitdir:'):
+                return None
+            gitDir = os.path.normpath(os.path.join(path, content[len('gitdir:'):].strip()))
+            return gitDir if os.path.isfile(os.path.join(gitDir, 'HEAD')) else None
+
+        parent = os.path.dirname(path)
+        if parent == path:
+            return None
+        # git doesn't cross filesystem boundaries
+        if os.stat(parent).st_dev != device:
+            return None
+        path = parent
+
+
+def GetCommonDir(gitDir):
+    """the git dir shared by all worktrees of the repository"""
+    commondirPath = os.path.join(gitDir, 'commondir')
+    if not os.path.isfile(commondirPath):
+        return gitDir
+    return os.path.normpath(os.path.join(gitDir, _readFile(commondirPath).strip()))
+
+
+class GitConfig:
+    """the entries of a git config file, including the files it includes
+
+    entries are (key, value) tuples in file order, the key is normalized, i.e. the
+    section and variable name are lower case. A variable without '=' has an empty
+    value, just like `git config --get` prints it.
+    """
+
+    def __init__(self, gitDir):
+        self.gitDir = gitDir
+        self.entries = []
+
+    @staticmethod
+    def NormalizeKey(key):
+        (section, sep, remainder) = key.partition('.')
+        (subsection, sep2, name) = remainder.rpartition('.')
+        if not sep or not name:
+            raise Unsupported("invalid config key: " + key)
+        if sep2:
+            return section.lower() + '.' + subsection + '.' + name.lower()
+        return section.lower() + '.' + name.lower()
+
+    def values(self, key):
+        """all values of the key, in config order"""
+        key = GitConfig.NormalizeKey(key)
+        return [v for (k, v) in self.entries if k == key]
+
+    def read(self, path, depth=0):
+        if depth > _MAX_DEPTH:
+            raise Unsupported("config include depth exceeded: " + path)
+        text = _readFile(path)
+        for (key, value) in _parseConfig(text, path):
+            self.entries.append((key, value))
+            self._include(key, value, path, depth)
+
+    def _include(self, key, value, path, depth):
+        if key == 'include.path':
+            self._readInclude(value, path, depth)
+            return
+
+        if not key.startswith('includeif.') or not key.endswith('.path'):
+            return
+        condition = key[len('includeif.'):-len('.path')]
+        if _matchIncludeCondition(condition, self.gitDir, path):
+            self._readInclude(value, path, depth)
+
+    def _readInclude(self, includePath, path, depth):
+        if not includePath:
+            return
+        includePath = os.path.expanduser(includePath)
+        if not os.path.isabs(includePath):
+            includePath = os.path.join(os.path.dirname(path), includePath)
+        if os.path.isfile(includePath):
+            # git silently ignores missing includes
+            self.read(includePath, depth + 1)
+
+
+def _parseValue(text, pos, path):
+    """parse a config value up to the end of its line, return a (value, next pos) tuple"""
+    value = []
+    pendingSpace = []
+    quoted = False
+    while pos < len(text):
+        c = text[pos]
+        pos += 1
+        if c == '\n':
+            if quoted:
+                raise Unsupported("unterminated quote in " + path)
+            break
+        if c in ' \t' and not quoted:
+            if value:
+                pendingSpace.append(c)
+            continue
+        if c in '#;' and not quoted:
+            while pos < len(text) and text[pos] != '\n':
+                pos += 1
+            continue
+
+        if c == '\\':
+            escaped = text[pos] if pos < len(text) else ''
+            pos += 1
+            if escaped == '\n':
+                # line continuation
+                continue
+            escapes = {'\\': '\\', '"': '"', 'n': '\n', 't': '\t', 'b': '\b'}
+            if escaped not in escapes:
+                raise Unsupported("invalid escape in " + path)
+            c = escapes[escaped]
+        elif c == '"':
+            value += pendingSpace
+            pendingSpace = []
+            quoted = not quoted
+            continue
+
+        value += pendingSpace
+        pendingSpace = []
+        value.append(c)
+    return (''.join(value), pos)
+
+
+def _parseSectionHeader(text, pos, path):
+    """parse a [section "subsection"] header, return a (key prefix, next pos) tuple"""
+    end = pos
+    while end < len(text) and (text[end].isalnum() or text[end] in '-.'):
+        end += 1
+    name = text[pos:end]
+    if not name:
+        raise Unsupported("invalid section header in " + path)
+
+    if text.startswith(']', end):
+        if '.' in name:
+            # deprecated [section.subsection] syntax
+            (section, sep, subsection) = name.partition('.')
+            return (section.lower() + '.' + subsection.lower() + '.', end + 1)
+        return (name.lower() + '.', end + 1)
+
+    pos = end
+    while pos < len(text) and text[pos] in ' \t':
+        pos += 1
+    if not text.startswith('"', pos) or '.' in name:
+        raise Unsupported("invalid section header in " + path)
+    pos += 1
+    subsection = []
+    while pos < len(text) and text[pos] != '"':
+        if text[pos] == '\n':
+            raise Unsupported("invalid section header in " + path)
+        if text[pos] == '\\':
+            pos += 1
+        subsection.append(text[pos])
+        pos += 1
+    if not text.startswith('"]', pos):
+        raise Unsupported("invalid section header in " + path)
+    return (name.lower() + '.' + ''.join(subsection) + '.', pos + 2)
+
+
+def _parseConfig(text, path):
+    """generator yielding the (normalized key, value) entries of a config file"""
+    prefix = None
+    pos = 0
+    while pos < len(text):
+        c = text[pos]
+        if c in ' \t\n':
+            pos += 1
+        elif c in '#;':
+            while pos < len(text) and text[pos] != '\n':
+                pos += 1
+        elif c == '[':
+            (prefix, pos) = _parseSectionHeader(text, pos + 1, path)
+        elif c.isalpha():
+            if prefix is None:
+                raise Unsupported("config variable outside a section in " + path)
+            end = pos
+            while end < len(text) and (text[end].isalnum() or text[end] == '-'):
+                end += 1
+            key = prefix + text[pos:end].lower()
+            pos = end
+            while pos < len(text) and text[pos] in ' \t':
+                pos += 1
+            if text.startswith('=', pos):
+                (value, pos) = _parseValue(text, pos + 1, path)
+            elif pos >= len(text) or text[pos] in '\n#;':
+                value = ''
+            else:
+                raise Unsupported("invalid config line in " + path)
+            yield (key, value)
+        else:
+            raise Unsupported("invalid config line in " + path)
+
+
+def _wildmatchToRegex(pattern):
+    """translate a git wildmatch pattern (with '**' matching across '/') into a regex"""
+    regex = ''
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith('**/', i):
+            regex += '(?:.*/)?'
+            i += 3
+        elif pattern.startswith('**', i):
+            regex += '.*'
+            i += 2
+        elif pattern[i] == '*':
+            regex += '[^/]*'
+            i += 1
+        elif pattern[i] == '?':
+            regex += '[^/]'
+            i += 1
+        elif pattern[i] == '[':
+            end = pattern.find(']', i + 2)
+            if end == -1:
+                raise Unsupported("invalid includeIf pattern: " + pattern)
+            charClass = pattern[i + 1:end]
+            if charClass.startswith('!'):
+                charClass = '^' + charClass[1:]
+            regex += '[' + charClass.replace('\\', '\\\\') + ']'
+            i = end + 1
+        else:
+            regex += re.escape(pattern[i])
+            i += 1
+    return regex
+
+
+def _matchIncludeCondition(condition, gitDir, path):
+    """True if the includeIf condition holds for the repository"""
+    if condition.startswith('gitdir:') or condition.startswith('gitdir/i:'):
+        (kind, sep, pattern) = condition.partition(':')
+        if pattern.startswith('~/'):
+            pattern = os.path.expanduser(pattern)
+        elif pattern.startswith('./'):
+            pattern = os.path.join(os.path.dirname(os.path.realpath(path)), pattern[2:])
+        elif not os.path.isabs(pattern):
+            pattern = '**/' + pattern
+        if pattern.endswith('/'):
+            pattern += '**'
+
+        flags = re.IGNORECASE if kind == 'gitdir/i' else 0
+        candidates = set([os.path.abspath(gitDir), os.path.realpath(gitDir)])
+        regex = re.compile(_wildmatchToRegex(pattern.replace(os.sep, '/')) + '$', flags)
+        return any(regex.match(c.replace(os.sep, '/')) for c in candidates)
+
+    if condition.startswith('onbranch:'):
+        pattern = condition[len('onbranch:'):]
+        if pattern.endswith('/'):
+            pattern += '**'
+        head = _readHead(gitDir)
+        if not head.startswith('refs/heads/'):
+            return False
+        return re.match(_wildmatchToRegex(pattern) + '$', head[len('refs/heads/'):]) is not None
+
+    raise Unsupported("unsupported includeIf condition: " + condition)
+
+
+def ReadConfig(gitDir):
+    """the repository (i.e. --local) config of the git dir"""
+    config = GitConfig(gitDir)
+    configPath = os.path.join(GetCommonDir(gitDir), 'config')
+    if os.path.isfile(configPath):
+        config.read(configPath)
+
+    storage = config.values('extensions.refStorage')
+    if storage and storage[-1] != 'files':
+        raise Unsupported("unsupported ref storage: " + storage[-1])
+    return config
+
+
+def _readHead(gitDir):
+    """the content of HEAD, i.e. a ref name or a sha"""
+    content = _readFile(os.path.join(gitDir, 'HEAD')).strip()
+    if content.startswith('ref:'):
+        return content[len('ref:'):].strip()
+    if _SHA_REGEX.match(content):
+        return content
+    raise Unsupported("invalid HEAD: " + content)
+
+
+def _readPackedRef(commonDir, ref):
+    packedRefsPath = os.path.join(commonDir, 'packed-refs')
+    if not os.path.isfile(packedRefsPath):
+        return ""
+    for line in _readFile(packedRefsPath).splitlines():
+        if line.startswith('#') or line.startswith('^'):
+            continue
+        (sha, sep, name) = line.partition(' ')
+        if name == ref:
+            return sha
+    return ""
+
+
+def _resolveRef(gitDir, ref, depth=0):
+    """the sha of a full ref name, "" if it doesn't exist"""
+    if depth > _MAX_DEPTH or not _REF_REGEX.match(ref) or '..' in ref.split('/'):
+        raise Unsupported("can't resolve ref: " + ref)
+
+    commonDir = GetCommonDir(gitDir)
+    isPerWorktree = ref == 'HEAD' or any(ref.startswith(p) for p in _PER_WORKTREE_REFS)
+    loosePath = os.path.join(gitDir if isPerWorktree else commonDir, ref.replace('/', os.sep))
+
+    if os.path.isfile(loosePath):
+        content = _readFile(loosePath).strip()
+        if content.startswith('ref:'):
+            return _resolveRef(gitDir, content[len('ref:'):].strip(), depth + 1)
+        if not _SHA_REGEX.match(content):
+            raise Unsupported("invalid ref: " + loosePath)
+        return content
+
+    if isPerWorktree:
+        return ""
+    return _readPackedRef(commonDir, ref)
+
+
+def _query(path, func):
+    """run func(gitDir, config) on the git dir that contains path, None if git itself is needed"""
+    gitDir = FindGitDir(path)
+    if gitDir is None:
+        return None
+
+    try:
+        # the config is always read, it can switch to a ref storage that isn't supported
+        return func(gitDir, ReadConfig(gitDir))
+    except (Unsupported, OSError, UnicodeDecodeError) as e:
+        DebugLog.print("git metadata not readable: " + str(e))
+        return None
+
+
+def GetConfigValues(key, path="."):
+    """all values of a key in the repository config (like `git config --local --get-all`)"""
+    return _query(path, lambda gitDir, config: config.values(key))
+
+
+def GetHeadRef(path="."):
+    """the full ref name that HEAD points to, or the sha of a detached HEAD"""
+    return _query(path, lambda gitDir, config: _readHead(gitDir))
+
+
+def ResolveRef(ref, path="."):
+    """the sha of a full ref name (e.g. refs/remotes/git-svn/trunk), "" if the ref doesn't exist"""
+    return _query(path, lambda gitDir, config: _resolveRef(gitDir, ref))
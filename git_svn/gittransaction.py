@@ -0,0 +1,339 @@
+"""
+transactional update of the local git config and refs
+
+The local config and the refs of interest are read once into a snapshot. The
+desired changes are collected in memory by a `Transaction` and applied at once:
+the config file is rewritten under git's own `config.lock`, and all refs are
+updated by a single `git update-ref --stdin` transaction.
+
+The config file is only replaced if it didn't change since the snapshot, and the
+ref updates verify the old value of every ref, so concurrent changes make the
+transaction fail instead of being overwritten.
+"""
+import collections
+import os
+import re
+import subprocess
+
+from git_svn.debug import DebugLog
+from git_svn import gitmeta
+
+# [section], [section.subsection] or [section "subsection"], optionally followed by a variable
+_SECTION_REGEX = re.compile(r'^\s*\[\s*([A-Za-z0-9.-]+)(?:\s+"((?:[^"\\\n]|\\.)*)")?\s*\]')
+_VARIABLE_REGEX = re.compile(r'^\s*([A-Za-z][A-Za-z0-9-]*)\s*(?:[=#;]|$)')
+
+
+def _getLocalConfigPath():
+    gitDir = gitmeta.FindGitDir()
+    if gitDir is not None:
+        return os.path.join(gitmeta.GetCommonDir(gitDir), 'config')
+
+    cmd = ['git', 'rev-parse', '--git-common-dir']
+    DebugLog.print(str(cmd))
+    output = subprocess.check_output(cmd).decode()
+    return os.path.join(output.strip(), 'config')
+
+
+def _readText(path):
+    if not os.path.isfile(path):
+        return ""
+    with open(path, 'rt', encoding='utf-8', newline='') as f:
+        return f.read()
+
+
+class ConfigSnapshot:
+    """the entries of the local git config at a point in time
+
+    entries are (key, value) tuples in config order, with the key normalized like
+    `git config --list` prints it. The raw text of the config file is kept to
+    detect concurrent changes.
+    """
+
+    def __init__(self, path, text, entries):
+        self.path = path
+        self.text = text
+        self.entries = entries
+
+    def values(self, key):
+        """all values of the key, in config order"""
+        key = gitmeta.GitConfig.NormalizeKey(key)
+        return [v for (k, v) in self.entries if k == key]
+
+    def get(self, key):
+        """the last value of the key, None if it is not set"""
+        values = self.values(key)
+        return values[-1] if values else None
+
+
+def ReadConfigSnapshot():
+    """snapshot of the local git config, read by a single `git config --local --list -z`"""
+    path = _getLocalConfigPath()
+    text = _readText(path)
+
+    cmd = ['git', 'config', '--local', '--list', '-z']
+    DebugLog.print(str(cmd))
+    output = subprocess.check_output(cmd).decode()
+
+    entries = []
+    for record in output.split('\0'):
+        if not record:
+            continue
+        # a variable without '=' has no value line, `git config --get` prints it as an empty value
+        (key, sep, value) = record.partition('\n')
+        entries.append((key, value))
+    return ConfigSnapshot(path, text, entries)
+
+
+def ReadRefs(patterns):
+    """the {ref: sha} of all refs matching the `git for-each-ref` patterns (e.g. refs/remotes/git-svn)"""
+    cmd = ['git', 'for-each-ref', '--format=%(objectname) %(refname)'] + list(patterns)
+    DebugLog.print(str(cmd))
+    output = subprocess.check_output(cmd).decode()
+
+    refs = {}
+    for line in output.splitlines():
+        (sha, sep, ref) = line.partition(' ')
+        refs[ref] = sha
+    return refs
+
+
+def _splitKey(key):
+    """split a normalized key into a (section prefix, variable name) tuple"""
+    (prefix, sep, name) = key.rpartition('.')
+    return (prefix + '.', name)
+
+
+def _sectionPrefix(match):
+    name = match.group(1)
+    subsection = match.group(2)
+    if subsection is not None:
+        return name.lower() + '.' + re.sub(r'\\(.)', r'\1', subsection) + '.'
+    if '.' in name:
+        # deprecated [section.subsection] syntax
+        (section, sep, subsection) = name.partition('.')
+        return section.lower() + '.' + subsection.lower() + '.'
+    return name.lower() + '.'
+
+
+def _formatSectionHeader(prefix):
+    (section, sep, subsection) = prefix[:-1].partition('.')
+    if not sep:
+        return '[{}]\n'.format(section)
+    return '[{} "{}"]\n'.format(section, subsection.replace('\\', '\\\\').replace('"', '\\"'))
+
+
+def _formatVariable(name, value):
+    quote = value != value.strip() or '#' in value or ';' in value
+    value = value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n').replace('\t', '\\t')
+    if quote:
+        value = '"' + value + '"'
+    return '\t{} = {}\n'.format(name, value)
+
+
+def _continues(line):
+    """True if the value of a config line continues on the next line"""
+    line = line.rstrip('\r\n')
+    if line.lstrip().startswith(('#', ';')):
+        return False
+    return (len(line) - len(line.rstrip('\\'))) % 2 == 1
+
+
+def _rewriteConfig(text, changes):
+    """the config text with the {key: (replace, values)} changes applied
+
+    the lines of a replaced key are removed. The new values are appended to the last
+    section of the key, or to a new section at the end of the file.
+    """
+    replaced = set(key for (key, (replace, values)) in changes.items() if replace)
+
+    lines = text.splitlines(True)
+    out = []
+    sectionEnd = {}
+    prefix = None
+    i = 0
+    while i < len(lines):
+        entry = [lines[i]]
+        while _continues(entry[-1]) and i + 1 < len(lines):
+            i += 1
+            entry.append(lines[i])
+        i += 1
+
+        line = entry[0]
+        m = _SECTION_REGEX.match(line)
+        if m:
+            prefix = _sectionPrefix(m)
+            variable = _VARIABLE_REGEX.match(line[m.end():])
+            if variable and prefix + variable.group(1).lower() in replaced:
+                # keep the header, drop the variable on the same line
+                entry = [line[:m.end()] + '\n']
+        else:
+            variable = _VARIABLE_REGEX.match(line)
+            if variable and prefix is not None and prefix + variable.group(1).lower() in replaced:
+                continue
+
+        out.extend(entry)
+        if prefix is not None:
+            sectionEnd[prefix] = len(out)
+
+    if out and not out[-1].endswith('\n'):
+        out[-1] += '\n'
+
+    additions = collections.OrderedDict()
+    for (key, (replace, values)) in changes.items():
+        (keyPrefix, name) = _splitKey(key)
+        additions.setdefault(keyPrefix, []).extend(_formatVariable(name, v) for v in values)
+
+    appended = []
+    for (keyPrefix, variables) in additions.items():
+        if not variables:
+            continue
+        if keyPrefix in sectionEnd:
+            end = sectionEnd[keyPrefix]
+            out[end:end] = variables
+            for p in sectionEnd:
+                if sectionEnd[p] >= end:
+                    sectionEnd[p] += len(variables)
+        else:
+            appended.append(_formatSectionHeader(keyPrefix))
+            appended.extend(variables)
+
+    return ''.join(out + appended)
+
+
+class Transaction:
+    """the desired changes of the local git config and refs, relative to a snapshot
+
+    usage:
+        tx = Transaction(ReadConfigSnapshot(), ReadRefs(['refs/remotes']))
+        tx.addConfig('svn-remote.svn.fetch', 'trunk:refs/remotes/git-svn/trunk')
+        tx.updateRef('refs/remotes/git-svn/trunk', sha)
+        tx.commit()
+    """
+
+    def __init__(self, snapshot, refs):
+        self.snapshot = snapshot
+        self.refs = refs
+        self._config = collections.OrderedDict()
+        self._refUpdates = collections.OrderedDict()
+
+    def values(self, key):
+        """all values of the config key, including the changes of this transaction"""
+        key = gitmeta.GitConfig.NormalizeKey(key)
+        if key in self._config:
+            return list(self._config[key])
+        return self.snapshot.values(key)
+
+    def get(self, key):
+        """the last value of the config key, None if it is not set"""
+        values = self.values(key)
+        return values[-1] if values else None
+
+    def resolveRef(self, ref):
+        """the sha of the ref, including the changes of this transaction, "" if it doesn't exist"""
+        if ref in self._refUpdates:
+            return self._refUpdates[ref]
+        return self.refs.get(ref, "")
+
+    def setConfig(self, key, value):
+        """replace all values of the config key by value"""
+        self._config[gitmeta.GitConfig.NormalizeKey(key)] = [value]
+
+    def addConfig(self, key, value):
+        """add a value to the config key"""
+        values = self.values(key)
+        self._config[gitmeta.GitConfig.NormalizeKey(key)] = values + [value]
+
+    def unsetConfig(self, key):
+        """remove all values of the config key"""
+        self._config[gitmeta.GitConfig.NormalizeKey(key)] = []
+
+    def updateRef(self, ref, sha):
+        """create or move the ref to sha"""
+        self._refUpdates[ref] = sha
+
+    def configChanges(self):
+        """the {key: (replace, values)} changes of the config
+
+        replace is False if the values are only appended to the current ones
+        """
+        changes = collections.OrderedDict()
+        for (key, values) in self._config.items():
+            current = self.snapshot.values(key)
+            if values == current:
+                continue
+            if values[:len(current)] == current:
+                changes[key] = (False, values[len(current):])
+            else:
+                changes[key] = (True, values)
+        return changes
+
+    def refCommands(self):
+        """the `git update-ref --stdin` commands, verifying the old value of every ref"""
+        commands = []
+        for (ref, sha) in self._refUpdates.items():
+            oldSha = self.refs.get(ref, "")
+            if sha == oldSha:
+                continue
+            if oldSha:
+                commands.append('update {} {} {}'.format(ref, sha, oldSha))
+            else:
+                commands.append('create {} {}'.format(ref, sha))
+        return commands
+
+    def describe(self):
+        """the lines describing the exact transaction"""
+        lines = []
+        changes = self.configChanges()
+        if changes:
+            lines.append("git config transaction on: " + self.snapshot.path)
+            for (key, (replace, values)) in changes.items():
+                if replace:
+                    lines.append("  unset-all " + key)
+                for value in values:
+                    lines.append("  add {} {}".format(key, value))
+
+        commands = self.refCommands()
+        if commands:
+            lines.append("git update-ref --stdin transaction:")
+            lines.extend("  " + c for c in commands)
+        return lines
+
+    def commit(self, dry_run=False):
+        """apply the transaction, or only print it on a dry run"""
+        for line in self.describe():
+            print(line, flush=True)
+        if dry_run:
+            return
+
+        changes = self.configChanges()
+        commands = self.refCommands()
+        if not changes:
+            self._updateRefs(commands)
+            return
+
+        path = self.snapshot.path
+        lockPath = path + '.lock'
+        try:
+            fd = os.open(lockPath, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+        except FileExistsError:
+            raise Exception("the git config is locked by another process: " + lockPath)
+
+        try:
+            with os.fdopen(fd, 'wt', encoding='utf-8', newline='') as f:
+                if _readText(path) != self.snapshot.text:
+                    raise Exception("the git config changed while updating it: " + path)
+                f.write(_rewriteConfig(self.snapshot.text, changes))
+
+            # refs first, a failed ref transaction leaves the config untouched
+            self._updateRefs(commands)
+            os.replace(lockPath, path)
+        except BaseException:
+            os.remove(lockPath)
+            raise
+
+    def _updateRefs(self, commands):
+        if not commands:
+            return
+        cmd = ['git', 'update-ref', '--stdin']
+        DebugLog.print(str(cmd))
+        subprocess.check_output(cmd, input=''.join(c + '\n' for c in commands).encode())
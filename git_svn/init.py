@@ -11,7 +11,9 @@ from git_svn.debug import ExceptionHandle
 import argparse
 import subprocess
 from xml.etree import ElementTree as ET
-from  git_svn import svn
+from git_svn import git
+from git_svn import fastimport
+from git_svn import preflight
 
 if sys.version_info < (3,5):
     print("Script is being run with a too old version of Python. Needs 3.5.")
@@ -47,6 +49,11 @@ def parse_cli_args():
                         help="force git svn init even if svn wc is dirty",
                         action="store_true")
 
+    parser.add_argument("--fetch-backend",
+                        help="fetch the svn revisions with 'git svn fetch' or by streaming an svn dump into 'git fast-import'.",
+                        choices=["git-svn", "fast-import"],
+                        default="git-svn")
+
     args = parser.parse_args()
 
 
@@ -86,10 +93,12 @@ def main():
     global args
     args = parse_cli_args()
 
-    if not svn.IsSvnWc():
+    checks = preflight.RunPreflight(checkGit=False, svnDirty=not args.force)
+
+    if not checks.isSvnWc:
         raise Exception("cwd is not an svn working copy: " + os.getcwd())
 
-    if svn.IsSvnWcDirty() and not args.force:
+    if checks.isSvnWcDirty and not args.force:
         raise Exception("""svn working copy is dirty.
 please commit or shelve your local changes so they can't be lost before initializing a git-svn bridge.""")
 
@@ -146,6 +155,11 @@ please commit or shelve your local changes so they can't be lost before initiali
         subprocess.check_output('git config --local --add svn-remote.svn.ignore-paths "%s"' % ignoredDirs.buildGitSvnIgnorePathRegex())
 
 
+    if args.fetch_backend == "fast-import":
+        ignoreRegex = ignoredDirs.buildGitSvnIgnorePathRegex() if ignoredDirs.hasIgnoreDirs() else None
+        fastimport.Fetch(git.GetGitDir(), root_url, branchpath, "refs/remotes/git-svn/%s" % branchname, rev, ignoreRegex)
+        sys.exit(0)
+
     # fetching in a svn checkout will fail
     # this failure is however harmless and can be ignored
     cli_cmd = ["git", "svn", "fetch", "-r", str(rev)]
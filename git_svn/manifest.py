@@ -0,0 +1,111 @@
+"""
+manifest of the svn externals materialised by the last externals sync
+
+After a sync the definition (qualified url, peg and operative revision) and a
+fingerprint of the working copy of every successfully checked out external is
+recorded in the git-svn-externals.json file of the admin dir (cf. cache.GetAdminDir).
+The next sync skips pinned externals whose definition and fingerprint did not
+change, without a single svn invocation.
+
+The fingerprint is the mtime and size of the wc.db of a folder external (resp. of
+the file of a file external), which changes with every svn operation on it.
+Local modifications of versioned files don't change it, hence a skipped external
+keeps them. Use a full sync to revert them, or discard the local changes, which
+only skips the externals without local modifications.
+"""
+import json
+import os
+import tempfile
+import threading
+
+from git_svn.debug import DebugLog
+from git_svn import cache
+
+MANIFEST_FILE = 'git-svn-externals.json'
+
+
+def _pathKey(svnExternal):
+    return os.path.normcase(os.path.abspath(svnExternal.WCPath))
+
+
+def Fingerprint(path):
+    """the (mtime, size) fingerprint of the checkout of an external, None if it doesn't exist"""
+    if os.path.isdir(path):
+        path = os.path.join(path, '.svn', 'wc.db')
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_mtime_ns, st.st_size]
+
+
+def _definition(svnExternal):
+    """the part of an external definition that determines its checkout"""
+    try:
+        qualifiedUrl = svnExternal.QualifiedUrl
+    except NotImplementedError:
+        return None
+    return [qualifiedUrl, svnExternal.pegRev, svnExternal.operativeRev]
+
+
+class ExternalsManifest:
+    """the externals recorded by the last sync, by absolute WC path"""
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self._lock = threading.Lock()
+
+        if path is not None and os.path.isfile(path):
+            try:
+                with open(path, 'rt') as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError) as e:
+                DebugLog.print("ignoring corrupt externals manifest {}: {}".format(path, e))
+
+    @staticmethod
+    def default():
+        """the manifest of the current working copy, without a path if there is no admin dir"""
+        adminDir = cache.GetAdminDir()
+        return ExternalsManifest(os.path.join(adminDir, MANIFEST_FILE) if adminDir else None)
+
+    def isUnchanged(self, svnExternal):
+        """True if the pinned external is still checked out as recorded"""
+        if not svnExternal.IsPinned:
+            return False
+
+        entry = self.entries.get(_pathKey(svnExternal))
+        if entry is None:
+            return False
+
+        definition = _definition(svnExternal)
+        return (definition is not None
+                and entry['definition'] == definition
+                and entry['fingerprint'] == Fingerprint(svnExternal.WCPath))
+
+    def update(self, results):
+        """replace the recorded externals with the successfully checked out (or skipped) ones"""
+        entries = {}
+        for r in results:
+            if not r.succeeded:
+                continue
+            definition = _definition(r.svnExternal)
+            fingerprint = Fingerprint(r.svnExternal.WCPath)
+            if definition is None or fingerprint is None:
+                continue
+            entries[_pathKey(r.svnExternal)] = {'path': r.svnExternal.WCPath,
+                                                'definition': definition,
+                                                'fingerprint': fingerprint}
+        with self._lock:
+            self.entries = entries
+
+    def save(self):
+        if self.path is None:
+            return
+
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            (fd, tmpPath) = tempfile.mkstemp(dir=os.path.dirname(self.path), prefix='.tmp')
+            with os.fdopen(fd, 'wt') as f:
+                json.dump(self.entries, f, indent=1, sort_keys=True)
+            os.replace(tmpPath, self.path)
@@ -4,6 +4,7 @@ import os
 
 from git_svn.debug import *
 from git_svn.git import *
+from git_svn import svn
 
 import argparse
 import subprocess
@@ -129,11 +130,15 @@ def main():
                 dirs.remove(".svn")
         
         # migrate the svn:ignore property
-        cmd = ["git", "svn", "show-ignore"]
         f.write("\n")        
         f.write("## mirror the \svn:ignore' property\n")
-        f.write("# $ " + " ".join(cmd) + "\n")
-        svnIgnoreRules = subprocess.check_output(cmd).decode()
+        svnIgnoreRules = svn.GetSvnIgnoreRulesFromLocalSvnWc()
+        if svnIgnoreRules is None:
+            # no usable wc.db, ask the git-svn bridge
+            cmd = ["git", "svn", "show-ignore"]
+            f.write("# $ " + " ".join(cmd) + "\n")
+            DebugLog.print(str(cmd))
+            svnIgnoreRules = subprocess.check_output(cmd).decode()
         f.write(svnIgnoreRules + "\n")
 
 
@@ -0,0 +1,87 @@
+"""
+preflight checks of the working copy shared by the commands
+
+The git and the svn checks run at the same time. Each tool gets a cheap
+"is repo" probe and at most one dirty scan of the tree:
+- git: a single `git status`, which fails outside of a git working copy;
+- svn: wc.db (or `svn info`), followed by a single dirty scan of the working copy.
+"""
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from git_svn.debug import DebugLog
+from git_svn import timeit
+from git_svn import git
+from git_svn import svn
+
+
+class PreflightResult:
+    """the state of the working copy in cwd
+
+    a check that was not requested is None
+    """
+
+    def __init__(self):
+        # bool: cwd is in a git working copy
+        self.isGitWc = None
+        # bool: the git working copy has uncommitted changes (untracked files don't count)
+        self.isGitWcDirty = None
+        # bool: the git repo has a git-svn bridge
+        self.isGitSvnRepo = None
+        # bool: cwd is in an svn working copy
+        self.isSvnWc = None
+        # bool: the svn working copy has local changes
+        self.isSvnWcDirty = None
+
+    def __repr__(self):
+        return "PreflightResult(" + ", ".join("{}={}".format(k, v) for (k, v) in sorted(vars(self).items())) + ")"
+
+
+def _checkGit(result, dirty):
+    cmd = ['git', 'status', '--porcelain', '--untracked-files=no']
+    if not dirty:
+        cmd = ['git', 'rev-parse', '--is-inside-work-tree']
+    DebugLog.print(str(cmd))
+    try:
+        output = subprocess.check_output(cmd, stderr=subprocess.DEVNULL).decode()
+    except subprocess.CalledProcessError:
+        result.isGitWc = False
+        return
+
+    if not dirty and output.strip() != 'true':
+        result.isGitWc = False
+        return
+
+    result.isGitWc = True
+    if dirty:
+        result.isGitWcDirty = len(output.splitlines()) > 0
+    result.isGitSvnRepo = git.IsGitSvnRepo()
+
+
+def _checkSvn(result, dirty):
+    result.isSvnWc = svn.IsSvnWc()
+    if result.isSvnWc and dirty:
+        result.isSvnWcDirty = svn.IsSvnWcDirty()
+
+
+@timeit
+def RunPreflight(checkGit=True, checkSvn=True, gitDirty=True, svnDirty=True):
+    """run the requested git and svn checks on cwd concurrently, return a `PreflightResult`
+
+    the dirty scans only run for a tool that is checked, and only in a working copy
+    """
+    result = PreflightResult()
+    checks = []
+    if checkGit:
+        checks.append((_checkGit, gitDirty))
+    if checkSvn:
+        checks.append((_checkSvn, svnDirty))
+
+    with ThreadPoolExecutor(max_workers=max(1, len(checks))) as executor:
+        futures = [executor.submit(check, result, dirty) for (check, dirty) in checks]
+        for future in futures:
+            # re-raise the exception of a failed check
+            future.result()
+
+    DebugLog.print(str(result))
+    return result
@@ -0,0 +1,277 @@
+"""
+native reader for the git-svn rev_map files
+
+For every tracked ref git-svn keeps the svn revision to git commit mapping in
+$GIT_DIR/svn/<ref>/.rev_map.<uuid>
+i.e. a flat file of 24 byte records (a 4 byte big endian svn revision followed by
+the 20 byte binary commit sha) sorted on revision. A trailing record with a null
+sha marks the last fetched revision when that revision did not result in a commit.
+
+Reading it directly avoids starting `git svn find-rev`, which loads the whole
+perl git-svn stack just to look up a single record. `AppendRevMap()` writes
+records in the same format for revisions that were fetched without git-svn.
+
+`BuildRevMaps()` rebuilds the rev_map of tracking refs from the git-svn-id
+trailers of their commits (like git-svn does for a missing rev_map), each ref in
+its own worker process.
+"""
+import binascii
+import mmap
+import os
+import struct
+import subprocess
+import tempfile
+import urllib.parse
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from git_svn.debug import DebugLog
+from git_svn import branchpoint
+
+RECORD_SIZE = 24
+_NULL_SHA = b'\0' * 20
+
+
+class RevMap:
+    """memory mapped git-svn rev_map file"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+
+        size = os.fstat(self._file.fileno()).st_size
+        if size % RECORD_SIZE != 0:
+            self._file.close()
+            raise Exception("corrupt rev_map, size is not a multiple of {}: {}".format(RECORD_SIZE, path))
+
+        self._count = size // RECORD_SIZE
+        if self._count > 0:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            # an empty file can't be memory mapped
+            self._map = b''
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def __len__(self):
+        return self._count
+
+    def close(self):
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._file.close()
+
+    def _rev(self, idx):
+        return struct.unpack_from('>I', self._map, idx * RECORD_SIZE)[0]
+
+    def _sha(self, idx):
+        """hex commit sha of the record, None for a null sha"""
+        offset = idx * RECORD_SIZE + 4
+        sha = self._map[offset:offset + 20]
+        if sha == _NULL_SHA:
+            return None
+        return binascii.hexlify(sha).decode()
+
+    def _bisect(self, rev):
+        """index of the first record with a revision >= rev"""
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._rev(mid) < rev:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def MaxRev(self):
+        """the last fetched svn revision, None for an empty rev_map"""
+        if self._count == 0:
+            return None
+        return self._rev(self._count - 1)
+
+    def FindSha(self, rev, before=False, after=False):
+        """return the commit sha of the svn revision, None if there is none
+
+        before: (cf. `git svn find-rev -B`) return the commit of the nearest
+                revision <= rev if there is no exact match.
+        after:  (cf. `git svn find-rev -A`) return the commit of the nearest
+                revision >= rev if there is no exact match.
+        """
+        rev = int(rev)
+        idx = self._bisect(rev)
+
+        if idx < self._count and self._rev(idx) == rev:
+            sha = self._sha(idx)
+            if sha is not None:
+                return sha
+
+        if before:
+            # all records below idx have a revision < rev
+            for i in range(idx - 1, -1, -1):
+                sha = self._sha(i)
+                if sha is not None:
+                    return sha
+
+        if after:
+            for i in range(idx, self._count):
+                sha = self._sha(i)
+                if sha is not None:
+                    return sha
+
+        return None
+
+    def FindRev(self, sha):
+        """return the svn revision of a (full) commit sha, None if it is not mapped"""
+        needle = binascii.unhexlify(sha)
+        offset = self._map.find(needle)
+        while offset != -1:
+            # only accept matches that are aligned with the sha part of a record
+            if offset % RECORD_SIZE == 4:
+                return self._rev(offset // RECORD_SIZE)
+            offset = self._map.find(needle, offset + 1)
+        return None
+
+
+def GetRevMapPath(gitDir, gitRef, uuid):
+    """path of the rev_map file of a git-svn tracking ref, e.g. refs/remotes/git-svn/trunk"""
+    return os.path.join(gitDir, 'svn', gitRef.replace('/', os.sep), '.rev_map.' + uuid)
+
+
+def OpenRevMap(gitDir, gitRef, uuid):
+    """open the rev_map of a git-svn tracking ref, None if it doesn't exist"""
+    path = GetRevMapPath(gitDir, gitRef, uuid)
+    if not os.path.isfile(path):
+        DebugLog.print("no rev_map found: " + path)
+        return None
+    return RevMap(path)
+
+
+def AppendRevMap(path, records):
+    """append (svn_rev, commit sha or None) records to a rev_map file
+
+    just like git-svn a trailing null sha record is overwritten, since it is only
+    allowed as the last record of the file.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'a+b') as f:
+        size = f.seek(0, os.SEEK_END)
+        if size % RECORD_SIZE != 0:
+            raise Exception("corrupt rev_map, size is not a multiple of {}: {}".format(RECORD_SIZE, path))
+
+        if size > 0:
+            f.seek(size - 20)
+            if f.read(20) == _NULL_SHA:
+                f.truncate(size - RECORD_SIZE)
+
+        f.seek(0, os.SEEK_END)
+        for (rev, sha) in records:
+            f.write(struct.pack('>I', int(rev)))
+            f.write(binascii.unhexlify(sha) if sha is not None else _NULL_SHA)
+
+
+def ReadGitSvnIds(gitRef):
+    """generator yielding the (commit sha, url, svn_rev, uuid) git-svn-ids of all commits of a ref
+
+    the commit messages are streamed from a single `git log`, which only reports
+    the commits with a git-svn-id trailer.
+    """
+    cmd = ['git', 'log', '-z', '--grep=^git-svn-id: ', '--format=%H%n%B', gitRef, '--']
+    DebugLog.print(str(cmd))
+    with subprocess.Popen(cmd, stdout=subprocess.PIPE) as p:
+        pending = b''
+        for chunk in iter(lambda: p.stdout.read(1024 * 1024), b''):
+            records = (pending + chunk).split(b'\0')
+            pending = records.pop()
+            for record in records:
+                result = _parseGitSvnId(record)
+                if result is not None:
+                    yield result
+        result = _parseGitSvnId(pending)
+        if result is not None:
+            yield result
+
+    if p.returncode != 0:
+        raise subprocess.CalledProcessError(p.returncode, cmd)
+
+
+def _parseGitSvnId(record):
+    (sha, sep, message) = record.decode('utf-8', errors='replace').partition('\n')
+    matches = list(branchpoint.GIT_SVN_ID_REGEX.finditer(message))
+    if not matches:
+        return None
+    # git-svn only considers the last git-svn-id line
+    m = matches[-1]
+    return (sha.strip(), m.group(1), int(m.group(2)), m.group(3))
+
+
+def BuildRevMap(gitDir, gitRef, branchUrl):
+    """(re)build the rev_map of a git-svn tracking ref from its commits
+
+    just like git-svn, only the commits of the tracked branch url (i.e. not the
+    ones of merged branches) are mapped. The file is only written when its content
+    changes, and keeps the trailing marker of the last fetched revision.
+    return the path of the rev_map, None if the ref has no git-svn commits
+    """
+    # the git-svn-id urls are uri escaped
+    branchUrl = urllib.parse.unquote(branchUrl).rstrip('/')
+    commits = {}
+    uuids = Counter()
+    for (sha, url, rev, uuid) in ReadGitSvnIds(gitRef):
+        if urllib.parse.unquote(url).rstrip('/') != branchUrl:
+            continue
+        uuids[uuid] += 1
+        # git log lists the newest commit first, which wins for a revision that is mapped twice
+        commits.setdefault((uuid, rev), sha)
+
+    if not uuids:
+        DebugLog.print("no git-svn commits of {} found in {}".format(branchUrl, gitRef))
+        return None
+
+    uuid = uuids.most_common(1)[0][0]
+    revs = sorted(rev for (u, rev) in commits if u == uuid)
+    content = b''.join(struct.pack('>I', rev) + binascii.unhexlify(commits[(uuid, rev)]) for rev in revs)
+
+    path = GetRevMapPath(gitDir, gitRef, uuid)
+    if os.path.isfile(path):
+        with open(path, 'rb') as f:
+            existing = f.read()
+        # a trailing null sha record marks the last fetched revision, without it
+        # git-svn would fetch the revisions after the last commit again
+        if len(existing) >= RECORD_SIZE and existing[-20:] == _NULL_SHA:
+            (lastFetched,) = struct.unpack('>I', existing[-RECORD_SIZE:-20])
+            if lastFetched > revs[-1]:
+                content += existing[-RECORD_SIZE:]
+        if existing == content:
+            DebugLog.print("rev_map is up to date: " + path)
+            return path
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    (fd, tmpPath) = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(content)
+    os.replace(tmpPath, path)
+    DebugLog.print("rebuilt rev_map with {} revisions: {}".format(len(content) // RECORD_SIZE, path))
+    return path
+
+
+def _buildRevMapTask(args):
+    (gitDir, gitRef, branchUrl) = args
+    return BuildRevMap(gitDir, gitRef, branchUrl)
+
+
+def BuildRevMaps(gitDir, branches, jobs=None):
+    """rebuild the rev_maps of several (gitRef, branchUrl) tracking refs in parallel worker processes
+
+    return a {gitRef: rev_map path or None} dict
+    """
+    branches = list(branches)
+    tasks = [(gitDir, gitRef, branchUrl) for (gitRef, branchUrl) in branches]
+    if len(tasks) <= 1 or jobs == 1:
+        return {task[1]: _buildRevMapTask(task) for task in tasks}
+
+    with ProcessPoolExecutor(max_workers=min(len(tasks), jobs or os.cpu_count() or 1)) as executor:
+        return dict(zip([task[1] for task in tasks], executor.map(_buildRevMapTask, tasks)))
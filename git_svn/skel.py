@@ -0,0 +1,82 @@
+"""
+decoder of the svn skel format
+
+wc.db stores the properties of a node (NODES.properties, ACTUAL_NODE.properties)
+as a skel: a list of alternating property name and value atoms, e.g.
+
+    (svn:ignore 9 *.o
+build svn:externals 12 ^/lib@10 lib)
+
+An atom is either implicit-length (a name starting with a letter up to the next
+whitespace or parenthesis) or explicit-length (a decimal length, a single
+whitespace and that many raw bytes).
+"""
+
+_WHITESPACE = b' \t\n\r\f\0'
+
+
+def _skipWhitespace(data, pos):
+    while pos < len(data) and data[pos] in _WHITESPACE:
+        pos += 1
+    return pos
+
+
+def _parse(data, pos):
+    """parse the skel at pos, return a (skel, next pos) tuple"""
+    pos = _skipWhitespace(data, pos)
+    if pos >= len(data):
+        raise Exception("invalid skel: unexpected end of data")
+
+    c = data[pos]
+    if c == ord('('):
+        items = []
+        pos += 1
+        while True:
+            pos = _skipWhitespace(data, pos)
+            if pos >= len(data):
+                raise Exception("invalid skel: unterminated list")
+            if data[pos] == ord(')'):
+                return (items, pos + 1)
+            (item, pos) = _parse(data, pos)
+            items.append(item)
+
+    if ord('0') <= c <= ord('9'):
+        end = pos
+        while end < len(data) and ord('0') <= data[end] <= ord('9'):
+            end += 1
+        length = int(data[pos:end])
+        if end >= len(data) or data[end] not in _WHITESPACE:
+            raise Exception("invalid skel: explicit-length atom without separator")
+        start = end + 1
+        if start + length > len(data):
+            raise Exception("invalid skel: atom exceeds data")
+        return (data[start:start + length], start + length)
+
+    if (ord('a') <= c <= ord('z')) or (ord('A') <= c <= ord('Z')):
+        end = pos
+        while end < len(data) and data[end] not in _WHITESPACE and data[end] not in b'()':
+            end += 1
+        return (data[pos:end], end)
+
+    raise Exception("invalid skel: unexpected character " + repr(chr(c)))
+
+
+def ParseSkel(data):
+    """decode a skel into nested lists of bytes atoms"""
+    (skel, pos) = _parse(bytes(data), 0)
+    return skel
+
+
+def ParsePropertySkel(data):
+    """decode a property skel into a {name: value} dict of strings"""
+    skel = ParseSkel(data)
+    if not isinstance(skel, list) or len(skel) % 2 != 0:
+        raise Exception("invalid property skel")
+
+    props = {}
+    for i in range(0, len(skel), 2):
+        (name, value) = (skel[i], skel[i + 1])
+        if isinstance(name, list) or isinstance(value, list):
+            raise Exception("invalid property skel")
+        props[name.decode('utf-8')] = value.decode('utf-8', errors='replace')
+    return props
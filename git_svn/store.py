@@ -0,0 +1,159 @@
+"""
+shared store of pristine checkouts of pinned svn externals
+
+The same pinned externals (toolchains, third party libraries) are checked out
+in every git worktree and CI workspace. When $GIT_SVN_STORE_DIR is set, the first
+checkout of a pinned dir external (keyed by its url@peg and operative revision)
+is kept in the store, and every later checkout is a copy of it. On filesystems
+that support it the copy is a reflink (copy-on-write clone), i.e. it costs
+neither bandwidth nor disk space. Hardlinks are not used, an in place edit of a
+working copy file would corrupt the store.
+
+A working copy is self-contained, wc.db only holds paths relative to its root,
+and the copy preserves the file timestamps, such that svn sees an unmodified
+checkout of the same url without any relocation.
+
+The least recently used checkouts are evicted once the store grows beyond
+$GIT_SVN_STORE_MAX_SIZE bytes.
+"""
+import json
+import os
+import shutil
+import subprocess
+import sys
+import uuid
+
+from git_svn.debug import DebugLog
+from git_svn import cache
+from git_svn import trash
+
+DEFAULT_MAX_SIZE = 10 * 1024 * 1024 * 1024
+
+
+def _treeSize(path):
+    size = 0
+    for (root, dirs, files) in os.walk(path):
+        for f in files:
+            try:
+                size += os.lstat(os.path.join(root, f)).st_size
+            except OSError:
+                pass
+    return size
+
+
+def CopyTree(src, dst):
+    """copy a folder preserving timestamps, as a reflink where the filesystem supports it"""
+    if sys.platform.startswith('linux'):
+        cmd = ['cp', '-a', '--reflink=auto', src, dst]
+        DebugLog.print(str(cmd))
+        try:
+            subprocess.check_call(cmd, stderr=subprocess.DEVNULL)
+            return
+        except (subprocess.CalledProcessError, OSError) as e:
+            DebugLog.print("cp failed, falling back to a plain copy: " + str(e))
+            if os.path.exists(dst):
+                trash.RemoveTree(dst)
+
+    shutil.copytree(src, dst, symlinks=True)
+
+
+class CheckoutStore:
+    """content store of svn checkouts by url@peg and operative revision
+
+    a store without a directory is disabled.
+    """
+
+    _default = None
+
+    def __init__(self, directory, maxSize=DEFAULT_MAX_SIZE):
+        self.directory = directory
+        self.maxSize = maxSize
+
+    @staticmethod
+    def default():
+        """the process wide store as configured by the environment"""
+        if CheckoutStore._default is None:
+            directory = os.environ.get('GIT_SVN_STORE_DIR') or None
+            maxSize = int(os.environ.get('GIT_SVN_STORE_MAX_SIZE', DEFAULT_MAX_SIZE))
+            CheckoutStore._default = CheckoutStore(directory, maxSize)
+        return CheckoutStore._default
+
+    @property
+    def enabled(self):
+        return self.directory is not None
+
+    def _entryPath(self, svnExternal):
+        key = cache.SvnCache.key('checkout', svnExternal.QualifiedPegUrl, svnExternal.operativeRev)
+        return os.path.join(self.directory, key)
+
+    def _fill(self, svnExternal, entryPath):
+        """checkout the external into a new store entry"""
+        tmpPath = os.path.join(self.directory, '.tmp-' + uuid.uuid4().hex)
+        cmd = ['svn', 'checkout', '-q']
+        if svnExternal.operativeRev:
+            cmd += ['-r', str(svnExternal.operativeRev)]
+        cmd += [svnExternal.QualifiedPegUrl, os.path.join(tmpPath, 'wc')]
+
+        DebugLog.print(str(cmd))
+        try:
+            subprocess.check_output(cmd)
+            with open(os.path.join(tmpPath, 'entry.json'), 'wt') as f:
+                json.dump({'url': svnExternal.QualifiedPegUrl,
+                           'operativeRev': svnExternal.operativeRev,
+                           'size': _treeSize(os.path.join(tmpPath, 'wc'))}, f)
+            os.rename(tmpPath, entryPath)
+        except BaseException:
+            if os.path.exists(tmpPath):
+                trash.RemoveTree(tmpPath)
+            raise
+
+    def Materialize(self, svnExternal, path):
+        """checkout a pinned dir external at path by copying it from the store
+
+        the store is filled with a fresh checkout on first use.
+        """
+        assert svnExternal.IsPinned
+        os.makedirs(self.directory, exist_ok=True)
+        entryPath = self._entryPath(svnExternal)
+
+        with cache.FileLock(entryPath + '.lock'):
+            if not os.path.isdir(entryPath):
+                DebugLog.print("adding to the checkout store: " + svnExternal.QualifiedPegUrl)
+                self._fill(svnExternal, entryPath)
+
+            # mark the entry as recently used
+            os.utime(os.path.join(entryPath, 'entry.json'), None)
+
+            DebugLog.print("copy {} from the checkout store: {}".format(svnExternal.QualifiedPegUrl, entryPath))
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            CopyTree(os.path.join(entryPath, 'wc'), path)
+
+        self.evict()
+
+    def evict(self):
+        """remove the least recently used entries until the store fits in maxSize"""
+        with cache.FileLock(os.path.join(self.directory, '.lock')):
+            entries = []
+            totalSize = 0
+            for name in os.listdir(self.directory):
+                metaPath = os.path.join(self.directory, name, 'entry.json')
+                if name.startswith('.') or not os.path.isfile(metaPath):
+                    continue
+                try:
+                    with open(metaPath, 'rt') as f:
+                        size = json.load(f)['size']
+                    mtime = os.stat(metaPath).st_mtime
+                except (OSError, ValueError, KeyError):
+                    continue
+                entries.append((mtime, size, os.path.join(self.directory, name)))
+                totalSize += size
+
+            entries.sort()
+            # always keep the most recently used entry
+            for (mtime, size, entryPath) in entries[:-1]:
+                if totalSize <= self.maxSize:
+                    break
+                with cache.FileLock(entryPath + '.lock'):
+                    DebugLog.print("evicting from the checkout store: " + entryPath)
+                    trash.MoveToTrash(entryPath, os.path.join(self.directory, '.trash'))
+                totalSize -= size
@@ -2,12 +2,22 @@ from git_svn.debug import DebugLog
 import os
 import subprocess
 import urllib.parse
+import uuid
 from xml.etree import ElementTree as ET
-import shutil
 from git_svn import timeit
+from git_svn import wcdb
+from git_svn import cache
+from git_svn import dateindex
+from git_svn import trash
+from git_svn import store
+from collections import OrderedDict
 
 @timeit
 def IsSvnWcDirty(path = "."):
+    isDirty = wcdb.IsDirty(path)
+    if isDirty is not None:
+        return isDirty
+
     try: 
         text = subprocess.check_output(['svn', 'status', '--quiet', path])
         if len(text.splitlines()) == 0:
@@ -19,6 +29,10 @@ def IsSvnWcDirty(path = "."):
 
 @timeit
 def IsSvnWc(path = "."):
+    isSvnWc = wcdb.IsSvnWc(path)
+    if isSvnWc is not None:
+        return isSvnWc
+
     try: 
         subprocess.check_output(['svn', 'info', path],  stderr=subprocess.STDOUT)
         return True
@@ -26,10 +40,143 @@ def IsSvnWc(path = "."):
         return False
 
 
+# wc-status items that `svn status --quiet` reports, yet don't make a working copy dirty
+_CLEAN_STATUS_ITEMS = ('unversioned', 'ignored', 'external')
+
+def _isDirtyStatus(wcStatusEl):
+    """True for every entry `IsSvnWcDirty()` would see, i.e. modified, switched, locked, ..."""
+    return wcStatusEl is not None and wcStatusEl.get('item') not in _CLEAN_STATUS_ITEMS
+
+def ParseSvnStatusXml(stream, paths):
+    """determine which of the paths are dirty from a streamed `svn status --xml --quiet` document
+
+    the <target> elements are matched with the given paths, paths without a
+    <target> element (i.e. no svn working copy) map to None.
+    raise ET.ParseError if the document is incomplete.
+    """
+    dirtyMap = OrderedDict((path, None) for path in paths)
+    byNormalizedPath = {_normalizeSvnTarget(path): path for path in paths}
+
+    target = None
+    for (event, el) in ET.iterparse(stream, events=('start', 'end')):
+        if el.tag == 'target':
+            if event == 'start':
+                target = byNormalizedPath.get(_normalizeSvnTarget(el.get('path')))
+                if target is not None:
+                    dirtyMap[target] = False
+            else:
+                target = None
+                el.clear()
+        elif el.tag == 'entry' and event == 'end':
+            if target is not None and _isDirtyStatus(el.find('wc-status')):
+                dirtyMap[target] = True
+            el.clear()
+    return dict(dirtyMap)
+
+@timeit
+def GetSvnWcDirtyMap(paths):
+    """determine which of the svn working copies are dirty with a single `svn status --xml --quiet` call
+
+    working copies that can be checked from their wc.db (cf. wcdb.IsDirty) don't
+    need svn at all. the xml of the others is parsed while svn streams it.
+    return a {path: bool} dict, paths that are no svn working copy map to None
+    """
+    paths = list(OrderedDict.fromkeys(paths))
+
+    # most working copies can be checked straight from their wc.db
+    knownDirtyMap = {}
+    for path in paths:
+        isDirty = wcdb.IsDirty(path)
+        if isDirty is not None:
+            knownDirtyMap[path] = isDirty
+    paths = [path for path in paths if path not in knownDirtyMap]
+    if len(paths) == 0:
+        return knownDirtyMap
+
+    cmd = ['svn', 'status', '--xml', '--quiet'] + paths
+    DebugLog.print(str(cmd))
+    p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    try:
+        dirtyMap = ParseSvnStatusXml(p.stdout, paths)
+    except ET.ParseError:
+        dirtyMap = None
+    p.stdout.close()
+    # svn reports an error for paths that are no working copy, yet still reports the others
+    err = p.stderr.read()
+    p.wait()
+    if p.returncode != 0:
+        DebugLog.print(err.decode(errors='replace'))
+
+    if dirtyMap is None:
+        # svn failed without a usable xml document, so check each path on its own
+        dirtyMap = {path: IsSvnWcDirty(path) if IsSvnWc(path) else None for path in paths}
+    dirtyMap.update(knownDirtyMap)
+    return dirtyMap
+
+
+def IsImmutableRev(rev):
+    """True for a numeric revision, i.e. not HEAD, BASE, PREV, a date, ..."""
+    return rev is not None and str(rev).isdigit()
+
+def _svnOutput(cmd, cacheKey=None):
+    """run an svn command and return its output
+
+    the output of an immutable query is served from the SvnCache if a
+    cacheKey is given. 
+    """
+    def run():
+        DebugLog.print(str(cmd))
+        return subprocess.check_output(cmd)
+
+    if cacheKey is None:
+        return run().decode()
+    return cache.SvnCache.default().getOrCompute(cacheKey, run).decode()
+
+def GetPinnedSvnInfoXml(target, rev):
+    """`svn info --xml -r <rev> <target>` for a query whose answer can't change anymore
+
+    i.e. rev is a numeric revision or a date in the past, the result is cached.
+    """
+    cmd = ['svn', 'info', '--xml', '-r', str(rev), target]
+    return _svnOutput(cmd, cacheKey=cmd)
+
+def GetReposRootForUrl(url):
+    """the repository root url of an url
+
+    cached, since it only changes when the repository itself is moved
+    """
+    xmlStr = _svnOutput(['svn', 'info', '--xml', url], cacheKey=('repository root', url))
+    return ET.fromstring(xmlStr).find('entry/repository/root').text
+
+def ResolveDateRev(url, dateRevStr, reposRoot=None):
+    """resolve an svn date revision (e.g. {2006-02-17 15:30}) of url to a revision number
+
+    urls inside reposRoot are resolved with the local date index of that repository,
+    any other url with `svn info` (cached once the date lies in the past).
+    return the revision as a str
+    """
+    date = dateindex.NormalizeSvnDate(dateRevStr)
+    if date is not None and reposRoot is not None:
+        reposRoot = reposRoot.rstrip('/')
+        if url.rstrip('/') == reposRoot or url.startswith(reposRoot + '/'):
+            rev = dateindex.SvnDateIndex.forRepo(reposRoot).RevAtDate(date)
+            if rev is not None:
+                return str(rev)
+
+    # stay clear of the present, commits can still be added to it
+    isPast = date is not None and date < dateindex.UtcNow(-3600)
+    cmd = ['svn', 'info', '--xml', '-r', dateRevStr, url]
+    xmlStr = _svnOutput(cmd, cacheKey=cmd if isPast else None)
+    return ET.fromstring(xmlStr).find('entry/commit').get('revision')
+
 def SvnCountCommits(startRev, endRev):
     cmd = ["svn", "log", "--xml", "-r", str(startRev) + ":" + str(endRev)]
-    DebugLog.print(str(cmd))
-    xmlStr = subprocess.check_output(cmd).decode()   
+    if IsImmutableRev(startRev) and IsImmutableRev(endRev):
+        # the log is relative to the svn WC in cwd
+        xmlStr = _svnOutput(cmd, cacheKey=cmd + [GetQualifiedUrlForFolder(".")])
+    else:
+        xmlStr = _svnOutput(cmd)
     xmlNode = ET.fromstring(xmlStr)
     return len(xmlNode.findall('logentry'))
 
@@ -46,14 +193,10 @@ def getNodeType(svnExternal):
     if svnExternal.operativeRev:
         cmd += ['-r', str(svnExternal.operativeRev)]
 
-    if svnExternal.pegRev is not None:
-        cmd += [svnExternal.QualifiedUrl + '@' + str(svnExternal.pegRev)]
-    else:
-        cmd += [svnExternal.QualifiedUrl]
+    cmd += [svnExternal.QualifiedPegUrl]
     
     try:
-        DebugLog.print(str(cmd))
-        xmlStr = subprocess.check_output(cmd).decode()
+        xmlStr = _svnOutput(cmd, cacheKey=cmd if svnExternal.IsPinned else None)
         xmlRootNode = ET.fromstring(xmlStr)
         assert xmlRootNode.tag == 'info'
         typeStr = xmlRootNode.find('./entry').attrib['kind']
@@ -111,6 +254,27 @@ class SvnExternal:
         else:
             return self.url
 
+    @property
+    def IsPinned(self):
+        """True if the external is pinned to a fixed revision, i.e. its content can't change anymore"""
+        return IsImmutableRev(self.pegRev) and (self.operativeRev is None or IsImmutableRev(self.operativeRev))
+
+    @property
+    def QualifiedPegUrl(self):
+        """return the qualified url including the peg revision if any
+        i.e. the svn target that identifies the external
+        """
+        if self.pegRev is not None:
+            return self.QualifiedUrl + '@' + str(self.pegRev)
+        return self.QualifiedUrl
+
+    @property
+    def WCPath(self):
+        """return the path of the external checkout in the local working copy
+        i.e. the <path> of the definition joined with the folder it is defined on
+        """
+        return os.path.join(self.svnWCFolderPath, self.path.replace('/', os.sep))
+
     def __init__(self,  hostRepoUrl, svnWCFolderPath, operativeRev, url, pegRev, path):
         self.hostRepoUrl = hostRepoUrl
         self.svnWCFolderPath = svnWCFolderPath
@@ -175,18 +339,164 @@ class SvnExternal:
         return SvnExternal(hostRepoUrl, svnWCFolderPath, operativeRev, url, pegRev, path)
 
 def GetQualifiedUrlForFolder(path):
+    url = wcdb.GetUrl(path)
+    if url is not None:
+        return url
+
     xmlStr = subprocess.check_output(['svn', 'info', '--xml', path]).decode()
     xmlRootNode = ET.fromstring(xmlStr)
     return xmlRootNode.find('entry/url').text
 
 
+class SvnInfo:
+    """the relevant parts of a single `svn info --xml` entry"""
+
+    @property
+    def nodeType(self):
+        if self.kind == 'file':
+            return SvnNodeType.FILE
+        elif self.kind == 'dir':
+            return SvnNodeType.DIR
+        else:
+            raise Exception('svn info returned unknown type: ' + self.kind)
+
+    def __init__(self, kind, url, revision, lastChangedRev, reposRoot=None, uuid=None):
+        self.kind = kind
+        self.url = url
+        self.revision = revision
+        self.lastChangedRev = lastChangedRev
+        self.reposRoot = reposRoot
+        self.uuid = uuid
+
+    def __str__(self):
+        return "{} {}@{} (last changed: {})".format(self.kind, self.url, self.revision, self.lastChangedRev)
+
+    @staticmethod
+    def fromXml(entryEl):
+        """create a SvnInfo from an <entry> element of `svn info --xml`"""
+        commitEl = entryEl.find('commit')
+        lastChangedRev = None
+        if commitEl is not None and commitEl.get('revision') is not None:
+            lastChangedRev = int(commitEl.get('revision'))
+
+        rootEl = entryEl.find('repository/root')
+        uuidEl = entryEl.find('repository/uuid')
+        return SvnInfo(entryEl.get('kind'),
+                       entryEl.find('url').text,
+                       int(entryEl.get('revision')),
+                       lastChangedRev,
+                       rootEl.text if rootEl is not None else None,
+                       uuidEl.text if uuidEl is not None else None)
+
+
+def _normalizeSvnTarget(target):
+    """normalize an svn target such that it can be matched with an svn info entry"""
+    if "://" in target:
+        # drop the peg revision and url escaping
+        (url, sep, peg) = target.rpartition('@')
+        if not sep or '/' in peg:
+            url = target
+        return urllib.parse.unquote(url).rstrip('/')
+    else:
+        return os.path.normcase(os.path.normpath(target))
+
+
+def ParseSvnInfoXml(xmlStr, targets):
+    """map the entries of an `svn info --xml` document onto the given targets
+
+    svn omits the targets that don't exist, hence the entries are matched with
+    the targets based on their url (for url targets) or path (for WC targets).
+    return a {target: SvnInfo} dict, targets without an entry map to None
+    """
+    xmlRootNode = ET.fromstring(xmlStr)
+    assert xmlRootNode.tag == 'info'
+
+    entries = {}
+    for entryEl in xmlRootNode.findall('entry'):
+        info = SvnInfo.fromXml(entryEl)
+        entries.setdefault(_normalizeSvnTarget(info.url), info)
+        entries.setdefault(_normalizeSvnTarget(entryEl.get('path')), info)
+
+    return {t: entries.get(_normalizeSvnTarget(t)) for t in targets}
+
+
+@timeit
+def GetSvnInfoForTargets(targets, rev=None):
+    """resolve many svn targets (urls or WC paths) with a single `svn info --xml` call
+
+    return a {target: SvnInfo} dict, targets that don't exist map to None
+    """
+    targets = list(OrderedDict.fromkeys(targets))
+    if len(targets) == 0:
+        return {}
+
+    cmd = ['svn', 'info', '--xml']
+    if rev is not None:
+        cmd += ['-r', str(rev)]
+    cmd += targets
+
+    DebugLog.print(str(cmd))
+    # svn returns an error if any of the targets doesn't exist,
+    # yet the info of all other targets is still reported.
+    p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    (out, err) = p.communicate()
+    if p.returncode != 0:
+        DebugLog.print(err.decode(errors='replace'))
+
+    try:
+        return ParseSvnInfoXml(out.decode(), targets)
+    except ET.ParseError:
+        if len(targets) == 1:
+            return {targets[0]: None}
+
+    # svn failed without a usable xml document, so resolve each target on its own
+    result = {}
+    for t in targets:
+        result.update(GetSvnInfoForTargets([t], rev))
+    return result
+
+
+def GetSvnInfoForExternals(svnExternals):
+    """resolve the remote url of all given externals with one `svn info` call per operative revision
+
+    return a {svnExternal: SvnInfo} dict, externals that don't exist map to None
+    """
+    svnCache = cache.SvnCache.default()
+    result = {}
+
+    byOperativeRev = OrderedDict()
+    for e in svnExternals:
+        if e.IsPinned:
+            cached = svnCache.getJson(('SvnInfo', e.operativeRev or None, e.QualifiedPegUrl))
+            if cached is not None:
+                result[e] = SvnInfo(**cached)
+                continue
+        byOperativeRev.setdefault(e.operativeRev or None, []).append(e)
+
+    for (operativeRev, group) in byOperativeRev.items():
+        infos = GetSvnInfoForTargets([e.QualifiedPegUrl for e in group], operativeRev)
+        for e in group:
+            result[e] = infos[e.QualifiedPegUrl]
+            if e.IsPinned and result[e] is not None:
+                svnCache.putJson(('SvnInfo', operativeRev, e.QualifiedPegUrl), vars(result[e]))
+    return result
+
+
 
 
 @timeit
-def checkoutSvnExternal(svnExternal, discard_local_changes=False):
+def checkoutSvnExternal(svnExternal, discard_local_changes=False, svnInfo=None, existingUrl=None, isDirty=None):
     """checkout or update an svn external
+
+    the current working directory is never changed, such that several externals
+    can be checked out concurrently from different threads.
+
+    `svnInfo` (the remote SvnInfo of the external), `existingUrl` (the url of
+    an existing checkout) and `isDirty` (whether the existing checkout has local
+    changes) can be passed when they are already known, e.g. from a batched
+    `svn info` or `svn status` call. Otherwise they are queried when needed.
     """
-    WCExternalPath = os.path.join(svnExternal.svnWCFolderPath, svnExternal.path.replace('/', os.sep))
+    WCExternalPath = svnExternal.WCPath
     DebugLog.print("check external at : " + WCExternalPath)
 
 
@@ -195,13 +505,18 @@ def checkoutSvnExternal(svnExternal, discard_local_changes=False):
     # check for existing svn external pointing to wrong url
     # in which case the external needs to be deleted and a clean checkout is needed
     # instead of only updating the existing svnExternal to the proper revision
+    if os.path.isfile(os.path.join(WCExternalPath, EXPORT_MARKER)):
+        # an export (cf. exportSvnExternal) is replaced by a checkout
+        DebugLog.print("replacing the export at : " + WCExternalPath)
+        trash.MoveToTrash(WCExternalPath)
+
     if os.path.isdir(WCExternalPath):
         # an svn working copy is expected!
         if not IsSvnWc(WCExternalPath):
             raise Exception("Terminating: svn external expected, but no svn WC is found:" + WCExternalPath)
 
         # svn wc may not be dirty, since this action would result in lost data!
-        svnWc_is_dirty = IsSvnWcDirty(WCExternalPath)
+        svnWc_is_dirty = isDirty if isDirty is not None else IsSvnWcDirty(WCExternalPath)
 
         if svnWc_is_dirty and discard_local_changes is False:
             raise Exception("Terminating: dirty svn external is not allowed (risk of losing changes!): " + WCExternalPath)
@@ -210,7 +525,7 @@ def checkoutSvnExternal(svnExternal, discard_local_changes=False):
 
         # if the working copy is a checkout of the wrong svn url then delete it.
         # e.g. the external has updated and  new checkout is needed
-        existingExternalQualifiedUrl = GetQualifiedUrlForFolder(WCExternalPath)
+        existingExternalQualifiedUrl = existingUrl or GetQualifiedUrlForFolder(WCExternalPath)
         forceCleanCheckout = (svnExternal.QualifiedUrl != existingExternalQualifiedUrl)
         # if the pegRev and operatative revision are set but not equal, then lets be conservative and do a clean checkout.
         forceCleanCheckout |= ((svnExternal.operativeRev is not None) and (svnExternal.pegRev != svnExternal.operativeRev))
@@ -218,6 +533,11 @@ def checkoutSvnExternal(svnExternal, discard_local_changes=False):
         if forceCleanCheckout and  svnWc_is_dirty and discard_local_changes is False:
             raise Exception("Terminating: conflicting requirements: local changes are not discarded, yet a clean checkout is required: " + WCExternalPath)
 
+        # a new url in the same repository (e.g. a tag or branch bump) only needs to transfer the delta
+        switchable = (svnExternal.operativeRev is None) or (svnExternal.pegRev == svnExternal.operativeRev)
+        if forceCleanCheckout and switchable and switchSvnExternal(svnExternal, svnWc_is_dirty, svnInfo):
+            return
+
         if forceCleanCheckout: 
             DebugLog.print("removing : " + WCExternalPath)
             DebugLog.print("existing external points to")
@@ -226,25 +546,8 @@ def checkoutSvnExternal(svnExternal, discard_local_changes=False):
             DebugLog.print(svnExternal.QualifiedUrl)
             DebugLog.print("So a new checkout is needed.")
 
-            def onerror(func, path, exc_info):
-                """
-                Error handler for ``shutil.rmtree``.
-
-                If the error is due to an access error (read only file)
-                it attempts to add write permission and then retries.
-
-                If the error is for another reason it re-raises the error.
-
-                Usage : ``shutil.rmtree(path, onerror=onerror)``
-                """
-                import stat
-                if not os.access(path, os.W_OK):
-                    # Is the error an access error ?
-                    os.chmod(path, stat.S_IWUSR)
-                    func(path)
-                else:
-                    raise
-            shutil.rmtree(WCExternalPath, onerror=onerror)
+            # the new checkout can start right away, the stale one is deleted in the background
+            trash.MoveToTrash(WCExternalPath)
 
 
 
@@ -273,14 +576,9 @@ def checkoutSvnExternal(svnExternal, discard_local_changes=False):
 
 
         # checkout already exists, just update it
-        pwd = os.getcwd()
-        os.chdir(WCExternalPath)
-        try:
-            DebugLog.print(str(cmd))
-            svnOutput = subprocess.check_output(cmd).decode()
-            DebugLog.print(svnOutput)
-        finally:
-            os.chdir(pwd)
+        DebugLog.print(str(cmd))
+        svnOutput = subprocess.check_output(cmd, cwd=WCExternalPath).decode()
+        DebugLog.print(svnOutput)
     elif os.path.isfile(WCExternalPath):
         DebugLog.print("udpate external file at: " + WCExternalPath)
 
@@ -303,22 +601,25 @@ def checkoutSvnExternal(svnExternal, discard_local_changes=False):
         cmd += [os.path.basename(WCExternalPath)]
 
         # checkout already exists, just update it
-        pwd = os.getcwd()
-        os.chdir(os.path.dirname(WCExternalPath))
-        try:
-            DebugLog.print(str(cmd))
-            svnOutput = subprocess.check_output(cmd).decode()
-            DebugLog.print(svnOutput)
-        finally:
-            os.chdir(pwd)
+        DebugLog.print(str(cmd))
+        svnOutput = subprocess.check_output(cmd, cwd=os.path.dirname(WCExternalPath) or None).decode()
+        DebugLog.print(svnOutput)
 
     else:
         DebugLog.print("new checkout at: " + WCExternalPath)
         
         assert not os.path.exists(WCExternalPath)
-        type = getNodeType(svnExternal)
+        if svnInfo is not None:
+            type = svnInfo.nodeType
+        else:
+            type = getNodeType(svnExternal)
         if type == SvnNodeType.DIR:
             DebugLog.print("new checkout of dir at: " + WCExternalPath)
+            checkoutStore = store.CheckoutStore.default()
+            if checkoutStore.enabled and svnExternal.IsPinned:
+                checkoutStore.Materialize(svnExternal, WCExternalPath)
+                return
+
             # build svn cli arguments
             cmd = ['svn', 'checkout', '-q']
             if svnExternal.operativeRev:
@@ -332,78 +633,304 @@ def checkoutSvnExternal(svnExternal, discard_local_changes=False):
             cmd += [svnExternal.path.replace('/', os.sep)]
             
             # external doesn't yet exists, check it out from the svn repo
-            pwd = os.getcwd()
             os.makedirs(svnExternal.svnWCFolderPath, exist_ok=True)
-            os.chdir(svnExternal.svnWCFolderPath)
-            try:
-                DebugLog.print(str(cmd))
-                svnOutput = subprocess.check_output(cmd).decode()
-                DebugLog.print(svnOutput)
-            finally:
-                os.chdir(pwd)
+            DebugLog.print(str(cmd))
+            svnOutput = subprocess.check_output(cmd, cwd=svnExternal.svnWCFolderPath).decode()
+            DebugLog.print(svnOutput)
         elif type == SvnNodeType.FILE:
             DebugLog.print("new checkout of file at: " + WCExternalPath)
             # external doesn't yet exists, check it out from the svn repo
-            pwd = os.getcwd()
-            dirpath = os.path.dirname(os.path.join(svnExternal.svnWCFolderPath, svnExternal.path))
+            dirpath = os.path.dirname(WCExternalPath)
             os.makedirs(dirpath, exist_ok=True)
-            os.chdir(dirpath)
-            DebugLog.print("cwd: " + os.getcwd())
-            try:
-                urlparts = urllib.parse.urlparse(svnExternal.QualifiedUrl)
-                parentDirUrl = urllib.parse.urlunparse((urlparts.scheme,
-                                                       urlparts.netloc,
-                                                       os.path.dirname(urlparts.path),
-                                                       "","",""))
-                cmd = ['svn', 'checkout'
-                    ,'--force'
-                    , '--depth', 'empty',
-                    parentDirUrl,
-                    "."]
-                DebugLog.print(str(cmd))
-                subprocess.check_call(cmd)
-
-                cmd = ['svn', 'update'
-                    ,'--force'
-                    , '--set-depth', 'immediates' 
-                    , '--accept=working'
-                    , os.path.basename(urlparts.path)]   
-                DebugLog.print(str(cmd))
-                subprocess.check_call(cmd)
-
-
-            finally:
-                os.chdir(pwd)
+            DebugLog.print("cwd: " + dirpath)
+
+            urlparts = urllib.parse.urlparse(svnExternal.QualifiedUrl)
+            parentDirUrl = urllib.parse.urlunparse((urlparts.scheme,
+                                                   urlparts.netloc,
+                                                   os.path.dirname(urlparts.path),
+                                                   "","",""))
+            cmd = ['svn', 'checkout'
+                ,'--force'
+                , '--depth', 'empty',
+                parentDirUrl,
+                "."]
+            DebugLog.print(str(cmd))
+            subprocess.check_call(cmd, cwd=dirpath)
+
+            cmd = ['svn', 'update'
+                ,'--force'
+                , '--set-depth', 'immediates' 
+                , '--accept=working'
+                , os.path.basename(urlparts.path)]   
+            DebugLog.print(str(cmd))
+            subprocess.check_call(cmd, cwd=dirpath)
             
         elif type is None:
-            raise Exception("svn External does not exist and thus can't be checked out: " + str(svnEsvnExternal))
+            raise Exception("svn External does not exist and thus can't be checked out: " + str(svnExternal))
         else:
             # this type can only be any of the 3 values
             # this the SvnNodetype enum expand?
-            assert false
+            assert False
+def UpdateSvnWcs(paths, rev=None):
+    """update several working copies (or files) with a single `svn update` call
+
+    svn reuses the repository session for targets in the same repository.
+    """
+    cmd = ['svn', 'up', '-q']
+    if rev:
+        cmd += ['-r', str(rev)]
+    cmd += list(paths)
+
+    DebugLog.print(str(cmd))
+    svnOutput = subprocess.check_output(cmd).decode()
+    DebugLog.print(svnOutput)
+
+def FormatSvnExternalsDefinition(svnExternal):
+    """the svn:externals line of the external, with its url qualified
+
+    i.e. the definition doesn't depend on the repository of the folder it is set on
+    """
+    definition = ""
+    if svnExternal.operativeRev is not None:
+        definition += "-r " + str(svnExternal.operativeRev) + " "
+    definition += svnExternal.QualifiedPegUrl
+
+    path = svnExternal.path
+    if len(path.split()) > 1:
+        path = "'" + path + "'"
+    return definition + " " + path
+
+def GetWorkingProperty(paths, name):
+    """the {path: value} of a working property of paths, paths without the property are left out"""
+    cmd = ['svn', 'proplist', '--xml', '-v', '--depth', 'empty'] + list(paths)
+    DebugLog.print(str(cmd))
+    output = subprocess.check_output(cmd)
+
+    # svn reports the paths in their canonical form, e.g. "." for "./"
+    values = {}
+    for target in ET.fromstring(output).iter('target'):
+        for prop in target.iter('property'):
+            if prop.get('name') == name:
+                values[os.path.normpath(target.get('path'))] = prop.text or ""
+    return {p: values[os.path.normpath(p)] for p in paths if os.path.normpath(p) in values}
+
+def CheckoutSvnExternalsWithSvn(svnExternals, wcRoot="."):
+    """let svn itself checkout/update the externals
+
+    the definitions are set as a local svn:externals property on the folders they
+    are defined on, after which a single `svn update` of the working copy fetches
+    all of them in one svn process that reuses its repository connections. svn only
+    handles externals on an update of infinite depth, which keeps the working copy
+    at the BASE revision of wcRoot (i.e. a mixed revision working copy ends up at
+    that revision).
+    afterwards the previous svn:externals of the folders are restored, such that the
+    working copy doesn't keep property modifications. the externals stay checked
+    out, yet a later plain `svn update` removes the ones that the svn:externals of
+    the folders don't define.
+    """
+    folders = OrderedDict()
+    for e in svnExternals:
+        folders.setdefault(e.svnWCFolderPath, []).append(FormatSvnExternalsDefinition(e))
+
+    previous = GetWorkingProperty(folders, 'svn:externals')
+    try:
+        for (folder, definitions) in folders.items():
+            cmd = ['svn', 'propset', '-q', 'svn:externals', "\n".join(definitions) + "\n", folder]
+            DebugLog.print(str(cmd))
+            subprocess.check_call(cmd)
+
+        cmd = ['svn', 'update', '-q', '-r', 'BASE', wcRoot]
+        DebugLog.print(str(cmd))
+        subprocess.check_call(cmd)
+    finally:
+        # svn drops the property modification when the pristine value is set again
+        for folder in folders:
+            if folder in previous:
+                cmd = ['svn', 'propset', '-q', 'svn:externals', previous[folder], folder]
+            else:
+                cmd = ['svn', 'propdel', '-q', 'svn:externals', folder]
+            DebugLog.print(str(cmd))
+            subprocess.check_call(cmd)
+
+# marker file of an exported external, holds the definition that was exported
+EXPORT_MARKER = '.svn-export'
+
+def _exportIdentity(svnExternal):
+    identity = svnExternal.QualifiedPegUrl
+    if svnExternal.operativeRev is not None:
+        identity += " -r " + str(svnExternal.operativeRev)
+    return identity
+
+def exportSvnExternal(svnExternal, discard_local_changes=False, svnInfo=None):
+    """materialise a pinned dir external with `svn export`, i.e. without working copy metadata
+
+    the exported definition is recorded in a marker file, such that a rerun skips
+    an up to date export. an existing checkout is only replaced when local changes
+    may be discarded.
+    return False if the external can't be exported (e.g. not pinned, a file), in
+    which case a regular checkout is needed.
+    """
+    WCExternalPath = svnExternal.WCPath
+    if not svnExternal.IsPinned:
+        return False
+
+    identity = _exportIdentity(svnExternal)
+    markerPath = os.path.join(WCExternalPath, EXPORT_MARKER)
+    if os.path.isfile(markerPath):
+        with open(markerPath, 'rt') as f:
+            if f.read().strip() == identity:
+                DebugLog.print("export is up to date: " + WCExternalPath)
+                return True
+    elif os.path.exists(WCExternalPath):
+        if not (discard_local_changes and os.path.isdir(WCExternalPath) and IsSvnWc(WCExternalPath)):
+            DebugLog.print("keeping the existing checkout: " + WCExternalPath)
+            return False
+
+    nodeType = svnInfo.nodeType if svnInfo is not None else getNodeType(svnExternal)
+    if nodeType != SvnNodeType.DIR:
+        return False
+
+    if os.path.exists(WCExternalPath):
+        DebugLog.print("replacing : " + WCExternalPath)
+        trash.MoveToTrash(WCExternalPath)
+
+    # export next to the final location, such that an interrupted export is never mistaken for a complete one
+    parentPath = os.path.dirname(os.path.abspath(WCExternalPath))
+    os.makedirs(parentPath, exist_ok=True)
+    tmpPath = os.path.join(parentPath, '.tmp-export-' + uuid.uuid4().hex)
+
+    cmd = ['svn', 'export', '-q']
+    if svnExternal.operativeRev is not None:
+        cmd += ['-r', str(svnExternal.operativeRev)]
+    cmd += [svnExternal.QualifiedPegUrl, tmpPath]
+
+    DebugLog.print(str(cmd))
+    try:
+        subprocess.check_output(cmd)
+        with open(os.path.join(tmpPath, EXPORT_MARKER), 'wt') as f:
+            f.write(identity + "\n")
+        os.rename(tmpPath, WCExternalPath)
+    except BaseException:
+        if os.path.exists(tmpPath):
+            trash.RemoveTree(tmpPath)
+        raise
+    return True
+
+def switchSvnExternal(svnExternal, revert=False, svnInfo=None):
+    """switch the existing dir checkout of an external in place to its (changed) url
+
+    return False if the checkout can't be switched, i.e. the new url is in another
+    repository or `svn switch` failed, in which case a clean checkout is needed.
+    """
+    WCExternalPath = svnExternal.WCPath
+
+    wcReposRoot = wcdb.GetReposRoot(WCExternalPath)
+    if wcReposRoot is None:
+        wcInfo = GetSvnInfoForTargets([WCExternalPath])[WCExternalPath]
+        wcReposRoot = wcInfo.reposRoot if wcInfo is not None else None
+
+    try:
+        if svnInfo is not None and svnInfo.reposRoot is not None:
+            reposRoot = svnInfo.reposRoot
+        else:
+            reposRoot = GetReposRootForUrl(svnExternal.QualifiedPegUrl)
+    except subprocess.CalledProcessError as e:
+        DebugLog.print("no repository root found for {}: {}".format(svnExternal.QualifiedPegUrl, e))
+        return False
+
+    if wcReposRoot is None or wcReposRoot.rstrip('/') != reposRoot.rstrip('/'):
+        DebugLog.print("can't switch {} to another repository: {} -> {}".format(WCExternalPath, wcReposRoot, reposRoot))
+        return False
+
+    if revert:
+        cmd = ['svn', 'revert', '-R', '.']
+        DebugLog.print(str(cmd))
+        subprocess.check_output(cmd, cwd=WCExternalPath)
+
+    # --ignore-ancestry: the new url needn't share history with the old one
+    cmd = ['svn', 'switch', '-q', '--ignore-ancestry']
+    if svnExternal.pegRev:
+        cmd += ['-r', str(svnExternal.pegRev)]
+    cmd += [svnExternal.QualifiedPegUrl, '.']
+
+    DebugLog.print(str(cmd))
+    try:
+        svnOutput = subprocess.check_output(cmd, cwd=WCExternalPath).decode()
+    except subprocess.CalledProcessError as e:
+        DebugLog.print("svn switch failed, falling back to a clean checkout: " + str(e))
+        return False
+    DebugLog.print(svnOutput)
+    return True
+
 @timeit
 def GetSvnWCBaseRev() -> int:
+    rev = wcdb.GetBaseRev()
+    if rev is not None:
+        return rev
+
     xmlStr = subprocess.check_output(['svn', 'info' ,'--xml', '-r',  'BASE']).decode()
     xmlEl = ET.fromstring(xmlStr)
     return int(xmlEl.find('entry').get('revision'))
 
 def GetSvnRepoUrl():
+    repoUrl = wcdb.GetReposRoot()
+    if repoUrl is not None:
+        return repoUrl
+
     xmlStr = subprocess.check_output(['svn', 'info',  '--xml', '']).decode()
     xmlEl = ET.fromstring(xmlStr)
     repoUrl = xmlEl.find('entry/repository/root').text
     return repoUrl
 
-def GetSvnExternalsFromLocalSvnWc():
+def _toSvnWCFolderPath(relpath):
+    """the folder path of a wcdb.GetDirProperties relpath as printed by `svn pget -R ./`"""
+    if relpath == "":
+        return "."
+    return relpath.replace('/', os.sep)
+
+def StreamOutputLines(cmd, cwd=None):
+    """generator yielding the stdout lines of cmd while it is still running
+
+    raises CalledProcessError once all output is consumed if cmd failed
+    """
+    DebugLog.print(str(cmd))
+    with subprocess.Popen(cmd, stdout=subprocess.PIPE, cwd=cwd) as p:
+        try:
+            for line in p.stdout:
+                yield line.decode().rstrip('\r\n')
+        except GeneratorExit:
+            # the consumer stopped early, don't wait for the remaining output
+            p.kill()
+            raise
+        returncode = p.wait()
+
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, cmd)
+
+def IterSvnExternalsFromLocalSvnWc():
+    """generator yielding the svn externals of the working copy as soon as they are parsed
+
+    the externals of a single folder are yielded consecutively, parent folders first
+    """
     hostRepoUrl = GetSvnRepoUrl()
 
+    # the svn:externals properties straight from wc.db
+    dirProperties = wcdb.GetDirProperties(".", names=('svn:externals',))
+    if dirProperties is not None:
+        for (relpath, props) in dirProperties:
+            svnWCFolderPath = _toSvnWCFolderPath(relpath)
+            for line in props['svn:externals'].splitlines():
+                if len(line.strip()) == 0:
+                    continue
+                yield SvnExternal.parse(hostRepoUrl, svnWCFolderPath, line)
+        return
+
     # get all the svn:externals properties recursively
     cmd = ["svn", "pget", "svn:externals", '-R', './']
-    out = subprocess.check_output(cmd).decode()
 
     # parse the output line by line fail in case or problems
     currentPathDef = ""
-    externalDefinitions = []
-    for line in out.splitlines():
+    for line in StreamOutputLines(cmd):
         if len(line) ==0:
             continue
 
@@ -414,16 +941,35 @@ def GetSvnExternalsFromLocalSvnWc():
             # key is a new pathDef
             currentPathDef = key
             assert key[0] != '/'
-            currentPathDef = currentPathDef
 
             # value if first externalDef for pathDef
-            externaldef = SvnExternal.parse(hostRepoUrl, currentPathDef,value)
-            externalDefinitions.append(externaldef)
+            yield SvnExternal.parse(hostRepoUrl, currentPathDef,value)
             continue
         
         # current line must be a externalDef
-        externaldef = SvnExternal.parse(hostRepoUrl, currentPathDef, line)
-        externalDefinitions.append(externaldef)
-    
-    return externalDefinitions
-	
+        yield SvnExternal.parse(hostRepoUrl, currentPathDef, line)
+
+def GetSvnExternalsFromLocalSvnWc():
+    return list(IterSvnExternalsFromLocalSvnWc())
+
+
+def GetSvnIgnoreRulesFromLocalSvnWc():
+    """the svn:ignore properties of the working copy as git ignore rules
+
+    formatted like the output of `git svn show-ignore`, i.e. a '# /<folder>/'
+    comment followed by the '/<folder>/<pattern>' rules of each folder.
+    return None if the properties can't be read from wc.db
+    """
+    dirProperties = wcdb.GetDirProperties(".", names=('svn:ignore',))
+    if dirProperties is None:
+        return None
+
+    out = ""
+    for (relpath, props) in dirProperties:
+        path = '/' + relpath + '/' if relpath else '/'
+        out += "\n# " + path + "\n"
+        for pattern in props['svn:ignore'].splitlines():
+            pattern = pattern.strip()
+            if pattern:
+                out += path + pattern + "\n"
+    return out
@@ -0,0 +1,251 @@
+"""
+incremental parser of the svn dump format (`svnadmin dump`, `svnrdump dump`)
+
+The dump is parsed record by record straight from the stream, such that the
+dump of a large repository never has to be stored or kept in memory.
+File contents are either full texts or svndiff (version 0 or 1) deltas against
+the previous version of the node, which are applied with `ApplySvnDiff()`.
+
+http://svn.apache.org/repos/asf/subversion/trunk/notes/dump-load-format.txt
+http://svn.apache.org/repos/asf/subversion/trunk/notes/svndiff
+"""
+import zlib
+
+
+class DumpRevision:
+    """a Revision-number record of a dump and its revision properties"""
+
+    def __init__(self, number, props):
+        self.number = number
+        self.props = props
+
+    def __str__(self):
+        return "r" + str(self.number)
+
+
+class DumpNode:
+    """a Node-path record of a dump
+
+    props is None if the record has no property section, with propDelta the
+    props only contain the changed properties and deletedProps the removed ones.
+    text is None if the record has no text section, with textDelta the text is
+    an svndiff against the previous version of the node (or its copy source).
+    """
+
+    def __init__(self, headers, props, deletedProps, text):
+        self.path = headers['Node-path']
+        self.kind = headers.get('Node-kind')
+        self.action = headers.get('Node-action')
+        self.copyfromPath = headers.get('Node-copyfrom-path')
+        self.copyfromRev = int(headers['Node-copyfrom-rev']) if 'Node-copyfrom-rev' in headers else None
+        self.propDelta = headers.get('Prop-delta') == 'true'
+        self.textDelta = headers.get('Text-delta') == 'true'
+        self.props = props
+        self.deletedProps = deletedProps
+        self.text = text
+
+    def __str__(self):
+        return "{} {} {}".format(self.action, self.kind, self.path)
+
+
+class DumpParser:
+    """parse a binary dump stream into DumpRevision and DumpNode records"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.formatVersion = None
+        self.uuid = None
+
+    def _readHeaders(self):
+        """read a header block, return None at the end of the stream"""
+        headers = {}
+        while True:
+            line = self.stream.readline()
+            if not line:
+                if headers:
+                    raise Exception("unexpected end of svn dump in header block: " + str(headers))
+                return None
+
+            line = line.rstrip(b'\n')
+            if not line:
+                if headers:
+                    return headers
+                # blank lines in between records
+                continue
+
+            (key, sep, value) = line.decode('utf-8').partition(': ')
+            if not sep:
+                raise Exception("invalid svn dump header line: " + line.decode('utf-8', errors='replace'))
+            headers[key] = value
+
+    def _read(self, length):
+        data = self.stream.read(length)
+        if len(data) != length:
+            raise Exception("unexpected end of svn dump, expected {} more bytes".format(length - len(data)))
+        return data
+
+    def records(self):
+        """generator yielding the records of the dump in stream order"""
+        while True:
+            headers = self._readHeaders()
+            if headers is None:
+                return
+
+            if 'SVN-fs-dump-format-version' in headers:
+                self.formatVersion = int(headers['SVN-fs-dump-format-version'])
+                continue
+            if 'UUID' in headers:
+                self.uuid = headers['UUID']
+                continue
+
+            propLength = int(headers.get('Prop-content-length', -1))
+            textLength = int(headers.get('Text-content-length', -1))
+            contentLength = int(headers.get('Content-length', 0))
+
+            props = None
+            deletedProps = []
+            if propLength >= 0:
+                (props, deletedProps) = ParseProps(self._read(propLength))
+
+            text = None
+            if textLength >= 0:
+                text = self._read(textLength)
+
+            # skip content that is not described by the headers
+            remainder = contentLength - max(propLength, 0) - max(textLength, 0)
+            if remainder > 0:
+                self._read(remainder)
+
+            if 'Revision-number' in headers:
+                yield DumpRevision(int(headers['Revision-number']), props or {})
+            elif 'Node-path' in headers:
+                yield DumpNode(headers, props, deletedProps, text)
+            else:
+                raise Exception("unknown svn dump record: " + str(headers))
+
+
+def ParseProps(data):
+    """parse a property section, return a ({name: value}, [deleted names]) tuple"""
+    props = {}
+    deleted = []
+    pos = 0
+
+    def readLine():
+        nonlocal pos
+        eol = data.index(b'\n', pos)
+        line = data[pos:eol]
+        pos = eol + 1
+        return line
+
+    def readBlock(length):
+        nonlocal pos
+        block = data[pos:pos + length]
+        # each key and value is followed by a newline
+        pos += length + 1
+        return block.decode('utf-8', errors='replace')
+
+    while True:
+        line = readLine()
+        if line == b'PROPS-END':
+            return (props, deleted)
+
+        (kind, sep, length) = line.partition(b' ')
+        if kind == b'K':
+            key = readBlock(int(length))
+            (kind, sep, length) = readLine().partition(b' ')
+            if kind != b'V':
+                raise Exception("invalid svn dump property section, expected a value for: " + key)
+            props[key] = readBlock(int(length))
+        elif kind == b'D':
+            deleted.append(readBlock(int(length)))
+        else:
+            raise Exception("invalid svn dump property section line: " + line.decode('utf-8', errors='replace'))
+
+
+def _readVarint(data, pos):
+    """decode an svndiff variable length integer, return a (value, next pos) tuple"""
+    value = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value = (value << 7) | (byte & 0x7f)
+        if not byte & 0x80:
+            return (value, pos)
+
+
+def _decompress(data):
+    """decode an svndiff1 instruction or new data section"""
+    (length, pos) = _readVarint(data, 0)
+    data = data[pos:]
+    if len(data) == length:
+        # stored as is, compression would not have made it smaller
+        return data
+
+    data = zlib.decompress(data)
+    if len(data) != length:
+        raise Exception("corrupt svndiff1 section, expected {} bytes got {}".format(length, len(data)))
+    return data
+
+
+def ApplySvnDiff(source, delta):
+    """apply an svndiff (version 0 or 1) delta to the source bytes, return the target bytes"""
+    if delta[:3] != b'SVN':
+        raise Exception("invalid svndiff header: " + repr(delta[:4]))
+    version = delta[3]
+    if version not in (0, 1):
+        raise Exception("unsupported svndiff version: " + str(version))
+
+    target = bytearray()
+    pos = 4
+    while pos < len(delta):
+        (sviewOffset, pos) = _readVarint(delta, pos)
+        (sviewLength, pos) = _readVarint(delta, pos)
+        (tviewLength, pos) = _readVarint(delta, pos)
+        (insLength, pos) = _readVarint(delta, pos)
+        (newLength, pos) = _readVarint(delta, pos)
+
+        instructions = delta[pos:pos + insLength]
+        pos += insLength
+        newData = delta[pos:pos + newLength]
+        pos += newLength
+        if version == 1:
+            instructions = _decompress(instructions)
+            newData = _decompress(newData)
+
+        sview = source[sviewOffset:sviewOffset + sviewLength]
+        window = bytearray()
+        newPos = 0
+        ip = 0
+        while ip < len(instructions):
+            op = instructions[ip]
+            ip += 1
+            length = op & 0x3f
+            if length == 0:
+                (length, ip) = _readVarint(instructions, ip)
+
+            selector = op >> 6
+            if selector == 0:
+                # copy from the source view
+                (offset, ip) = _readVarint(instructions, ip)
+                window += sview[offset:offset + length]
+            elif selector == 1:
+                # copy from the target view, the copied range may overlap with its own output
+                (offset, ip) = _readVarint(instructions, ip)
+                while length > 0:
+                    chunk = window[offset:offset + length]
+                    if not chunk:
+                        raise Exception("invalid svndiff target copy offset: " + str(offset))
+                    window += chunk
+                    offset += len(chunk)
+                    length -= len(chunk)
+            elif selector == 2:
+                window += newData[newPos:newPos + length]
+                newPos += length
+            else:
+                raise Exception("invalid svndiff instruction: " + hex(op))
+
+        if len(window) != tviewLength:
+            raise Exception("corrupt svndiff window, expected {} bytes got {}".format(tviewLength, len(window)))
+        target += window
+
+    return bytes(target)
@@ -7,6 +7,7 @@ import re
 from git_svn.debug import *
 from git_svn.git import *
 from git_svn.svn import *
+from git_svn import preflight
 
 import argparse
 import subprocess
@@ -66,19 +67,21 @@ def main():
     global args
     args = parse_cli_args()
 
-    if not IsGitWc():
+    checks = preflight.RunPreflight(svnDirty=False)
+
+    if not checks.isGitWc:
         raise Exception("cwd is not a git repo: " + os.getcwd())
 
-    if IsGitWcDirty():
+    if checks.isGitWcDirty:
         raise Exception("cwd is dirty git working copy, terminating due to risk of loosing changes: " + os.getcwd())
         
 
 
-    if not IsSvnWc():
+    if not checks.isSvnWc:
         clean_svn_checkout()
         sys.exit(0)
 
-    if IsSvnWc():
+    if checks.isSvnWc:
         if args.ci:
             svn_cleanup()
 
@@ -0,0 +1,135 @@
+"""
+background removal of stale working copy folders
+
+Removing a large checkout (e.g. an external that needs a clean checkout) blocks
+for minutes on a slow disk. Instead the folder is atomically renamed into the
+git-svn-trash folder of the admin dir (cf. cache.GetAdminDir), which only takes
+a single rename when it is on the same filesystem, and is then deleted by a
+detached `python -m git_svn.trash <trash dir>` process.
+
+Trash left behind by a process that died is reclaimed by the next invocation.
+"""
+import os
+import shutil
+import stat
+import subprocess
+import sys
+import uuid
+
+from git_svn.debug import DebugLog
+from git_svn import cache
+
+TRASH_DIR = 'git-svn-trash'
+
+
+def _onerror(func, path, exc_info):
+    """
+    Error handler for ``shutil.rmtree``.
+
+    If the error is due to an access error (read only file)
+    it attempts to add write permission and then retries.
+
+    If the error is for another reason it re-raises the error.
+
+    Usage : ``shutil.rmtree(path, onerror=_onerror)``
+    """
+    if not os.access(path, os.W_OK):
+        # Is the error an access error ?
+        os.chmod(path, stat.S_IWUSR)
+        func(path)
+    else:
+        raise
+
+
+def RemoveTree(path):
+    """remove a folder (including read-only files) synchronously"""
+    DebugLog.print("removing : " + path)
+    shutil.rmtree(path, onerror=_onerror)
+
+
+def GetTrashDir():
+    """the trash folder of the current working copy, None if there is no admin dir"""
+    adminDir = cache.GetAdminDir()
+    if adminDir is None:
+        return None
+    return os.path.join(adminDir, TRASH_DIR)
+
+
+def _isSameFilesystem(path1, path2):
+    return os.stat(path1).st_dev == os.stat(path2).st_dev
+
+
+def MoveToTrash(path, trashDir=None, background=True):
+    """remove a folder, without waiting for its content to be deleted
+
+    the folder is renamed into the trash and deleted by a detached process.
+    falls back to a synchronous removal if the trash isn't on the same filesystem.
+    """
+    trashDir = trashDir or GetTrashDir()
+    parentDir = os.path.dirname(os.path.abspath(path))
+
+    if trashDir is not None:
+        os.makedirs(trashDir, exist_ok=True)
+        if _isSameFilesystem(trashDir, parentDir):
+            target = os.path.join(trashDir, uuid.uuid4().hex)
+            try:
+                os.rename(path, target)
+            except OSError as e:
+                # e.g. files that are still open on Windows
+                DebugLog.print("failed to move {} to the trash: {}".format(path, e))
+            else:
+                DebugLog.print("moved {} to the trash: {}".format(path, target))
+                if background:
+                    EmptyTrash(trashDir)
+                return
+
+    RemoveTree(path)
+
+
+def EmptyTrash(trashDir):
+    """delete the content of the trash in a detached process"""
+    cmd = [sys.executable, '-m', 'git_svn.trash', trashDir]
+    DebugLog.print(str(cmd))
+
+    kwargs = {}
+    if os.name == 'nt':
+        kwargs['creationflags'] = subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP
+    else:
+        kwargs['start_new_session'] = True
+    subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                     close_fds=True, **kwargs)
+
+
+def ReclaimTrash(trashDir=None):
+    """start deleting the trash left behind by earlier invocations, if any"""
+    trashDir = trashDir or GetTrashDir()
+    if trashDir is None or not os.path.isdir(trashDir):
+        return
+
+    if any(not name.startswith('.') for name in os.listdir(trashDir)):
+        DebugLog.print("reclaiming leftover trash: " + trashDir)
+        EmptyTrash(trashDir)
+
+
+def DeleteTrash(trashDir):
+    """delete all content of the trash
+
+    concurrent deletions are serialized, such that they don't trip over each other.
+    """
+    with cache.FileLock(os.path.join(trashDir, '.lock')):
+        for name in os.listdir(trashDir):
+            if name.startswith('.'):
+                continue
+            path = os.path.join(trashDir, name)
+            try:
+                if os.path.isdir(path) and not os.path.islink(path):
+                    RemoveTree(path)
+                else:
+                    os.remove(path)
+            except OSError as e:
+                # retried by the next invocation
+                DebugLog.print("failed to delete {}: {}".format(path, e))
+
+
+if __name__ == '__main__':
+    DeleteTrash(sys.argv[1])
@@ -0,0 +1,198 @@
+"""
+local index of the svn:externals properties recorded in the git-svn unhandled.log
+
+During fetch git-svn appends every svn property change it can't represent in git
+to $GIT_DIR/svn/<ref>/unhandled.log, e.g.
+
+    r1234
+      +dir_prop: . svn:externals ^/lib%40100%20lib%0A
+      -dir_prop: src/foo svn:externals
+
+i.e. the (uri encoded) path relative to the svn branch, the property name and its
+full new value. Replaying these records yields the svn:externals in effect at any
+revision of the branch without asking the svn server (cf. `git svn show-externals`).
+
+The parsed records are stored next to the SvnCache, together with the byte offset
+up to which the log was parsed, such that only newly fetched revisions are parsed.
+"""
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import urllib.parse
+from bisect import bisect_right
+
+from git_svn.debug import DebugLog
+from git_svn import cache
+
+EXTERNALS_PROP = 'svn:externals'
+
+_REV_REGEX = re.compile(r"^r([0-9]+)$")
+_PROP_REGEX = re.compile(r"^  ([+-])dir_prop: (\S+) (\S+)(?: (\S*))?$")
+
+
+def GetUnhandledLogPath(gitDir, gitRef):
+    """path of the unhandled.log of a git-svn tracking ref, e.g. refs/remotes/git-svn/trunk"""
+    return os.path.join(gitDir, 'svn', gitRef.replace('/', os.sep), 'unhandled.log')
+
+
+def ToSvnWCFolderPath(path):
+    """the svnWCFolderPath of a branch relative path, as reported by `git svn show-externals`"""
+    if path in ('', '.'):
+        return './'
+    return './' + path.strip('/') + '/'
+
+
+def _iterDirPropChanges(data, changes):
+    """generator yielding the (rev, path, name, value) dir property changes of (complete lines of) unhandled.log data
+
+    value is None if the property was deleted. changes is the list of (rev, ...)
+    records parsed so far: git-svn refetches revisions after `git svn reset`, so
+    the records of a refetched and all later revisions are removed from it.
+    """
+    rev = changes[-1][0] if changes else None
+    for line in data.decode(errors='replace').splitlines():
+        m = _REV_REGEX.match(line)
+        if m is not None:
+            rev = int(m.group(1))
+            # the latest records win
+            while changes and changes[-1][0] >= rev:
+                changes.pop()
+            continue
+
+        m = _PROP_REGEX.match(line)
+        if m is None or rev is None:
+            continue
+
+        (action, path, name, value) = m.groups()
+        value = urllib.parse.unquote(value or "") if action == '+' else None
+        yield (rev, urllib.parse.unquote(path), urllib.parse.unquote(name), value)
+
+
+def ReadDirProps(logPath, maxRev=None):
+    """the dir properties recorded in an unhandled.log, by branch relative path ("" for the branch root)
+
+    i.e. the replay of all its dir_prop records, up to svn revision maxRev if given.
+    """
+    with open(logPath, 'rb') as f:
+        data = f.read()
+
+    changes = []
+    for (rev, path, name, value) in _iterDirPropChanges(data, changes):
+        changes.append((rev, "" if path == '.' else path, name, value))
+
+    properties = {}
+    for (changeRev, path, name, value) in changes:
+        if maxRev is not None and changeRev > maxRev:
+            break
+        if value is None:
+            properties.get(path, {}).pop(name, None)
+        else:
+            properties.setdefault(path, {})[name] = value
+    return properties
+
+
+class ExternalsIndex:
+    """the svn:externals property changes of a single git-svn ref
+
+    changes is a list of (rev, path, value) records in revision order,
+    with value None if the property was deleted.
+    """
+
+    _indexes = {}
+    _indexesLock = threading.Lock()
+
+    def __init__(self, logPath, path=None):
+        self.logPath = logPath
+        self.path = path
+        self.offset = 0
+        self.changes = []
+        self._lock = threading.Lock()
+
+        if path is not None and os.path.isfile(path):
+            self._load()
+
+    @staticmethod
+    def forLog(logPath):
+        """the (process wide) index of an unhandled.log"""
+        logPath = os.path.abspath(logPath)
+        with ExternalsIndex._indexesLock:
+            if logPath not in ExternalsIndex._indexes:
+                directory = cache.SvnCache.default().directory
+                path = None
+                if directory is not None:
+                    name = hashlib.sha1(logPath.encode()).hexdigest()
+                    path = os.path.join(directory, 'externals', name)
+                ExternalsIndex._indexes[logPath] = ExternalsIndex(logPath, path)
+            return ExternalsIndex._indexes[logPath]
+
+    def _load(self):
+        try:
+            with open(self.path, 'rt') as f:
+                state = json.load(f)
+        except (OSError, ValueError) as e:
+            DebugLog.print("ignoring corrupt externals index {}: {}".format(self.path, e))
+            return
+        self.offset = state['offset']
+        self.changes = [tuple(c) for c in state['changes']]
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        (fd, tmpPath) = tempfile.mkstemp(dir=os.path.dirname(self.path), prefix='.tmp')
+        with os.fdopen(fd, 'wt') as f:
+            json.dump({'offset': self.offset, 'changes': self.changes}, f)
+        os.replace(tmpPath, self.path)
+
+    def _parse(self, data):
+        """add the svn:externals changes of (complete lines of) unhandled.log data"""
+        for (rev, path, name, value) in _iterDirPropChanges(data, self.changes):
+            if name == EXTERNALS_PROP:
+                self.changes.append((rev, path, value))
+
+    def update(self):
+        """parse the records that were appended to unhandled.log since the last update"""
+        with self._lock:
+            size = os.path.getsize(self.logPath)
+            if size < self.offset:
+                DebugLog.print("unhandled.log was truncated, rebuilding its externals index")
+                self.offset = 0
+                self.changes = []
+
+            if size == self.offset:
+                return
+
+            with open(self.logPath, 'rb') as f:
+                f.seek(self.offset)
+                data = f.read(size - self.offset)
+
+            # leave a partially written last line for the next update
+            end = data.rfind(b'\n') + 1
+            if end == 0:
+                return
+
+            self._parse(data[:end])
+            self.offset += end
+            DebugLog.print("externals index of {}: {} changes".format(self.logPath, len(self.changes)))
+
+            if self.path is not None:
+                with cache.FileLock(self.path + '.lock'):
+                    self._save()
+
+    def ExternalsAt(self, rev, base=None):
+        """the svn:externals property values in effect at svn revision rev, by branch relative path
+
+        base are the values before the first recorded change, e.g. the ones a copied
+        branch inherited from its copy source.
+        """
+        self.update()
+
+        revs = [c[0] for c in self.changes]
+        properties = dict(base or {})
+        for (changeRev, path, value) in self.changes[:bisect_right(revs, int(rev))]:
+            if value is None:
+                properties.pop(path, None)
+            else:
+                properties[path] = value
+        return properties
@@ -0,0 +1,414 @@
+"""
+read-only access to the svn working copy database (.svn/wc.db)
+
+Simple working copy queries are answered straight from the sqlite database
+instead of spawning an svn process. Every query returns None if the answer can't
+be derived from wc.db (e.g. unknown wc format, pre 1.7 working copy, local
+modifications of the node), in which case the svn cli should be used instead.
+"""
+import hashlib
+import os
+import sqlite3
+import stat
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from git_svn.debug import DebugLog
+from git_svn import skel
+
+# wc.db formats (i.e. PRAGMA user_version) with a known schema
+#   29: svn 1.7
+#   31: svn 1.8 - 1.14
+#   32: svn 1.15
+SUPPORTED_FORMATS = (29, 31, 32)
+
+# characters that svn does not escape in urls, see svn_path_uri_encode()
+_URI_SAFE_CHARS = "!$&'()*+,-./:=@_~"
+
+# node presence values for which `svn info` reports a node
+_VERSIONED_PRESENCE = ('normal', 'incomplete', 'base-deleted')
+
+# properties that make the working file differ from its pristine text,
+# i.e. the working file can't be compared with the pristine checksum
+_TRANSLATING_PROPS = (b'svn:keywords', b'svn:eol-style', b'svn:special')
+
+# number of files stat-ed (and hashed if needed) per task of the dirty detector
+_CHUNK_SIZE = 512
+
+
+def FindWcRoot(path="."):
+    """return the root folder of the svn (>= 1.7) working copy that contains path
+
+    return None if no wc.db is found in path or any of its parent folders
+    """
+    path = os.path.abspath(path)
+    while True:
+        if os.path.isfile(os.path.join(path, '.svn', 'wc.db')):
+            return path
+
+        parent = os.path.dirname(path)
+        if parent == path:
+            return None
+        path = parent
+
+
+class WcDb:
+    """read-only connection to the wc.db of a single svn working copy
+
+    use `WcDb.open()` to obtain an instance, it returns None if the working copy
+    database can't be used.
+    """
+
+    def __init__(self, wcRoot, connection, format):
+        self.wcRoot = wcRoot
+        self.connection = connection
+        self.format = format
+        self.wcId = connection.execute("SELECT id FROM WCROOT ORDER BY id LIMIT 1").fetchone()[0]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    @staticmethod
+    def open(path="."):
+        """open the wc.db of the working copy that contains path"""
+        wcRoot = FindWcRoot(path)
+        if wcRoot is None:
+            return None
+
+        dbPath = os.path.join(wcRoot, '.svn', 'wc.db')
+        try:
+            uri = 'file:' + urllib.request.pathname2url(dbPath) + '?mode=ro'
+            connection = sqlite3.connect(uri, uri=True, timeout=1, check_same_thread=False)
+            format = connection.execute("PRAGMA user_version").fetchone()[0]
+            if format not in SUPPORTED_FORMATS:
+                DebugLog.print("unsupported wc.db format {}: {}".format(format, dbPath))
+                connection.close()
+                return None
+            return WcDb(wcRoot, connection, format)
+        except sqlite3.Error as e:
+            DebugLog.print("failed to open {}: {}".format(dbPath, e))
+            return None
+
+    def close(self):
+        self.connection.close()
+
+    def relpath(self, path):
+        """the wc.db local_relpath of path, i.e. relative to the wc root with '/' separators"""
+        relpath = os.path.relpath(os.path.abspath(path), self.wcRoot)
+        if relpath == os.curdir:
+            return ""
+        return relpath.replace(os.sep, '/')
+
+    def getNodes(self, path):
+        """all NODES rows of path, the highest (i.e. working) layer first"""
+        cursor = self.connection.execute(
+            """SELECT op_depth, presence, kind, revision, repos_id, repos_path
+               FROM NODES WHERE wc_id = ? AND local_relpath = ?
+               ORDER BY op_depth DESC""",
+            (self.wcId, self.relpath(path)))
+        columns = [c[0] for c in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def getBaseNode(self, path):
+        """the BASE row of path if it is not locally added, deleted or replaced"""
+        nodes = self.getNodes(path)
+        if len(nodes) != 1 or nodes[0]['op_depth'] != 0 or nodes[0]['presence'] != 'normal':
+            return None
+        return nodes[0]
+
+    def getReposRoot(self, reposId):
+        row = self.connection.execute("SELECT root FROM REPOSITORY WHERE id = ?", (reposId,)).fetchone()
+        return row[0] if row else None
+
+    def isVersioned(self, path):
+        nodes = self.getNodes(path)
+        if len(nodes) == 0:
+            # wc.db paths are case sensitive, but Windows paths aren't
+            return False if os.name != 'nt' else None
+        return nodes[0]['presence'] in _VERSIONED_PRESENCE
+
+
+def _query(path, func):
+    """run func(db) on the wc.db that contains path, None if wc.db can't be used"""
+    db = WcDb.open(path)
+    if db is None:
+        return None
+
+    with db:
+        try:
+            return func(db)
+        except sqlite3.Error as e:
+            DebugLog.print("wc.db query failed: " + str(e))
+            return None
+
+
+def IsSvnWc(path="."):
+    """True if path is a versioned node of an svn working copy"""
+    if FindWcRoot(path) is None:
+        # a pre 1.7 working copy has a .svn folder in each folder
+        return None if os.path.isdir(os.path.join(path, '.svn')) else False
+    return _query(path, lambda db: db.isVersioned(path))
+
+
+def GetBaseRev(path="."):
+    """the BASE revision of path"""
+    def query(db):
+        node = db.getBaseNode(path)
+        return node['revision'] if node else None
+    return _query(path, query)
+
+
+def GetReposRoot(path="."):
+    """the repository root url of path"""
+    def query(db):
+        node = db.getBaseNode(path)
+        return db.getReposRoot(node['repos_id']) if node else None
+    return _query(path, query)
+
+
+def GetUrl(path="."):
+    """the (url escaped) repository url of path"""
+    def query(db):
+        node = db.getBaseNode(path)
+        if node is None:
+            return None
+
+        root = db.getReposRoot(node['repos_id'])
+        if node['repos_path'] == "":
+            return root
+        return root + '/' + urllib.parse.quote(node['repos_path'], safe=_URI_SAFE_CHARS)
+    return _query(path, query)
+
+
+def GetNodeKind(path="."):
+    """the node kind of path: 'dir', 'file' or 'symlink'"""
+    def query(db):
+        nodes = db.getNodes(path)
+        return nodes[0]['kind'] if nodes else None
+    return _query(path, query)
+
+
+def _sha1(path):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _isFileModified(wcRoot, row):
+    """compare a working file with its BASE node, like `svn status` does
+
+    the file is only hashed when its size or mtime differ from the recorded ones.
+    return None if the file can't be compared without svn.
+    """
+    (relpath, properties, checksum, translatedSize, lastModTime) = row
+    path = os.path.join(wcRoot, relpath.replace('/', os.sep))
+    try:
+        st = os.lstat(path)
+    except OSError:
+        # missing
+        return True
+    if stat.S_ISDIR(st.st_mode):
+        # obstructed
+        return True
+
+    # last_mod_time is in microseconds
+    if st.st_size == translatedSize and st.st_mtime_ns // 1000 == lastModTime:
+        return False
+
+    if properties and any(p in properties for p in _TRANSLATING_PROPS):
+        return None
+    if checksum is None or not checksum.startswith('$sha1$'):
+        return None
+    if translatedSize is not None and st.st_size != translatedSize:
+        return True
+    return _sha1(path) != checksum[len('$sha1$'):]
+
+
+def _areFilesModified(wcRoot, rows):
+    """True if any file is modified, None if any file can't be compared"""
+    result = False
+    for row in rows:
+        modified = _isFileModified(wcRoot, row)
+        if modified:
+            return True
+        if modified is None:
+            result = None
+    return result
+
+
+def _parseProperties(data):
+    """decode a property skel into a {name: value} dict of bytes, {} for None"""
+    if data is None:
+        return {}
+    atoms = skel.ParseSkel(data)
+    if not isinstance(atoms, list) or len(atoms) % 2 != 0:
+        raise Exception("invalid property skel")
+    return dict(zip(atoms[0::2], atoms[1::2]))
+
+
+def IsDirty(path=".", jobs=None):
+    """True if `svn status --quiet path` would report any node
+
+    i.e. local modifications, additions, deletions, property changes, conflicts,
+    missing or switched nodes. Files are stat-ed by a thread pool and only hashed
+    when their size or mtime changed, just like git refreshes its index.
+    return None if svn itself is needed to decide, e.g. a pending work queue,
+    a modified file with keywords or eol translation, or svn externals within
+    path (`svn status` reports the modifications inside them, which live in
+    their own wc.db resp. aren't tracked as a regular file).
+    """
+    def query(db):
+        rel = db.relpath(path)
+        scope = "(? = '' OR local_relpath = ? OR substr(local_relpath, 1, ?) = ?)"
+        scopeArgs = (rel, rel, len(rel) + 1, rel + '/')
+
+        # an interrupted svn operation or a locked working copy, svn status knows best
+        if db.connection.execute("SELECT 1 FROM WORK_QUEUE LIMIT 1").fetchone():
+            return None
+        if db.connection.execute("SELECT 1 FROM WC_LOCK LIMIT 1").fetchone():
+            return None
+        if db.connection.execute("SELECT 1 FROM LOCK LIMIT 1").fetchone():
+            return None
+
+        # added, deleted, replaced, copied or moved nodes
+        if db.connection.execute("SELECT 1 FROM NODES WHERE wc_id = ? AND op_depth > 0 AND " + scope + " LIMIT 1",
+                                 (db.wcId,) + scopeArgs).fetchone():
+            return True
+
+        # conflicts
+        if db.connection.execute(
+                """SELECT 1 FROM ACTUAL_NODE WHERE wc_id = ? AND """ + scope + """
+                   AND (conflict_data IS NOT NULL OR tree_conflict_data IS NOT NULL
+                        OR conflict_old IS NOT NULL OR conflict_new IS NOT NULL
+                        OR conflict_working IS NOT NULL OR prop_reject IS NOT NULL)
+                   LIMIT 1""", (db.wcId,) + scopeArgs).fetchone():
+            return True
+
+        # property modifications, svn keeps the actual properties even when they
+        # were changed back to the pristine ones
+        for (actual, pristine) in db.connection.execute(
+                """SELECT properties, (SELECT NODES.properties FROM NODES WHERE NODES.wc_id = ACTUAL_NODE.wc_id
+                                          AND NODES.local_relpath = ACTUAL_NODE.local_relpath AND NODES.op_depth = 0)
+                   FROM ACTUAL_NODE WHERE wc_id = ? AND properties IS NOT NULL AND """ + scope,
+                (db.wcId,) + scopeArgs):
+            if actual == pristine:
+                continue
+            try:
+                modified = _parseProperties(actual) != _parseProperties(pristine)
+            except Exception as e:
+                DebugLog.print("can't compare the properties: " + str(e))
+                return None
+            if modified:
+                return True
+
+        # dir and file externals, `svn status` recurses into them
+        if db.connection.execute("SELECT 1 FROM EXTERNALS WHERE wc_id = ? AND " + scope + " LIMIT 1",
+                                 (db.wcId,) + scopeArgs).fetchone():
+            return None
+        if db.connection.execute("SELECT 1 FROM NODES WHERE wc_id = ? AND file_external IS NOT NULL AND "
+                                 + scope + " LIMIT 1", (db.wcId,) + scopeArgs).fetchone():
+            return None
+
+        rows = db.connection.execute(
+            """SELECT local_relpath, presence, kind, repos_path, file_external,
+                      properties, checksum, translated_size, last_mod_time
+               FROM NODES WHERE wc_id = ? AND op_depth = 0 AND """ + scope + """
+               ORDER BY local_relpath""", (db.wcId,) + scopeArgs).fetchall()
+
+        reposPaths = {}
+        files = []
+        for (relpath, presence, kind, reposPath, fileExternal,
+             properties, checksum, translatedSize, lastModTime) in rows:
+            if presence == 'incomplete':
+                return True
+            if presence != 'normal':
+                continue
+
+            reposPaths[relpath] = reposPath
+            parent = relpath.rpartition('/')[0] if relpath else None
+            if parent in reposPaths and reposPaths[parent] is not None:
+                expected = (reposPaths[parent] + '/' if reposPaths[parent] else '') + relpath.rpartition('/')[2]
+                if reposPath != expected:
+                    # switched
+                    return True
+
+            if kind == 'dir':
+                if not os.path.isdir(os.path.join(db.wcRoot, relpath.replace('/', os.sep))):
+                    return True
+            elif kind == 'file' or kind == 'symlink':
+                files.append((relpath, properties, checksum, translatedSize, lastModTime))
+
+        chunks = [files[i:i + _CHUNK_SIZE] for i in range(0, len(files), _CHUNK_SIZE)]
+        if len(chunks) <= 1:
+            return _areFilesModified(db.wcRoot, files)
+
+        result = False
+        with ThreadPoolExecutor(max_workers=jobs or min(32, (os.cpu_count() or 1) * 4)) as executor:
+            futures = [executor.submit(_areFilesModified, db.wcRoot, chunk) for chunk in chunks]
+            for future in futures:
+                modified = future.result()
+                if modified:
+                    for f in futures:
+                        f.cancel()
+                    return True
+                if modified is None:
+                    result = None
+        return result
+
+    if FindWcRoot(path) is None:
+        return None
+    return _query(path, query)
+
+
+def GetDirProperties(path=".", names=('svn:externals', 'svn:ignore')):
+    """the working properties of the versioned folders in path, like `svn pget -R`
+
+    a single scan of NODES (the highest, i.e. working, layer of each folder) and
+    ACTUAL_NODE (local property modifications, which replace the node properties).
+    return a list of (relpath, {name: value}) tuples, in path order, of the folders
+    that have any of the named properties. relpath is relative to path, with '/'
+    separators and "" for path itself.
+    """
+    def query(db):
+        rel = db.relpath(path)
+        scope = "(? = '' OR n.local_relpath = ? OR substr(n.local_relpath, 1, ?) = ?)"
+        scopeArgs = (rel, rel, len(rel) + 1, rel + '/')
+
+        # only decode the skels that mention any of the names
+        match = " OR ".join(["instr(props, ?) > 0"] * len(names))
+        rows = db.connection.execute(
+            """SELECT local_relpath, props FROM (
+                   SELECT n.local_relpath AS local_relpath, n.presence AS presence,
+                          CASE WHEN a.properties IS NOT NULL THEN a.properties ELSE n.properties END AS props
+                   FROM NODES n LEFT JOIN ACTUAL_NODE a ON a.wc_id = n.wc_id AND a.local_relpath = n.local_relpath
+                   WHERE n.wc_id = ? AND n.kind = 'dir' AND """ + scope + """
+                   AND n.op_depth = (SELECT MAX(op_depth) FROM NODES m
+                                     WHERE m.wc_id = n.wc_id AND m.local_relpath = n.local_relpath))
+               WHERE presence = 'normal' AND props IS NOT NULL AND (""" + match + """)
+               ORDER BY local_relpath""",
+            (db.wcId,) + scopeArgs + tuple(sqlite3.Binary(n.encode('utf-8')) for n in names)).fetchall()
+
+        result = []
+        for (relpath, props) in rows:
+            try:
+                props = skel.ParsePropertySkel(props)
+            except Exception as e:
+                DebugLog.print("failed to decode the properties of {}: {}".format(relpath, e))
+                return None
+            props = {k: v for (k, v) in props.items() if k in names}
+            if not props:
+                continue
+            if rel:
+                relpath = relpath[len(rel) + 1:] if relpath != rel else ""
+            result.append((relpath, props))
+        return result
+
+    if FindWcRoot(path) is None:
+        return None
+    return _query(path, query)
@@ -0,0 +1,73 @@
+import os
+import subprocess
+import pytest
+from git_svn import branchpoint
+from git_svn import git
+
+
+@pytest.fixture
+def gitRepo(tmp_path, monkeypatch):
+    for var in ("GIT_AUTHOR_NAME", "GIT_COMMITTER_NAME"):
+        monkeypatch.setenv(var, "test")
+    for var in ("GIT_AUTHOR_EMAIL", "GIT_COMMITTER_EMAIL"):
+        monkeypatch.setenv(var, "test@example.com")
+    subprocess.check_call(["git", "init", "-q", str(tmp_path)])
+    monkeypatch.chdir(str(tmp_path))
+    monkeypatch.setattr(branchpoint.BranchPoints, "_forGitDir", {})
+    return os.path.join(str(tmp_path), ".git")
+
+
+def commit(message):
+    subprocess.check_call(["git", "commit", "-q", "--allow-empty", "-m", message])
+    return subprocess.check_output(["git", "rev-parse", "HEAD"]).decode().strip()
+
+
+def test_branchPoint(gitRepo, monkeypatch):
+    commit("initial")
+    assert branchpoint.GetBranchPoint(gitRepo) is None
+
+    svnSha = commit("svn commit\n\ngit-svn-id: http://foobar/svn/trunk@12 cfd94225-6148-4c34-bb2a-21ea3148c527")
+    commit("local change")
+
+    # a newer git-svn commit that is only merged in as second parent
+    subprocess.check_call(["git", "checkout", "-q", "-b", "other", svnSha])
+    commit("newer svn commit\n\ngit-svn-id: http://foobar/svn/trunk@13 cfd94225-6148-4c34-bb2a-21ea3148c527")
+    subprocess.check_call(["git", "checkout", "-q", "-"])
+    subprocess.check_call(["git", "merge", "-q", "--no-ff", "-m", "merge", "other"])
+
+    expected = (svnSha, "http://foobar/svn/trunk", 12, "cfd94225-6148-4c34-bb2a-21ea3148c527")
+    assert git.GetGitSvnBranchPoint() == expected
+    assert git.find_svn_branch_point_for_current_gitbranch() == ("http://foobar/svn/trunk", 12)
+
+    # later lookups, also by a new process, don't walk the history again
+    monkeypatch.setattr(branchpoint.BranchPoints, "_forGitDir", {})
+    monkeypatch.setattr(branchpoint, "CommitReader", None)
+    assert git.GetGitSvnBranchPoint() == expected
+    assert os.path.isfile(os.path.join(gitRepo, branchpoint.BRANCHPOINT_FILE))
+
+
+def test_lastGitSvnIdCounts(gitRepo):
+    sha = commit("svn commit quoting\n\ngit-svn-id: http://foobar/svn/branches/a@5 cfd94225-6148-4c34-bb2a-21ea3148c527\n\n"
+                 "git-svn-id: http://foobar/svn/trunk@12 cfd94225-6148-4c34-bb2a-21ea3148c527")
+    assert branchpoint.GetBranchPoint(gitRepo) == (sha, "http://foobar/svn/trunk", 12, "cfd94225-6148-4c34-bb2a-21ea3148c527")
+
+
+def test_missingBranchPointIsNotPersisted(gitRepo, monkeypatch):
+    head = commit("initial")
+    assert branchpoint.GetBranchPoint(gitRepo) is None
+
+    # memoized in the process only, e.g. fetching more history of a shallow clone can change it
+    commitReader = branchpoint.CommitReader
+    monkeypatch.setattr(branchpoint, "CommitReader", None)
+    assert branchpoint.GetBranchPoint(gitRepo) is None
+    assert not os.path.isfile(os.path.join(gitRepo, branchpoint.BRANCHPOINT_FILE))
+
+    # a null entry persisted by an older version is ignored
+    path = os.path.join(gitRepo, branchpoint.BRANCHPOINT_FILE)
+    with open(path, "wt") as f:
+        f.write('{"%s": null}' % head)
+    assert branchpoint.BranchPoints(path).entries == {}
+
+    monkeypatch.setattr(branchpoint, "CommitReader", commitReader)
+    monkeypatch.setattr(branchpoint.BranchPoints, "_forGitDir", {})
+    assert branchpoint.GetBranchPoint(gitRepo) is None
@@ -0,0 +1,67 @@
+import os
+import time
+from git_svn import cache
+
+
+def test_cacheHitMiss(tmpdir):
+    c = cache.SvnCache(str(tmpdir))
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return b"<info/>"
+
+    assert c.getOrCompute(['svn', 'info', 'http://foobar@12'], compute) == b"<info/>"
+    assert c.getOrCompute(['svn', 'info', 'http://foobar@12'], compute) == b"<info/>"
+    assert len(calls) == 1
+    assert (c.hits, c.misses) == (1, 1)
+
+    c.putJson(('SvnInfo', None, 'http://foobar@12'), {'kind': 'dir'})
+    assert c.getJson(('SvnInfo', None, 'http://foobar@12')) == {'kind': 'dir'}
+
+
+def test_cacheLruEviction(tmpdir):
+    c = cache.SvnCache(str(tmpdir), maxSize=250)
+    c.put(cache.SvnCache.key(0), b"x" * 100)
+    c.put(cache.SvnCache.key(1), b"x" * 100)
+    time.sleep(0.05)
+
+    # mark entry 0 as the most recently used one
+    c.get(cache.SvnCache.key(0))
+    time.sleep(0.05)
+    c.put(cache.SvnCache.key(2), b"x" * 100)
+
+    assert c.get(cache.SvnCache.key(0)) is not None
+    assert c.get(cache.SvnCache.key(1)) is None
+    assert c.get(cache.SvnCache.key(2)) is not None
+
+
+def test_evictionOnlyCountsEntries(tmpdir, monkeypatch):
+    c = cache.SvnCache(str(tmpdir), maxSize=250)
+
+    # the indexes next to the entries are neither counted nor evicted
+    os.makedirs(os.path.join(str(tmpdir), "revdates"))
+    index = os.path.join(str(tmpdir), "revdates", "index")
+    with open(index, "wb") as f:
+        f.write(b"x" * 1000)
+
+    scans = []
+    scanEntries = c._scanEntries
+    monkeypatch.setattr(c, "_scanEntries", lambda: scans.append(1) or scanEntries())
+
+    c.put(cache.SvnCache.key(0), b"x" * 100)
+    c.put(cache.SvnCache.key(1), b"x" * 100)
+    assert len(scans) == 1
+    assert c.get(cache.SvnCache.key(0)) is not None
+    assert c.get(cache.SvnCache.key(1)) is not None
+
+    # only a put beyond the budget counts the entries again
+    c.put(cache.SvnCache.key(2), b"x" * 100)
+    assert len(scans) == 2
+    assert os.path.isfile(index)
+
+
+def test_disabledCache():
+    c = cache.SvnCache(None)
+    c.put(cache.SvnCache.key('a'), b"data")
+    assert c.get(cache.SvnCache.key('a')) is None
@@ -0,0 +1,25 @@
+import os
+from git_svn import dateindex
+
+
+def test_normalizeSvnDate():
+    assert dateindex.NormalizeSvnDate("{2018-10-22T14:15:34.123456Z}") == "2018-10-22T14:15:34.123456Z"
+    assert dateindex.NormalizeSvnDate("{2018-10-22 14:15Z}") == "2018-10-22T14:15:00.000000Z"
+    assert dateindex.NormalizeSvnDate("{2018-10-22T16:15:34+02:00}") == "2018-10-22T14:15:34.000000Z"
+    assert dateindex.NormalizeSvnDate("{20181022T1415Z}") == "2018-10-22T14:15:00.000000Z"
+    assert dateindex.NormalizeSvnDate("{yesterday}") is None
+
+
+def test_dateIndexBisection(tmpdir):
+    path = os.path.join(str(tmpdir), 'index')
+    with open(path, 'wt') as f:
+        f.write("0 2018-01-01T00:00:00.000000Z\n")
+        f.write("1 2018-01-02T10:00:00.000000Z\n")
+        f.write("2 2018-01-02T12:00:00.000000Z\n")
+        f.write("3 2018-01-05T08:00:00.000000Z\n")
+
+    index = dateindex.SvnDateIndex("http://foobar/svn", path)
+    assert index.DateOfRev(2) == "2018-01-02T12:00:00.000000Z"
+    assert index.RevAtDate("2018-01-02T12:00:00.000000Z") == 2
+    assert index.RevAtDate("2018-01-04T00:00:00.000000Z") == 2
+    assert index.RevAtDate("2017-12-31T00:00:00.000000Z") is None
@@ -0,0 +1,318 @@
+import os
+import subprocess
+import threading
+import time
+import pytest
+from git_svn import svn
+from git_svn import externals
+
+
+def _external(path):
+    return svn.SvnExternal("http://foobar/svn", "./", None, "^/lib", None, path)
+
+
+@pytest.fixture(autouse=True)
+def noSvnInfo(monkeypatch):
+    monkeypatch.setattr(svn, "GetSvnInfoForTargets", lambda targets, rev=None: {t: None for t in targets})
+    monkeypatch.setattr(svn, "GetSvnInfoForExternals", lambda externals: {e: None for e in externals})
+
+
+def test_nestedExternalsWaitForParent(monkeypatch):
+    log = []
+    lock = threading.Lock()
+
+    def fakeCheckout(svnExternal, discard_local_changes=False, **kw):
+        with lock:
+            log.append(("start", svnExternal.path))
+        time.sleep(0.05)
+        with lock:
+            log.append(("end", svnExternal.path))
+
+    monkeypatch.setattr(svn, "checkoutSvnExternal", fakeCheckout)
+
+    pool = externals.SvnExternalsCheckout(jobs=4)
+    pool.submit([_external("a/b"), _external("a"), _external("c")])
+    results = pool.wait()
+
+    assert [r.svnExternal.path for r in results] == ["a/b", "a", "c"]
+    assert all(r.succeeded for r in results)
+    assert log.index(("end", "a")) < log.index(("start", "a/b"))
+
+
+def test_failedParentFailsNestedExternals(monkeypatch):
+    attempted = []
+
+    def fakeCheckout(svnExternal, discard_local_changes=False, **kw):
+        attempted.append(svnExternal.path)
+        if svnExternal.path == "a":
+            raise Exception("svn failure")
+
+    monkeypatch.setattr(svn, "checkoutSvnExternal", fakeCheckout)
+
+    pool = externals.SvnExternalsCheckout(jobs=2)
+    pool.submit([_external("a"), _external("a/b"), _external("c")])
+    results = pool.wait()
+
+    assert "a/b" not in attempted
+    assert [r.succeeded for r in results] == [False, False, True]
+    assert not externals.printCheckoutReport(results)
+
+
+def test_expectedParentIsWaitedFor(monkeypatch):
+    attempted = []
+    monkeypatch.setattr(svn, "checkoutSvnExternal",
+                        lambda e, discard_local_changes=False, **kw: attempted.append(e.path))
+
+    pool = externals.SvnExternalsCheckout(jobs=2)
+    parent = _external("a")
+    pool.expect([parent])
+    pool.submit([_external("a/b")])
+    assert attempted == []
+
+    pool.submit([parent])
+    pool.wait()
+    assert attempted == ["a", "a/b"]
+
+
+def test_pathDefinedTwiceIsRejected(monkeypatch):
+    started = threading.Event()
+    release = threading.Event()
+
+    def fakeCheckout(svnExternal, discard_local_changes=False, **kw):
+        started.set()
+        release.wait(5)
+
+    monkeypatch.setattr(svn, "checkoutSvnExternal", fakeCheckout)
+
+    pool = externals.SvnExternalsCheckout(jobs=2)
+    pool.submit([_external("a")])
+    started.wait(5)
+
+    # rejected while the first definition is still running, without declaring any of them
+    with pytest.raises(Exception):
+        pool.submit([_external("b"), _external("a")])
+    with pytest.raises(Exception):
+        pool.submit([_external("c"), _external("c")])
+
+    release.set()
+    results = pool.wait()
+    assert [r.svnExternal.path for r in results] == ["a"]
+
+    pool = externals.SvnExternalsCheckout(jobs=2)
+    pool.expect([_external("a")])
+    with pytest.raises(Exception):
+        pool.expect([_external("a")])
+
+
+def test_workersRunWhileResolving(monkeypatch):
+    started = threading.Event()
+    startedWhileResolving = []
+
+    def fakeCheckout(svnExternal, discard_local_changes=False, **kw):
+        started.set()
+
+    def slowSvnInfo(svnExternals):
+        if any(e.path == "b" for e in svnExternals):
+            # the checkout of "a" must not be blocked by the resolution of "b"
+            startedWhileResolving.append(started.wait(5))
+        return {e: None for e in svnExternals}
+
+    monkeypatch.setattr(svn, "checkoutSvnExternal", fakeCheckout)
+    monkeypatch.setattr(svn, "GetSvnInfoForExternals", slowSvnInfo)
+
+    pool = externals.SvnExternalsCheckout(jobs=2)
+    # block the submitting thread while "a" is queued, but not yet running
+    with pool._cv:
+        pool.submit([_external("a")])
+    pool.submit([_external("b")])
+    results = pool.wait()
+
+    assert startedWhileResolving == [True]
+    assert all(r.succeeded for r in results)
+
+
+def test_failedResolutionFinishesExternals(monkeypatch):
+    def failingSvnInfo(svnExternals):
+        raise Exception("svn failure")
+
+    monkeypatch.setattr(svn, "GetSvnInfoForExternals", failingSvnInfo)
+
+    pool = externals.SvnExternalsCheckout(jobs=2)
+    with pytest.raises(Exception):
+        pool.submit([_external("a")])
+    assert [r.succeeded for r in pool.wait()] == [False]
+
+
+def test_deriveExternalsOncePerUrl():
+    derived = []
+
+    def derive(e):
+        derived.append(e.path)
+        return svn.SvnExternal(e.hostRepoUrl, e.svnWCFolderPath, "42", e.url, "42", e.path)
+
+    results = list(externals.DeriveExternals([_external("a"), _external("b")], derive, jobsPerServer=2))
+
+    assert len(derived) == 1
+    assert sorted(d.path for (e, d, error) in results) == ["a", "b"]
+    assert all(d.pegRev == "42" and error is None for (e, d, error) in results)
+
+
+def test_unsupportedUrlOnlyFailsItsExternal():
+    relative = svn.SvnExternal("http://foobar/svn", "./", None, "../lib", None, "rel")
+    results = list(externals.DeriveExternals([relative, _external("a")], lambda e: e))
+
+    assert [(e.path, d is None, type(error)) for (e, d, error) in results] == \
+        [("rel", True, NotImplementedError), ("a", False, type(None))]
+
+
+def test_failedDerivationIsReported(monkeypatch):
+    attempted = []
+    monkeypatch.setattr(svn, "checkoutSvnExternal",
+                        lambda e, discard_local_changes=False, **kw: attempted.append(e.path))
+
+    def derive(e):
+        if e.path == "a":
+            raise Exception("no such revision")
+        return e
+
+    parent = _external("a")
+    nested = svn.SvnExternal("http://foobar/svn", "./", None, "^/other", None, "a/b")
+    other = svn.SvnExternal("http://foobar/svn", "./", None, "^/third", None, "c")
+
+    assert not externals.CheckoutDerivedExternals([parent, nested, other], derive, jobs=2)
+    assert attempted == ["c"]
+
+
+def test_cleanUpdatesAreBatched(tmpdir, monkeypatch):
+    monkeypatch.chdir(str(tmpdir))
+    svnExternals = [svn.SvnExternal("http://foobar/svn", "./", None, "^/lib" + p, "12", p) for p in ("a", "b", "c")]
+    svnExternals.append(svn.SvnExternal("http://foobar/svn", "./", None, "^/libd", "13", "d"))
+    for e in svnExternals:
+        tmpdir.mkdir(e.path)
+
+    monkeypatch.setattr(svn, "GetSvnInfoForTargets", lambda targets, rev=None: {
+        e.WCPath: svn.SvnInfo('dir', e.QualifiedUrl, 12, 12, "http://foobar/svn") for e in svnExternals})
+    monkeypatch.setattr(svn, "GetSvnWcDirtyMap", lambda paths: {p: p == svnExternals[2].WCPath for p in paths})
+
+    batches = []
+    attempted = []
+    monkeypatch.setattr(svn, "UpdateSvnWcs", lambda paths, rev=None: batches.append((sorted(paths), rev)))
+    monkeypatch.setattr(svn, "checkoutSvnExternal",
+                        lambda e, discard_local_changes=False, **kw: attempted.append(e.path))
+
+    pool = externals.SvnExternalsCheckout(jobs=2)
+    pool.submit(svnExternals)
+    results = pool.wait()
+
+    assert all(r.succeeded for r in results)
+    # c is dirty and d is the only external at r13
+    assert batches == [(sorted([svnExternals[0].WCPath, svnExternals[1].WCPath]), "12")]
+    assert sorted(attempted) == ["c", "d"]
+
+
+def test_failedBatchFallsBackToSingleUpdates(tmpdir, monkeypatch):
+    monkeypatch.chdir(str(tmpdir))
+    svnExternals = [svn.SvnExternal("http://foobar/svn", "./", None, "^/lib" + p, "12", p) for p in ("a", "b")]
+    for e in svnExternals:
+        tmpdir.mkdir(e.path)
+
+    monkeypatch.setattr(svn, "GetSvnInfoForTargets", lambda targets, rev=None: {
+        e.WCPath: svn.SvnInfo('dir', e.QualifiedUrl, 12, 12, "http://foobar/svn") for e in svnExternals})
+    monkeypatch.setattr(svn, "GetSvnWcDirtyMap", lambda paths: {p: False for p in paths})
+
+    def failingUpdate(paths, rev=None):
+        raise Exception("svn failure")
+
+    attempted = []
+    monkeypatch.setattr(svn, "UpdateSvnWcs", failingUpdate)
+    monkeypatch.setattr(svn, "checkoutSvnExternal",
+                        lambda e, discard_local_changes=False, **kw: attempted.append((e.path, kw.get('isDirty'))))
+
+    pool = externals.SvnExternalsCheckout(jobs=2)
+    pool.submit(svnExternals)
+    results = pool.wait()
+
+    assert all(r.succeeded for r in results)
+    assert sorted(attempted) == [("a", False), ("b", False)]
+
+
+def test_checkoutSvnExternalsWithSvn(monkeypatch):
+    calls = []
+
+    def fakeCheckCall(cmd, **kw):
+        calls.append(cmd)
+        if cmd[1] == 'update' and failUpdate:
+            raise subprocess.CalledProcessError(1, cmd)
+
+    proplist = b"""<?xml version="1.0" encoding="UTF-8"?>
+<properties><target path="."><property name="svn:ignore">*.o</property>
+<property name="svn:externals">^/lib lib
+</property></target></properties>"""
+    monkeypatch.setattr(svn.subprocess, "check_output", lambda cmd, **kw: calls.append(cmd) or proplist)
+    monkeypatch.setattr(svn.subprocess, "check_call", fakeCheckCall)
+
+    svnExternals = [svn.SvnExternal("http://foobar/svn", "./", "10", "^/lib", "12", "lib"),
+                    svn.SvnExternal("http://foobar/svn", "./", None, "//other/svn/doc", None, "my doc"),
+                    svn.SvnExternal("http://foobar/svn", "sub", None, "^/tools", "3", "bin")]
+    failUpdate = False
+    svn.CheckoutSvnExternalsWithSvn(svnExternals, "/wc")
+
+    # svn only handles externals on an update of infinite depth, the previous properties are restored
+    assert calls == [
+        ['svn', 'proplist', '--xml', '-v', '--depth', 'empty', './', 'sub'],
+        ['svn', 'propset', '-q', 'svn:externals',
+         "-r 10 http://foobar/svn/lib@12 lib\nhttp://other/svn/doc 'my doc'\n", './'],
+        ['svn', 'propset', '-q', 'svn:externals', "http://foobar/svn/tools@3 bin\n", 'sub'],
+        ['svn', 'update', '-q', '-r', 'BASE', '/wc'],
+        ['svn', 'propset', '-q', 'svn:externals', "^/lib lib\n", './'],
+        ['svn', 'propdel', '-q', 'svn:externals', 'sub']]
+
+    # also when the update fails
+    del calls[:]
+    failUpdate = True
+    with pytest.raises(subprocess.CalledProcessError):
+        svn.CheckoutSvnExternalsWithSvn(svnExternals, "/wc")
+    assert calls[-2:] == [['svn', 'propset', '-q', 'svn:externals', "^/lib lib\n", './'],
+                          ['svn', 'propdel', '-q', 'svn:externals', 'sub']]
+
+
+@pytest.mark.parametrize("option", [["--export"], ["--full-sync"], ["-j", "4"]])
+def test_svnExternalsStrategyRejectsWrapperOptions(monkeypatch, option):
+    from git_svn import checkoutSvnExternals
+
+    monkeypatch.setattr("sys.excepthook", None)
+    monkeypatch.setattr("sys.argv", ["checkoutSvnExternals", "--strategy", "svn-externals"] + option)
+    monkeypatch.setattr(svn.subprocess, "check_call", lambda cmd, **kw: pytest.fail("no svn expected"))
+    with pytest.raises(Exception, match="not supported by the svn-externals strategy"):
+        checkoutSvnExternals.main()
+
+
+def test_exportPinnedExternal(tmpdir, monkeypatch):
+    monkeypatch.chdir(str(tmpdir))
+    exports = []
+
+    def fakeExport(cmd, **kw):
+        assert cmd[:2] == ['svn', 'export']
+        exports.append(cmd[-2])
+        os.makedirs(cmd[-1])
+        return b""
+
+    monkeypatch.setattr(svn.subprocess, "check_output", fakeExport)
+    info = svn.SvnInfo('dir', "http://foobar/svn/lib", 12, 12, "http://foobar/svn")
+
+    external = svn.SvnExternal("http://foobar/svn", "./", None, "^/lib", "12", "lib")
+    assert svn.exportSvnExternal(external, svnInfo=info)
+    assert svn.exportSvnExternal(external, svnInfo=info)
+    assert exports == ["http://foobar/svn/lib@12"]
+    with open(os.path.join("lib", svn.EXPORT_MARKER)) as f:
+        assert f.read() == "http://foobar/svn/lib@12\n"
+
+    # a new peg revision replaces the export
+    monkeypatch.setattr(svn.trash, "MoveToTrash", svn.trash.RemoveTree)
+    external = svn.SvnExternal("http://foobar/svn", "./", None, "^/lib", "13", "lib")
+    assert svn.exportSvnExternal(external, svnInfo=info)
+    assert exports == ["http://foobar/svn/lib@12", "http://foobar/svn/lib@13"]
+
+    # unpinned externals need a checkout
+    external = svn.SvnExternal("http://foobar/svn", "./", None, "^/doc", None, "doc")
+    assert not svn.exportSvnExternal(external, svnInfo=info)
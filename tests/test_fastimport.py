@@ -0,0 +1,104 @@
+import io
+import os
+import subprocess
+import pytest
+from git_svn import fastimport
+from git_svn import revmap
+from git_svn import unhandledlog
+from tests.test_svndump import HEADER, node, props, revision, svndiff
+
+URL = "http://foobar/svn/trunk"
+UUID = "0b6ae5a0-5b4b-4c3a-9f38-1e1c4b5fd2a1"
+REF = "refs/remotes/git-svn/trunk"
+
+
+@pytest.fixture
+def gitRepo(tmp_path, monkeypatch):
+    for var in ("GIT_AUTHOR_NAME", "GIT_COMMITTER_NAME"):
+        monkeypatch.setenv(var, "test")
+    for var in ("GIT_AUTHOR_EMAIL", "GIT_COMMITTER_EMAIL"):
+        monkeypatch.setenv(var, "test@example.com")
+    subprocess.check_call(["git", "init", "-q", str(tmp_path)])
+    monkeypatch.chdir(str(tmp_path))
+    return os.path.join(str(tmp_path), ".git")
+
+
+def git(*args):
+    return subprocess.check_output(("git",) + args).decode()
+
+
+def test_importDump(gitRepo):
+    # 'hello\n' -> 'hello world\n'
+    delta = svndiff(6, bytes([0x05, 0x00, 0x87]), b' world\n', 12)
+    dump = (HEADER
+            + revision(1, svn_author="jdoe", svn_date="2018-10-22T14:15:34.123456Z", svn_log="initial import\n")
+            + node("trunk", "dir", "add", props(svn_externals="^/lib lib"))
+            + node("trunk/a.txt", "file", "add", props(), b"hello\n")
+            + node("trunk/run.sh", "file", "add", props(svn_executable="*"), b"#!/bin/sh\n")
+            + node("trunk/link", "file", "add", props(svn_special="*"), b"link a.txt")
+            + node("trunk/sub", "dir", "add")
+            + node("trunk/sub/c.txt", "file", "add", None, b"c\n")
+            + revision(2, svn_author="jdoe", svn_date="2018-10-23T08:00:00.000000Z", svn_log="change")
+            + node("trunk/a.txt", "file", "change", None, delta, "Text-delta: true\n")
+            + node("trunk/b.txt", "file", "add", None, None, "Node-copyfrom-rev: 1\nNode-copyfrom-path: trunk/a.txt\n")
+            + node("trunk/sub2", "dir", "add", None, None, "Node-copyfrom-rev: 1\nNode-copyfrom-path: trunk/sub\n")
+            + node("trunk/run.sh", None, "delete")
+            + node("trunk", "dir", "change", b"D 13\nsvn:externals\nPROPS-END\n", None, "Prop-delta: true\n")
+            + revision(3, svn_author="jdoe", svn_date="2018-10-24T08:00:00.000000Z", svn_log="other branch")
+            + node("branches/x", "dir", "add"))
+
+    importer = fastimport.ImportDump(gitRepo, io.BytesIO(dump), URL, "trunk", REF)
+
+    assert importer.revs == [1, 2]
+    assert git("log", "--format=%an <%ae>%n%B", "-1", REF + "~1").strip() == \
+        "jdoe <jdoe@{}>\ninitial import\n\ngit-svn-id: {}@1 {}".format(UUID, URL, UUID)
+    assert git("show", REF + ":a.txt") == "hello world\n"
+    assert git("show", REF + ":b.txt") == "hello\n"
+    assert git("show", REF + ":sub2/c.txt") == "c\n"
+    assert "120000 blob" in git("ls-tree", REF + "~1", "link")
+    assert "100755 blob" in git("ls-tree", REF + "~1", "run.sh")
+    assert git("ls-tree", "--name-only", REF) == "a.txt\nb.txt\nlink\nsub\nsub2\n"
+
+    with revmap.OpenRevMap(gitRepo, REF, UUID) as revMap:
+        assert revMap.FindSha(2) == git("rev-parse", REF).strip()
+        # the trailing r3 only touched another branch
+        assert revMap.MaxRev() == 3 and revMap.FindSha(3) is None
+
+    index = unhandledlog.ExternalsIndex(unhandledlog.GetUnhandledLogPath(gitRepo, REF))
+    assert index.ExternalsAt(1) == {".": "^/lib lib"}
+    assert index.ExternalsAt(2) == {}
+
+
+def test_incrementalImportDeletesEarlierDirProps(gitRepo):
+    dump = (HEADER
+            + revision(1, svn_log="initial import")
+            + node("trunk", "dir", "add", props(svn_externals="^/lib lib", svn_ignore="*.o"))
+            + node("trunk/sub", "dir", "add", props(svn_externals="^/tools bin")))
+    fastimport.ImportDump(gitRepo, io.BytesIO(dump), URL, "trunk", REF)
+    parentSha = git("rev-parse", REF).strip()
+
+    # the next fetch only sees the property deletions
+    dump = (HEADER
+            + revision(2, svn_log="drop the externals")
+            + node("trunk", "dir", "change", b"D 13\nsvn:externals\nPROPS-END\n", None, "Prop-delta: true\n")
+            + node("trunk/sub", "dir", "change", b"PROPS-END\n"))
+    fastimport.ImportDump(gitRepo, io.BytesIO(dump), URL, "trunk", REF, parentSha)
+
+    logPath = unhandledlog.GetUnhandledLogPath(gitRepo, REF)
+    assert unhandledlog.ReadDirProps(logPath) == {"": {"svn:ignore": "*.o"}, "sub": {}}
+    assert unhandledlog.ReadDirProps(logPath, 1)["sub"] == {"svn:externals": "^/tools bin"}
+    index = unhandledlog.ExternalsIndex(logPath)
+    assert index.ExternalsAt(1) == {".": "^/lib lib", "sub": "^/tools bin"}
+    assert index.ExternalsAt(2) == {}
+
+
+def test_failedDumpLeavesRefUntouched(gitRepo):
+    dump = (HEADER
+            + revision(1, svn_log="add")
+            + node("trunk/a.txt", "file", "add", None, None, "Node-copyfrom-rev: 1\nNode-copyfrom-path: tags/a.txt\n"))
+
+    with pytest.raises(Exception):
+        fastimport.ImportDump(gitRepo, io.BytesIO(dump), URL, "trunk", REF)
+
+    assert subprocess.call(["git", "rev-parse", "-q", "--verify", REF], stdout=subprocess.DEVNULL) != 0
+    assert not os.path.exists(revmap.GetRevMapPath(gitRepo, REF, UUID))
@@ -0,0 +1,93 @@
+import os
+import subprocess
+import pytest
+from git_svn import gitmeta
+from git_svn import git
+
+
+@pytest.fixture
+def gitRepo(tmp_path, monkeypatch):
+    for var in ("GIT_AUTHOR_NAME", "GIT_COMMITTER_NAME"):
+        monkeypatch.setenv(var, "test")
+    for var in ("GIT_AUTHOR_EMAIL", "GIT_COMMITTER_EMAIL"):
+        monkeypatch.setenv(var, "test@example.com")
+    repo = tmp_path / "repo"
+    subprocess.check_call(["git", "init", "-q", str(repo)])
+    monkeypatch.chdir(str(repo))
+    subprocess.check_call(["git", "commit", "-q", "--allow-empty", "-m", "initial"])
+    return str(repo)
+
+
+def gitOutput(*args, cwd=None):
+    return subprocess.check_output(("git",) + args, cwd=cwd).decode().strip()
+
+
+def test_config(gitRepo):
+    with open(os.path.join(".git", "config"), "at") as f:
+        f.write('[svn-remote "svn"]\n'
+                '\turl = http://foobar/svn ; comment\n'
+                '\tfetch = trunk:refs/remotes/git-svn/trunk\n'
+                '\tfetch = "branches/a b":refs/remotes/git-svn/a\\tb\n'
+                '[include]\n\tpath = extra.cfg\n'
+                '[includeIf "gitdir:repo/"]\n\tpath = matched.cfg\n'
+                '[includeIf "gitdir:other/"]\n\tpath = unmatched.cfg\n')
+    with open(os.path.join(".git", "extra.cfg"), "wt") as f:
+        f.write('[Foo.Bar] flag\n[foo "Bar"]\n  long = a \\\n  b\n')
+    with open(os.path.join(".git", "matched.cfg"), "wt") as f:
+        f.write('[x]\n\ty = matched\n')
+    with open(os.path.join(".git", "unmatched.cfg"), "wt") as f:
+        f.write('[x]\n\ty = unmatched\n')
+
+    for key in ("svn-remote.svn.url", "svn-remote.svn.fetch", "foo.bar.flag", "foo.Bar.long", "x.y"):
+        # the implicit value of 'flag' is an empty line
+        output = subprocess.check_output(["git", "config", "--get-all", key]).decode()
+        assert gitmeta.GetConfigValues(key) == output[:-1].split("\n")
+    assert gitmeta.GetConfigValues("svn-remote.other.url") == []
+
+    assert git.IsGitSvnRepo()
+    assert git.GetGitSvnUrl() == "http://foobar/svn"
+
+
+def test_refs(gitRepo):
+    sha = gitOutput("rev-parse", "HEAD")
+    subprocess.check_call(["git", "update-ref", "refs/remotes/git-svn/packed", "HEAD"])
+    subprocess.check_call(["git", "pack-refs", "--all"])
+    subprocess.check_call(["git", "update-ref", "refs/remotes/git-svn/loose", "HEAD"])
+
+    assert gitmeta.ResolveRef("refs/remotes/git-svn/packed") == sha
+    assert gitmeta.ResolveRef("refs/remotes/git-svn/loose") == sha
+    assert gitmeta.ResolveRef("refs/remotes/git-svn/missing") == ""
+    assert gitmeta.ResolveRef("HEAD") == sha
+    assert git.GetCurrentGitBranch() == gitOutput("rev-parse", "--abbrev-ref", "@")
+
+    # a tag with the same name as the branch makes the short name ambiguous
+    branch = git.GetCurrentGitBranch()
+    subprocess.check_call(["git", "tag", branch])
+    assert git.GetCurrentGitBranch() == gitOutput("rev-parse", "--abbrev-ref", "@")
+
+    subprocess.check_call(["git", "checkout", "-q", "--detach"])
+    assert gitmeta.GetHeadRef() == sha
+    assert git.GetCurrentGitBranch() == "HEAD"
+
+
+def test_worktree(gitRepo):
+    subprocess.check_call(["git", "worktree", "add", "-q", "-b", "wt", "../wt"])
+    subprocess.check_call(["git", "config", "svn-remote.svn.url", "http://foobar/svn"])
+    wt = os.path.join(os.path.dirname(gitRepo), "wt")
+
+    assert os.path.samefile(gitmeta.FindGitDir(wt), gitOutput("rev-parse", "--git-dir", cwd=wt))
+    assert gitmeta.GetHeadRef(wt) == "refs/heads/wt"
+    assert gitmeta.ResolveRef("HEAD", wt) == gitOutput("rev-parse", "HEAD")
+    assert gitmeta.GetConfigValues("svn-remote.svn.url", wt) == ["http://foobar/svn"]
+
+
+def test_fallback(gitRepo, monkeypatch):
+    monkeypatch.setenv("GIT_DIR", os.path.join(gitRepo, ".git"))
+    assert gitmeta.FindGitDir() is None
+    assert gitmeta.GetConfigValues("svn-remote.svn.url") is None
+    monkeypatch.delenv("GIT_DIR")
+
+    subprocess.check_call(["git", "config", "includeIf.hasconfig:remote.*.url:foo.path", "x.cfg"])
+    assert gitmeta.GetConfigValues("svn-remote.svn.url") is None
+    assert gitmeta.ResolveRef("HEAD") is None
+    assert not git.IsGitSvnRepo()
@@ -63,6 +63,22 @@ branches: foobar
         git.GitSvnDef.parseConfig(config)
     
 
+def test_canonicalizeSvnUrl():
+    assert canonicalize_svn_url("HTTP://FooBar/svn/") == "http://foobar/svn"
+    assert canonicalize_svn_url("http://foobar//svn/./My Repo%41/100%") == "http://foobar/svn/My%20Repo%41/100%25"
+    assert canonicalize_svn_url("file:///srv/svn/repo/") == "file:///srv/svn/repo"
+
+
+def test_gitSvnInitStoresCanonicalUrl():
+    tx = gittransaction.Transaction(gittransaction.ConfigSnapshot("config", "", []), {})
+    git_svn_init(tx, "http://foobar/svn/")
+    assert tx.get("svn-remote.svn.url") == "http://foobar/svn"
+
+    # idempotent, whatever the spelling of the url
+    git_svn_init(tx, "http://foobar/svn")
+    with pytest.raises(Exception):
+        git_svn_init(tx, "http://foobar/other")
+
 
 # def test_cli(tmpdir):
 #     os.chdir(tmpdir)
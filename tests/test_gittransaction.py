@@ -0,0 +1,98 @@
+import os
+import subprocess
+import pytest
+from git_svn import gittransaction
+
+
+@pytest.fixture
+def gitRepo(tmp_path, monkeypatch):
+    for var in ("GIT_AUTHOR_NAME", "GIT_COMMITTER_NAME"):
+        monkeypatch.setenv(var, "test")
+    for var in ("GIT_AUTHOR_EMAIL", "GIT_COMMITTER_EMAIL"):
+        monkeypatch.setenv(var, "test@example.com")
+    repo = tmp_path / "repo"
+    subprocess.check_call(["git", "init", "-q", str(repo)])
+    monkeypatch.chdir(str(repo))
+    subprocess.check_call(["git", "commit", "-q", "--allow-empty", "-m", "initial"])
+    subprocess.check_call(["git", "commit", "-q", "--allow-empty", "-m", "second"])
+    return str(repo)
+
+
+def gitOutput(*args):
+    return subprocess.check_output(("git",) + args).decode().strip()
+
+
+def getAll(key):
+    try:
+        return gitOutput("config", "--local", "--get-all", key).split("\n")
+    except subprocess.CalledProcessError:
+        return []
+
+
+def test_transaction(gitRepo, capsys):
+    head = gitOutput("rev-parse", "HEAD")
+    parent = gitOutput("rev-parse", "HEAD~1")
+    subprocess.check_call(["git", "update-ref", "refs/remotes/git-svn/a", parent])
+    with open(os.path.join(".git", "config"), "at") as f:
+        f.write('[svn-remote "svn"]\n'
+                '\turl = http://foobar/svn\n'
+                '\tfetch = trunk:refs/remotes/git-svn/trunk\n'
+                '\tignore-paths = old \\\n'
+                'value\n'
+                '[other]\n\tkey = kept\n')
+
+    tx = gittransaction.Transaction(gittransaction.ReadConfigSnapshot(),
+                                    gittransaction.ReadRefs(["refs/remotes/git-svn"]))
+    assert tx.get("svn-remote.svn.ignore-paths") == "old value"
+    assert tx.resolveRef("refs/remotes/git-svn/a") == parent
+    assert tx.resolveRef("refs/remotes/git-svn/b") == ""
+
+    tx.addConfig("svn-remote.svn.fetch", "branches/a:refs/remotes/git-svn/a")
+    tx.setConfig("svn-remote.svn.ignore-paths", "(x/|y #z)")
+    tx.setConfig("svn-remote.svn.url", "http://foobar/svn")
+    tx.setConfig("new.section.key", "value")
+    tx.updateRef("refs/remotes/git-svn/a", head)
+    tx.updateRef("refs/remotes/git-svn/b", head)
+    assert tx.values("svn-remote.svn.fetch") == ["trunk:refs/remotes/git-svn/trunk",
+                                                 "branches/a:refs/remotes/git-svn/a"]
+
+    # a dry run only prints the transaction
+    tx.commit(dry_run=True)
+    assert capsys.readouterr().out.splitlines()[1:] == [
+        "  add svn-remote.svn.fetch branches/a:refs/remotes/git-svn/a",
+        "  unset-all svn-remote.svn.ignore-paths",
+        "  add svn-remote.svn.ignore-paths (x/|y #z)",
+        "  add new.section.key value",
+        "git update-ref --stdin transaction:",
+        "  update refs/remotes/git-svn/a {} {}".format(head, parent),
+        "  create refs/remotes/git-svn/b {}".format(head)]
+    assert getAll("svn-remote.svn.ignore-paths") == ["old value"]
+    assert gitOutput("rev-parse", "refs/remotes/git-svn/a") == parent
+
+    tx.commit()
+    assert getAll("svn-remote.svn.url") == ["http://foobar/svn"]
+    assert getAll("svn-remote.svn.fetch") == ["trunk:refs/remotes/git-svn/trunk",
+                                              "branches/a:refs/remotes/git-svn/a"]
+    assert getAll("svn-remote.svn.ignore-paths") == ["(x/|y #z)"]
+    assert getAll("new.section.key") == ["value"]
+    assert getAll("other.key") == ["kept"]
+    assert gitOutput("rev-parse", "refs/remotes/git-svn/a") == head
+    assert gitOutput("rev-parse", "refs/remotes/git-svn/b") == head
+    assert not os.path.exists(os.path.join(".git", "config.lock"))
+
+
+def test_concurrentChange(gitRepo):
+    head = gitOutput("rev-parse", "HEAD")
+    tx = gittransaction.Transaction(gittransaction.ReadConfigSnapshot(), gittransaction.ReadRefs([]))
+    tx.setConfig("svn-remote.svn.url", "http://foobar/svn")
+    tx.updateRef("refs/remotes/git-svn/trunk", head)
+
+    subprocess.check_call(["git", "config", "other.key", "value"])
+    with pytest.raises(Exception):
+        tx.commit()
+
+    # neither the config nor the refs are changed
+    assert getAll("svn-remote.svn.url") == []
+    assert getAll("other.key") == ["value"]
+    assert gitOutput("for-each-ref", "refs/remotes/git-svn") == ""
+    assert not os.path.exists(os.path.join(".git", "config.lock"))
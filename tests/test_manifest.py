@@ -0,0 +1,100 @@
+import os
+import pytest
+from git_svn import svn
+from git_svn import externals
+from git_svn import manifest
+from git_svn import wcdb
+
+
+def _external(path, rev="100"):
+    return svn.SvnExternal("http://foobar/svn", "./", None, "^/lib", rev, path)
+
+
+@pytest.fixture(autouse=True)
+def noSvnInfo(monkeypatch):
+    monkeypatch.setattr(svn, "GetSvnInfoForTargets", lambda targets, rev=None: {t: None for t in targets})
+    monkeypatch.setattr(svn, "GetSvnInfoForExternals", lambda externals: {e: None for e in externals})
+
+
+def _checkout(root):
+    def fakeCheckout(svnExternal, discard_local_changes=False, **kw):
+        wcdb = os.path.join(str(root), svnExternal.WCPath, ".svn", "wc.db")
+        os.makedirs(os.path.dirname(wcdb), exist_ok=True)
+        with open(wcdb, "ab") as f:
+            f.write(b"x")
+    return fakeCheckout
+
+
+def _sync(syncManifest, svnExternals):
+    pool = externals.SvnExternalsCheckout(2, manifest=syncManifest)
+    pool.submit(svnExternals)
+    results = pool.wait()
+    syncManifest.update(results)
+    syncManifest.save()
+    return results
+
+
+def test_unchangedExternalsAreSkipped(tmp_path, monkeypatch):
+    monkeypatch.chdir(str(tmp_path))
+    monkeypatch.setattr(svn, "checkoutSvnExternal", _checkout(tmp_path))
+
+    path = str(tmp_path / "manifest.json")
+    results = _sync(manifest.ExternalsManifest(path), [_external("a"), _external("b", None)])
+    assert [r.skipped for r in results] == [False, False]
+
+    # a pinned external is skipped, an unpinned external always needs an update
+    results = _sync(manifest.ExternalsManifest(path), [_external("a"), _external("b", None)])
+    assert [r.skipped for r in results] == [True, False]
+
+    # a changed definition or working copy is checked out again
+    results = _sync(manifest.ExternalsManifest(path), [_external("a", "101")])
+    assert [r.skipped for r in results] == [False]
+    with open(os.path.join("a", ".svn", "wc.db"), "ab") as f:
+        f.write(b"modified")
+    results = _sync(manifest.ExternalsManifest(path), [_external("a", "101")])
+    assert [r.skipped for r in results] == [False]
+    assert list(manifest.ExternalsManifest(path).entries) == [os.path.normcase(os.path.abspath("a"))]
+
+
+def test_modifiedExternalsAreRevertedWhenDiscardingLocalChanges(tmp_path, monkeypatch):
+    monkeypatch.chdir(str(tmp_path))
+    syncManifest = manifest.ExternalsManifest(None)
+    monkeypatch.setattr(syncManifest, "isUnchanged", lambda e: True)
+    monkeypatch.setattr(svn, "checkoutSvnExternal", _checkout(tmp_path))
+    dirty = {"a": True, "b": False, "c": None}
+    monkeypatch.setattr(wcdb, "IsDirty", lambda path: dirty[os.path.basename(path)])
+
+    pool = externals.SvnExternalsCheckout(2, discard_local_changes=True, manifest=syncManifest)
+    pool.submit([_external("a"), _external("b"), _external("c")])
+    assert [r.skipped for r in pool.wait()] == [False, True, False]
+
+
+def test_nestedExternalOfUpdatedParentIsNotSkipped(tmp_path, monkeypatch):
+    monkeypatch.chdir(str(tmp_path))
+    syncManifest = manifest.ExternalsManifest(None)
+    monkeypatch.setattr(syncManifest, "isUnchanged", lambda e: e.path == "a/b")
+    monkeypatch.setattr(svn, "checkoutSvnExternal", _checkout(tmp_path))
+
+    results = _sync(syncManifest, [_external("a"), _external("a/b")])
+    assert [r.skipped for r in results] == [False, False]
+
+
+def test_checkoutSvnExternalsRecordsManifest(tmp_path, monkeypatch):
+    from git_svn import checkoutSvnExternals
+    from git_svn import cache
+
+    monkeypatch.chdir(str(tmp_path))
+    os.makedirs(os.path.join(".svn"))
+    monkeypatch.setattr(cache, "GetAdminDir", lambda: os.path.join(str(tmp_path), ".svn"))
+    monkeypatch.setattr(checkoutSvnExternals, "IsGitSvnRepo", lambda: False)
+    monkeypatch.setattr(checkoutSvnExternals, "IsSvnWc", lambda: True)
+    monkeypatch.setattr(checkoutSvnExternals, "IterSvnExternalsFromLocalSvnWc", lambda: iter([_external("a")]))
+    monkeypatch.setattr(svn, "checkoutSvnExternal", _checkout(tmp_path))
+    monkeypatch.setattr("sys.argv", ["checkoutSvnExternals", "--svnExternalsConfigFile", "missing.yml"])
+
+    with pytest.raises(SystemExit) as e:
+        checkoutSvnExternals.main()
+    assert e.value.code == 0
+
+    recorded = manifest.ExternalsManifest.default()
+    assert list(recorded.entries) == [os.path.normcase(os.path.abspath("a"))]
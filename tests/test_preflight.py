@@ -0,0 +1,57 @@
+import os
+import subprocess
+import pytest
+from git_svn import preflight
+
+
+@pytest.fixture
+def gitRepo(tmp_path, monkeypatch):
+    for var in ("GIT_AUTHOR_NAME", "GIT_COMMITTER_NAME"):
+        monkeypatch.setenv(var, "test")
+    for var in ("GIT_AUTHOR_EMAIL", "GIT_COMMITTER_EMAIL"):
+        monkeypatch.setenv(var, "test@example.com")
+    repo = tmp_path / "repo"
+    subprocess.check_call(["git", "init", "-q", str(repo)])
+    monkeypatch.chdir(str(repo))
+    with open("file.txt", "wt") as f:
+        f.write("content\n")
+    subprocess.check_call(["git", "add", "file.txt"])
+    subprocess.check_call(["git", "commit", "-q", "-m", "initial"])
+    return str(repo)
+
+
+def test_gitChecks(gitRepo):
+    checks = preflight.RunPreflight(checkSvn=False)
+    assert checks.isGitWc is True
+    assert checks.isGitWcDirty is False
+    assert checks.isGitSvnRepo is False
+    assert checks.isSvnWc is None
+
+    # untracked files don't make the working copy dirty
+    with open("untracked.txt", "wt") as f:
+        f.write("new\n")
+    assert preflight.RunPreflight(checkSvn=False).isGitWcDirty is False
+
+    with open("file.txt", "at") as f:
+        f.write("modified\n")
+    subprocess.check_call(["git", "config", "svn-remote.svn.url", "http://foobar/svn"])
+    checks = preflight.RunPreflight(checkSvn=False)
+    assert checks.isGitWcDirty is True
+    assert checks.isGitSvnRepo is True
+
+    # the probe only
+    checks = preflight.RunPreflight(checkSvn=False, gitDirty=False)
+    assert checks.isGitWc is True
+    assert checks.isGitWcDirty is None
+
+    os.chdir(os.path.join(gitRepo, ".git"))
+    assert preflight.RunPreflight(checkSvn=False, gitDirty=False).isGitWc is False
+
+
+def test_noGitWc(tmp_path, monkeypatch):
+    monkeypatch.chdir(str(tmp_path))
+    monkeypatch.setenv("GIT_CEILING_DIRECTORIES", str(tmp_path.parent))
+    checks = preflight.RunPreflight(checkSvn=False)
+    assert checks.isGitWc is False
+    assert checks.isGitWcDirty is None
+    assert checks.isGitSvnRepo is None
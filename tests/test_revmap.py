@@ -0,0 +1,106 @@
+import os
+import struct
+import binascii
+from git_svn import revmap
+
+UUID = "cfd94225-6148-4c34-bb2a-21ea3148c527"
+
+
+def writeRevMap(path, records):
+    with open(path, 'wb') as f:
+        for (rev, sha) in records:
+            f.write(struct.pack('>I', rev) + binascii.unhexlify(sha))
+
+
+def sha(i):
+    return "{:040x}".format(i)
+
+
+def test_revMapLookup(tmpdir):
+    path = os.path.join(str(tmpdir), '.rev_map.cfd94225-6148-4c34-bb2a-21ea3148c527')
+    writeRevMap(path, [(3, sha(3)), (5, sha(5)), (9, sha(9)), (12, "0" * 40)])
+
+    with revmap.RevMap(path) as m:
+        assert len(m) == 4
+        assert m.MaxRev() == 12
+
+        assert m.FindSha(5) == sha(5)
+        assert m.FindSha(7) is None
+        assert m.FindSha(12) is None
+
+        # nearest revision before/after (cf. git svn find-rev -B/-A)
+        assert m.FindSha(7, before=True) == sha(5)
+        assert m.FindSha(12, before=True) == sha(9)
+        assert m.FindSha(2, before=True) is None
+        assert m.FindSha(4, after=True) == sha(5)
+        assert m.FindSha(10, after=True) is None
+
+        assert m.FindRev(sha(9)) == 9
+        assert m.FindRev(sha(4)) is None
+
+
+def test_emptyRevMap(tmpdir):
+    path = os.path.join(str(tmpdir), '.rev_map.uuid')
+    writeRevMap(path, [])
+    with revmap.RevMap(path) as m:
+        assert m.MaxRev() is None
+        assert m.FindSha(1, before=True) is None
+
+
+def test_buildRevMaps(tmp_path, monkeypatch):
+    import subprocess
+    for var in ("GIT_AUTHOR_NAME", "GIT_COMMITTER_NAME"):
+        monkeypatch.setenv(var, "test")
+    for var in ("GIT_AUTHOR_EMAIL", "GIT_COMMITTER_EMAIL"):
+        monkeypatch.setenv(var, "test@example.com")
+    subprocess.check_call(["git", "init", "-q", str(tmp_path)])
+    monkeypatch.chdir(str(tmp_path))
+    gitDir = os.path.join(str(tmp_path), ".git")
+
+    def commit(message, ref):
+        subprocess.check_call(["git", "commit", "-q", "--allow-empty", "-m", message])
+        sha = subprocess.check_output(["git", "rev-parse", "HEAD"]).decode().strip()
+        subprocess.check_call(["git", "update-ref", ref, sha])
+        return sha
+
+    trunk = "refs/remotes/git-svn/trunk"
+    branch = "refs/remotes/git-svn/b1"
+    sha1 = commit("r1\n\ngit-svn-id: http://foobar/svn/trunk@1 " + UUID, trunk)
+    commit("local commit", trunk)
+    sha3 = commit("r3\n\ngit-svn-id: http://foobar/svn/trunk@3 " + UUID, trunk)
+    sha4 = commit("r4\n\ngit-svn-id: http://foobar/svn/branches/b1@4 " + UUID, branch)
+
+    branches = [(trunk, "http://foobar/svn/trunk"), (branch, "http://foobar/svn/branches/b1/"),
+                ("refs/remotes/git-svn/trunk", "http://foobar/svn/other")]
+    paths = revmap.BuildRevMaps(gitDir, branches[:2], jobs=2)
+    assert revmap.BuildRevMaps(gitDir, branches[2:]) == {trunk: None}
+
+    with revmap.OpenRevMap(gitDir, trunk, UUID) as revMap:
+        assert len(revMap) == 2
+        assert revMap.FindSha(1) == sha1
+        assert revMap.FindSha(3) == sha3
+    with revmap.RevMap(paths[branch]) as revMap:
+        # the trunk commits the branch is based on are not part of its rev_map
+        assert len(revMap) == 1
+        assert revMap.FindSha(4) == sha4
+
+    # unchanged rev_maps are left alone, including the marker of the last fetched revision
+    revmap.AppendRevMap(paths[trunk], [(5, None)])
+    assert revmap.BuildRevMap(gitDir, trunk, "http://foobar/svn/trunk") == paths[trunk]
+    assert os.path.getsize(paths[trunk]) == 3 * revmap.RECORD_SIZE
+
+    # the marker is kept when the rev_map is rewritten
+    with open(paths[trunk], 'r+b') as f:
+        f.truncate(revmap.RECORD_SIZE)
+    revmap.AppendRevMap(paths[trunk], [(5, None)])
+    assert revmap.BuildRevMap(gitDir, trunk, "http://foobar/svn/trunk") == paths[trunk]
+    with revmap.RevMap(paths[trunk]) as revMap:
+        assert len(revMap) == 3
+        assert revMap.FindSha(3) == sha3
+        assert revMap.MaxRev() == 5
+
+    # the git-svn-id urls are uri escaped
+    escaped = "refs/remotes/git-svn/b%20c"
+    sha6 = commit("r6\n\ngit-svn-id: http://foobar/svn/branches/b%20c@6 " + UUID, escaped)
+    with revmap.RevMap(revmap.BuildRevMap(gitDir, escaped, "http://foobar/svn/branches/b c")) as revMap:
+        assert revMap.FindSha(6) == sha6
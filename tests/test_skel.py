@@ -0,0 +1,18 @@
+import pytest
+from git_svn import skel
+
+
+def test_parseSkel():
+    assert skel.ParseSkel(b'(a 3 b c (d ()) 0 )') == [b'a', b'b c', [b'd', []], b'']
+    assert skel.ParseSkel(b'12 (not a list)') == b'(not a list)'
+
+    with pytest.raises(Exception):
+        skel.ParseSkel(b'(a 10 short)')
+    with pytest.raises(Exception):
+        skel.ParseSkel(b'(a b')
+
+
+def test_parsePropertySkel():
+    props = skel.ParsePropertySkel(b'(svn:externals 22 ^/lib@10 lib\n^/doc doc svn:executable 1 *)')
+    assert props == {'svn:externals': '^/lib@10 lib\n^/doc doc', 'svn:executable': '*'}
+    assert skel.ParsePropertySkel(b'()') == {}
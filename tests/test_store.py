@@ -0,0 +1,48 @@
+import os
+from git_svn import svn
+from git_svn import store
+
+
+def _external(rev):
+    return svn.SvnExternal("http://foobar/svn", "./", None, "^/lib", rev, "lib")
+
+
+def _fakeCheckout(monkeypatch, checkouts):
+    def checkOutput(cmd, **kw):
+        checkouts.append(cmd)
+        wc = cmd[-1]
+        os.makedirs(os.path.join(wc, '.svn'))
+        with open(os.path.join(wc, 'file.txt'), 'wt') as f:
+            f.write(cmd[-2] + "\n" * 100)
+        os.utime(os.path.join(wc, 'file.txt'), (1000000000, 1000000000))
+        return b''
+    monkeypatch.setattr(store.subprocess, "check_output", checkOutput)
+
+
+def test_materialize(tmp_path, monkeypatch):
+    checkouts = []
+    _fakeCheckout(monkeypatch, checkouts)
+    checkoutStore = store.CheckoutStore(str(tmp_path / "store"))
+
+    checkoutStore.Materialize(_external("100"), str(tmp_path / "wc1" / "lib"))
+    checkoutStore.Materialize(_external("100"), str(tmp_path / "wc2" / "lib"))
+
+    assert len(checkouts) == 1
+    copied = tmp_path / "wc2" / "lib" / "file.txt"
+    assert copied.read_text().startswith("http://foobar/svn/lib@100")
+    # unchanged timestamps keep the working copy unmodified for svn
+    assert os.stat(str(copied)).st_mtime == 1000000000
+
+
+def test_evictLeastRecentlyUsed(tmp_path, monkeypatch):
+    checkouts = []
+    _fakeCheckout(monkeypatch, checkouts)
+    # room for a single entry
+    checkoutStore = store.CheckoutStore(str(tmp_path / "store"), maxSize=150)
+
+    checkoutStore.Materialize(_external("100"), str(tmp_path / "wc1" / "lib"))
+    checkoutStore.Materialize(_external("101"), str(tmp_path / "wc2" / "lib"))
+    checkoutStore.Materialize(_external("101"), str(tmp_path / "wc3" / "lib"))
+    checkoutStore.Materialize(_external("100"), str(tmp_path / "wc4" / "lib"))
+
+    assert len(checkouts) == 3
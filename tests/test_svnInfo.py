@@ -0,0 +1,89 @@
+import io
+from git_svn import svn
+
+xmlStr = """<?xml version="1.0" encoding="UTF-8"?>
+<info>
+<entry kind="dir" path="lib" revision="120">
+<url>http://foobar/svn/trunk/lib%20a</url>
+<relative-url>^/trunk/lib%20a</relative-url>
+<repository>
+<root>http://foobar/svn</root>
+<uuid>cfd94225-6148-4c34-bb2a-21ea3148c527</uuid>
+</repository>
+<commit revision="118">
+<author>jdv</author>
+<date>2018-10-22T14:15:34.000000Z</date>
+</commit>
+</entry>
+<entry kind="file" path="a.txt" revision="120">
+<url>http://foobar/svn/trunk/a.txt</url>
+<repository>
+<root>http://foobar/svn</root>
+<uuid>cfd94225-6148-4c34-bb2a-21ea3148c527</uuid>
+</repository>
+<commit revision="7">
+</commit>
+</entry>
+</info>
+"""
+
+
+def test_parseSvnInfoXml():
+    targets = ["http://foobar/svn/trunk/lib a@120",
+               "http://foobar/svn/trunk/missing@120",
+               "http://foobar/svn/trunk/a.txt"]
+    infos = svn.ParseSvnInfoXml(xmlStr, targets)
+
+    assert infos[targets[1]] is None
+
+    lib = infos[targets[0]]
+    assert lib.nodeType == svn.SvnNodeType.DIR
+    assert lib.revision == 120
+    assert lib.lastChangedRev == 118
+    assert lib.reposRoot == "http://foobar/svn"
+
+    assert infos[targets[2]].nodeType == svn.SvnNodeType.FILE
+    assert infos[targets[2]].lastChangedRev == 7
+
+
+STATUS_XML = b"""<?xml version="1.0" encoding="UTF-8"?>
+<status>
+<target path="lib">
+<entry path="lib/a.c">
+<wc-status item="modified" props="none" revision="100"><commit revision="90"/></wc-status>
+</entry>
+</target>
+<target path="empty">
+</target>
+<target path="sdk">
+<entry path="sdk">
+<wc-status item="normal" props="none" revision="100" switched="true"><commit revision="90"/></wc-status>
+</entry>
+</target>
+<target path="tools">
+<entry path="tools">
+<wc-status item="normal" props="modified" revision="100"><commit revision="90"/></wc-status>
+</entry>
+</target>
+</status>
+"""
+
+
+def test_parseSvnStatusXml():
+    paths = ["./lib", "./empty", "./sdk", "./tools", "./missing"]
+    dirtyMap = svn.ParseSvnStatusXml(io.BytesIO(STATUS_XML), paths)
+    assert dirtyMap == {"./lib": True, "./empty": False, "./sdk": True, "./tools": True, "./missing": None}
+
+
+def test_streamOutputLines():
+    import subprocess
+    import sys
+    import pytest
+
+    script = "import sys; print('a'); print('b'); sys.stdout.flush(); sys.exit({})"
+    assert list(svn.StreamOutputLines([sys.executable, '-c', script.format(0)])) == ['a', 'b']
+
+    lines = svn.StreamOutputLines([sys.executable, '-c', script.format(3)])
+    assert next(lines) == 'a'
+    with pytest.raises(subprocess.CalledProcessError):
+        list(lines)
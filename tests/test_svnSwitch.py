@@ -0,0 +1,43 @@
+import subprocess
+from git_svn import svn
+
+
+def _external(url):
+    return svn.SvnExternal("http://foobar/svn", "./", None, url, "200", "sdk")
+
+
+def _fakeSvn(monkeypatch, fail=False):
+    calls = []
+
+    def checkOutput(cmd, cwd=None, **kw):
+        calls.append(cmd[:2])
+        if fail and cmd[1] == 'switch':
+            raise subprocess.CalledProcessError(1, cmd)
+        return b''
+
+    monkeypatch.setattr(svn.subprocess, "check_output", checkOutput)
+    monkeypatch.setattr(svn.wcdb, "GetReposRoot", lambda path: "http://foobar/svn")
+    return calls
+
+
+def test_switchWithinRepository(monkeypatch):
+    calls = _fakeSvn(monkeypatch)
+    monkeypatch.setattr(svn, "GetReposRootForUrl", lambda url: "http://foobar/svn")
+
+    assert svn.switchSvnExternal(_external("^/sdk/tags/2.0"), revert=True)
+    assert calls == [['svn', 'revert'], ['svn', 'switch']]
+
+
+def test_noSwitchAcrossRepositories(monkeypatch):
+    calls = _fakeSvn(monkeypatch)
+    monkeypatch.setattr(svn, "GetReposRootForUrl", lambda url: "http://other/svn")
+
+    assert not svn.switchSvnExternal(_external("http://other/svn/sdk/tags/2.0"))
+    assert calls == []
+
+
+def test_failedSwitch(monkeypatch):
+    _fakeSvn(monkeypatch, fail=True)
+    monkeypatch.setattr(svn, "GetReposRootForUrl", lambda url: "http://foobar/svn")
+
+    assert not svn.switchSvnExternal(_external("^/sdk/tags/2.0"))
@@ -0,0 +1,106 @@
+import io
+import zlib
+import pytest
+from git_svn import svndump
+
+
+def _varint(value):
+    out = [value & 0x7f]
+    value >>= 7
+    while value:
+        out.insert(0, 0x80 | (value & 0x7f))
+        value >>= 7
+    return bytes(out)
+
+
+def _section(data, compress):
+    if not compress:
+        return _varint(len(data)) + data
+    return _varint(len(data)) + zlib.compress(data)
+
+
+def svndiff(sviewLen, instructions, newData, tviewLen, version=0):
+    """a single window svndiff"""
+    if version == 1:
+        instructions = _section(instructions, True)
+        newData = _section(newData, False)
+    return (b'SVN' + bytes([version]) + _varint(0) + _varint(sviewLen) + _varint(tviewLen)
+            + _varint(len(instructions)) + _varint(len(newData)) + instructions + newData)
+
+
+def props(**values):
+    out = b''
+    for (key, value) in values.items():
+        key = key.replace('_', ':').encode()
+        value = value.encode()
+        out += b'K %d\n%s\nV %d\n%s\n' % (len(key), key, len(value), value)
+    return out + b'PROPS-END\n'
+
+
+def node(path, kind, action, prop=None, text=None, extra=""):
+    headers = "Node-path: {}\n".format(path)
+    if kind:
+        headers += "Node-kind: {}\n".format(kind)
+    headers += "Node-action: {}\n".format(action) + extra
+    content = b''
+    if prop is not None:
+        headers += "Prop-content-length: {}\n".format(len(prop))
+        content += prop
+    if text is not None:
+        headers += "Text-content-length: {}\n".format(len(text))
+        content += text
+    if prop is not None or text is not None:
+        headers += "Content-length: {}\n".format(len(content))
+    return headers.encode() + b'\n' + content + b'\n\n'
+
+
+def revision(number, **revProps):
+    p = props(**revProps)
+    return "Revision-number: {}\nProp-content-length: {}\nContent-length: {}\n\n".format(
+        number, len(p), len(p)).encode() + p + b'\n'
+
+
+HEADER = b'SVN-fs-dump-format-version: 3\n\nUUID: 0b6ae5a0-5b4b-4c3a-9f38-1e1c4b5fd2a1\n\n'
+
+
+def test_applySvnDiff():
+    source = b'hello world'
+    # copy 'hello', insert ' there', copy ' world'
+    ins = bytes([0x05, 0x00, 0x86, 0x06, 0x05])
+    delta = svndiff(len(source), ins, b' there', 17)
+    assert svndump.ApplySvnDiff(source, delta) == b'hello there world'
+
+    # overlapping target copy repeats the pattern
+    ins = bytes([0x82, 0x40 | 0x06, 0x00])
+    assert svndump.ApplySvnDiff(b'', svndiff(0, ins, b'ab', 8)) == b'abababab'
+
+    delta = svndiff(len(source), bytes([0x05, 0x00, 0x86, 0x06, 0x05]), b' there', 17, version=1)
+    assert svndump.ApplySvnDiff(source, delta) == b'hello there world'
+
+    with pytest.raises(Exception):
+        svndump.ApplySvnDiff(source, b'SVN\x02')
+
+
+def test_parseDump():
+    dump = (HEADER
+            + revision(1, svn_author="jdoe", svn_date="2018-10-22T14:15:34.123456Z", svn_log="add")
+            + node("trunk", "dir", "add", props(svn_externals="^/lib lib\n"))
+            + node("trunk/a.txt", "file", "add", props(), b"hello\n")
+            + revision(2, svn_log="delete")
+            + node("trunk/a.txt", None, "delete"))
+
+    parser = svndump.DumpParser(io.BytesIO(dump))
+    records = list(parser.records())
+
+    assert parser.formatVersion == 3
+    assert parser.uuid == "0b6ae5a0-5b4b-4c3a-9f38-1e1c4b5fd2a1"
+    assert [str(r) for r in records] == ["r1", "add dir trunk", "add file trunk/a.txt", "r2", "delete None trunk/a.txt"]
+    assert records[0].props["svn:author"] == "jdoe"
+    assert records[1].props == {"svn:externals": "^/lib lib\n"}
+    assert records[2].text == b"hello\n"
+    assert records[4].props is None and records[4].text is None
+
+
+def test_parsePropDelta():
+    data = b'K 3\nfoo\nV 3\nbar\nD 14\nsvn:executable\nPROPS-END\n'
+    assert svndump.ParseProps(data) == ({"foo": "bar"}, ["svn:executable"])
@@ -0,0 +1,28 @@
+import os
+import stat
+from git_svn import trash
+
+
+def test_moveToTrash(tmp_path):
+    stale = tmp_path / "wc" / "external"
+    (stale / "sub").mkdir(parents=True)
+    readOnly = stale / "sub" / "file.txt"
+    readOnly.write_text("content")
+    os.chmod(str(readOnly), stat.S_IREAD)
+    trashDir = str(tmp_path / "trash")
+
+    trash.MoveToTrash(str(stale), trashDir, background=False)
+    assert not stale.exists()
+    assert len(os.listdir(trashDir)) == 1
+
+    trash.DeleteTrash(trashDir)
+    assert [name for name in os.listdir(trashDir) if not name.startswith('.')] == []
+
+
+def test_removeWithoutTrash(tmp_path, monkeypatch):
+    monkeypatch.setattr(trash, "GetTrashDir", lambda: None)
+    stale = tmp_path / "external"
+    stale.mkdir()
+
+    trash.MoveToTrash(str(stale))
+    assert not stale.exists()
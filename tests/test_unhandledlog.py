@@ -0,0 +1,128 @@
+import os
+import subprocess
+import pytest
+from git_svn import cache
+from git_svn import git
+from git_svn import revmap
+from git_svn import unhandledlog
+
+LOG = """r10
+  +dir_prop: . svn:externals ^/lib%40100%20lib%0A%0A%23%20comment%0A
+  +dir_prop: . svn:ignore build
+r12
+  +empty_dir: doc
+  +dir_prop: src/foo%20bar svn:externals -r%2020%20^/tools%4020%20tools
+r15
+  -dir_prop: src/foo%20bar svn:externals
+"""
+
+
+URL = "http://foobar/svn"
+UUID = "cfd94225-6148-4c34-bb2a-21ea3148c527"
+
+
+@pytest.fixture
+def gitRepo(tmp_path, monkeypatch):
+    for var in ("GIT_AUTHOR_NAME", "GIT_COMMITTER_NAME"):
+        monkeypatch.setenv(var, "test")
+    for var in ("GIT_AUTHOR_EMAIL", "GIT_COMMITTER_EMAIL"):
+        monkeypatch.setenv(var, "test@example.com")
+    repo = tmp_path / "repo"
+    subprocess.check_call(["git", "init", "-q", str(repo)])
+    monkeypatch.chdir(str(repo))
+    monkeypatch.setattr(cache.SvnCache, "_default", cache.SvnCache(None))
+    monkeypatch.setattr(git, "_copySources", {})
+    subprocess.check_call(["git", "config", "svn-remote.svn.url", URL])
+    subprocess.check_call(["git", "config", "--add", "svn-remote.svn.fetch", "trunk:refs/remotes/git-svn/trunk"])
+    subprocess.check_call(["git", "config", "--add", "svn-remote.svn.fetch", "branches/b:refs/remotes/git-svn/b"])
+    return str(repo)
+
+
+def gitSvnCommit(path, rev, parent=None):
+    message = "r{}\n\ngit-svn-id: {}/{}@{} {}\n".format(rev, URL, path, rev, UUID)
+    tree = subprocess.check_output(["git", "hash-object", "-t", "tree", "/dev/null"]).decode().strip()
+    cmd = ["git", "commit-tree", tree, "-m", message] + (["-p", parent] if parent else [])
+    return subprocess.check_output(cmd).decode().strip()
+
+
+def writeLog(gitRepo, ref, text):
+    logPath = unhandledlog.GetUnhandledLogPath(os.path.join(gitRepo, ".git"), ref)
+    os.makedirs(os.path.dirname(logPath))
+    with open(logPath, "wt") as f:
+        f.write(text)
+
+
+def test_externalsAt(tmp_path):
+    logPath = tmp_path / "unhandled.log"
+    logPath.write_text(LOG)
+    index = unhandledlog.ExternalsIndex(str(logPath), str(tmp_path / "index"))
+
+    assert index.ExternalsAt(9) == {}
+    assert index.ExternalsAt(12) == {".": "^/lib@100 lib\n\n# comment\n",
+                                     "src/foo bar": "-r 20 ^/tools@20 tools"}
+    assert index.ExternalsAt(20) == {".": "^/lib@100 lib\n\n# comment\n"}
+
+
+def test_incrementalUpdate(tmp_path):
+    logPath = tmp_path / "unhandled.log"
+    logPath.write_text(LOG)
+    unhandledlog.ExternalsIndex(str(logPath), str(tmp_path / "index")).update()
+
+    with open(str(logPath), "at") as f:
+        # a refetch after `git svn reset` replaces the records of r15
+        f.write("r15\nr16\n  +dir_prop: . svn:externals ^/lib%40200%20lib\nr17\n  +dir_prop: . svn:ext")
+
+    index = unhandledlog.ExternalsIndex(str(logPath), str(tmp_path / "index"))
+    assert index.offset == len(LOG)
+    assert index.ExternalsAt(16) == {".": "^/lib@200 lib",
+                                     "src/foo bar": "-r 20 ^/tools@20 tools"}
+    # the partially written last line is not parsed yet
+    assert index.ExternalsAt(17) == index.ExternalsAt(16)
+
+
+def test_svnWCFolderPath():
+    assert unhandledlog.ToSvnWCFolderPath(".") == "./"
+    assert unhandledlog.ToSvnWCFolderPath("src/foo") == "./src/foo/"
+
+
+def test_copiedBranchInheritsExternals(gitRepo):
+    trunk2 = gitSvnCommit("trunk", 2, gitSvnCommit("trunk", 1))
+    subprocess.check_call(["git", "update-ref", "refs/remotes/git-svn/trunk", gitSvnCommit("trunk", 6, trunk2)])
+    # branches/b was copied from trunk@2, git-svn only records the later property changes
+    branch4 = gitSvnCommit("branches/b", 4, trunk2)
+    branch5 = gitSvnCommit("branches/b", 5, branch4)
+    subprocess.check_call(["git", "update-ref", "refs/remotes/git-svn/b", branch5])
+
+    assert git.GetGitSvnCopySource("refs/remotes/git-svn/b", URL + "/branches/b", UUID) == (URL + "/trunk", 2)
+    assert git.GetGitSvnCopySource("refs/remotes/git-svn/trunk", URL + "/trunk", UUID) is None
+
+    writeLog(gitRepo, "refs/remotes/git-svn/b", "r4\nr5\n  -dir_prop: src svn:externals\n")
+    subprocess.check_call(["git", "checkout", "-q", branch4])
+    # without the log of the copy source, fall back to `git svn show-externals`
+    assert git.GetSvnExternalsFromUnhandledLog(URL) is None
+
+    writeLog(gitRepo, "refs/remotes/git-svn/trunk",
+             "r1\n  +dir_prop: . svn:externals ^/lib%20lib\n"
+             "r2\n  +dir_prop: src svn:externals ^/tools%20tools\n"
+             "r6\n  +dir_prop: . svn:externals ^/lib2%20lib\n")
+    externals = git.GetSvnExternalsFromUnhandledLog(URL)
+    assert [(e.svnWCFolderPath, e.url) for e in externals] == [("./", "^/lib"), ("./src/", "^/tools")]
+
+    subprocess.check_call(["git", "checkout", "-q", branch5])
+    externals = git.GetSvnExternalsFromUnhandledLog(URL)
+    assert [(e.svnWCFolderPath, e.url) for e in externals] == [("./", "^/lib")]
+
+
+def test_copySourceFromRevMap(gitRepo, monkeypatch):
+    trunk1 = gitSvnCommit("trunk", 1)
+    branch = gitSvnCommit("branches/b", 3, gitSvnCommit("branches/b", 2, trunk1))
+    subprocess.check_call(["git", "update-ref", "refs/remotes/git-svn/b", branch])
+    revmap.BuildRevMap(os.path.join(gitRepo, ".git"), "refs/remotes/git-svn/b", URL + "/branches/b")
+
+    # only the parent of the first commit of the rev_map is looked up, once
+    logged = []
+    readGitSvnIds = revmap.ReadGitSvnIds
+    monkeypatch.setattr(revmap, "ReadGitSvnIds", lambda ref: logged.append(ref) or readGitSvnIds(ref))
+    for i in range(2):
+        assert git.GetGitSvnCopySource("refs/remotes/git-svn/b", URL + "/branches/b", UUID) == (URL + "/trunk", 1)
+    assert logged == [trunk1]
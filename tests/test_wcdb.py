@@ -0,0 +1,232 @@
+import hashlib
+import os
+import sqlite3
+from git_svn import wcdb
+
+
+def createWc(root, format=31):
+    """create a minimal svn working copy database"""
+    os.makedirs(os.path.join(root, '.svn'))
+    db = sqlite3.connect(os.path.join(root, '.svn', 'wc.db'))
+    db.executescript("""
+CREATE TABLE REPOSITORY (id INTEGER PRIMARY KEY AUTOINCREMENT, root TEXT UNIQUE NOT NULL, uuid TEXT NOT NULL);
+CREATE TABLE WCROOT (id INTEGER PRIMARY KEY AUTOINCREMENT, local_abspath TEXT UNIQUE);
+CREATE TABLE NODES (wc_id INTEGER NOT NULL, local_relpath TEXT NOT NULL, op_depth INTEGER NOT NULL,
+  parent_relpath TEXT, repos_id INTEGER, repos_path TEXT, revision INTEGER, presence TEXT NOT NULL,
+  moved_here INTEGER, moved_to TEXT, kind TEXT NOT NULL, properties BLOB, depth TEXT, checksum TEXT,
+  symlink_target TEXT, changed_revision INTEGER, changed_date INTEGER, changed_author TEXT,
+  translated_size INTEGER, last_mod_time INTEGER, dav_cache BLOB, file_external INTEGER, inherited_props BLOB,
+  PRIMARY KEY (wc_id, local_relpath, op_depth));
+CREATE TABLE ACTUAL_NODE (wc_id INTEGER NOT NULL, local_relpath TEXT NOT NULL, parent_relpath TEXT,
+  properties BLOB, conflict_old TEXT, conflict_new TEXT, conflict_working TEXT, prop_reject TEXT,
+  changelist TEXT, text_mod TEXT, tree_conflict_data TEXT, conflict_data BLOB, older_checksum TEXT,
+  left_checksum TEXT, right_checksum TEXT, PRIMARY KEY (wc_id, local_relpath));
+CREATE TABLE EXTERNALS (wc_id INTEGER NOT NULL, local_relpath TEXT NOT NULL, parent_relpath TEXT NOT NULL,
+  repos_id INTEGER NOT NULL, presence TEXT NOT NULL, kind TEXT NOT NULL, def_local_relpath TEXT NOT NULL,
+  def_repos_relpath TEXT NOT NULL, def_operational_revision TEXT, def_revision TEXT,
+  PRIMARY KEY (wc_id, local_relpath));
+CREATE TABLE WORK_QUEUE (id INTEGER PRIMARY KEY AUTOINCREMENT, work BLOB NOT NULL);
+CREATE TABLE WC_LOCK (wc_id INTEGER NOT NULL, local_dir_relpath TEXT NOT NULL, locked_levels INTEGER NOT NULL DEFAULT -1,
+  PRIMARY KEY (wc_id, local_dir_relpath));
+CREATE TABLE LOCK (repos_id INTEGER NOT NULL, repos_relpath TEXT NOT NULL, lock_token TEXT NOT NULL,
+  lock_owner TEXT, lock_comment TEXT, lock_date INTEGER, PRIMARY KEY (repos_id, repos_relpath));
+INSERT INTO REPOSITORY (root, uuid) VALUES ('http://foobar/svn', 'cfd94225-6148-4c34-bb2a-21ea3148c527');
+INSERT INTO WCROOT (local_abspath) VALUES (NULL);
+""")
+    db.execute("PRAGMA user_version = {}".format(format))
+    return db
+
+
+def addNode(db, relpath, kind='dir', revision=10, op_depth=0, presence='normal', **columns):
+    values = dict(wc_id=1, local_relpath=relpath, op_depth=op_depth, repos_id=1,
+                  repos_path='trunk/' + relpath if relpath else 'trunk',
+                  parent_relpath=os.path.dirname(relpath) if relpath else None,
+                  revision=revision, presence=presence, kind=kind)
+    values.update(columns)
+    db.execute("INSERT INTO NODES ({}) VALUES ({})".format(
+        ",".join(values), ",".join("?" * len(values))), list(values.values()))
+    db.commit()
+
+
+def test_wcdbQueries(tmpdir):
+    root = str(tmpdir)
+    db = createWc(root)
+    addNode(db, '')
+    addNode(db, 'sub dir', revision=12)
+    addNode(db, 'sub dir/a.txt', kind='file')
+    addNode(db, 'added', op_depth=1, repos_id=None, repos_path=None, revision=None)
+    db.close()
+
+    sub = os.path.join(root, 'sub dir')
+    assert wcdb.FindWcRoot(sub) == root
+    assert wcdb.GetBaseRev(root) == 10
+    assert wcdb.GetBaseRev(sub) == 12
+    assert wcdb.GetReposRoot(sub) == 'http://foobar/svn'
+    assert wcdb.GetUrl(root) == 'http://foobar/svn/trunk'
+    assert wcdb.GetUrl(sub) == 'http://foobar/svn/trunk/sub%20dir'
+    assert wcdb.GetNodeKind(os.path.join(sub, 'a.txt')) == 'file'
+
+    assert wcdb.IsSvnWc(sub) is True
+    assert wcdb.IsSvnWc(os.path.join(root, 'added')) is True
+    assert wcdb.IsSvnWc(os.path.join(root, 'unversioned')) is False
+
+    # locally added nodes have no url (yet), so let svn figure it out
+    assert wcdb.GetUrl(os.path.join(root, 'added')) is None
+
+
+def test_wcdbFallback(tmpdir):
+    root = str(tmpdir)
+    assert wcdb.IsSvnWc(root) is False
+    assert wcdb.GetBaseRev(root) is None
+
+    db = createWc(root, format=99)
+    addNode(db, '')
+    db.close()
+    assert wcdb.GetBaseRev(root) is None
+    assert wcdb.IsSvnWc(root) is None
+
+
+def addFile(db, root, relpath, content, **columns):
+    path = os.path.join(root, relpath)
+    with open(path, 'wb') as f:
+        f.write(content)
+    st = os.stat(path)
+    addNode(db, relpath, kind='file', checksum='$sha1$' + hashlib.sha1(content).hexdigest(),
+            translated_size=st.st_size, last_mod_time=st.st_mtime_ns // 1000, **columns)
+    return path
+
+
+def test_isDirty(tmpdir, monkeypatch):
+    root = str(tmpdir)
+    db = createWc(root)
+    addNode(db, '')
+    os.mkdir(os.path.join(root, 'sub'))
+    addNode(db, 'sub')
+    a = addFile(db, root, 'sub/a.txt', b'hello')
+    b = addFile(db, root, 'b.txt', b'world', properties=b'(svn:eol-style 6 native)')
+    monkeypatch.setattr(wcdb, '_CHUNK_SIZE', 1)
+
+    assert wcdb.IsDirty(root) is False
+
+    # touched, but unchanged content
+    os.utime(a, (0, 0))
+    assert wcdb.IsDirty(root) is False
+
+    # same size, other content
+    with open(a, 'wb') as f:
+        f.write(b'HELLO')
+    assert wcdb.IsDirty(root) is True
+    assert wcdb.IsDirty(os.path.join(root, 'sub')) is True
+    assert wcdb.IsDirty(b) is False
+
+    # eol translated files need svn
+    os.utime(b, (0, 0))
+    assert wcdb.IsDirty(b) is None
+
+    os.remove(b)
+    assert wcdb.IsDirty(b) is True
+
+
+def test_isDirtyStructuralChanges(tmpdir):
+    root = str(tmpdir)
+    db = createWc(root)
+    addNode(db, '')
+    os.mkdir(os.path.join(root, 'sub'))
+    addNode(db, 'sub', repos_path='branches/other/sub')
+    assert wcdb.IsDirty(root) is True
+    assert wcdb.IsDirty(os.path.join(root, 'sub')) is False
+
+    db.execute("UPDATE NODES SET repos_path = 'trunk/sub' WHERE local_relpath = 'sub'")
+    db.commit()
+    assert wcdb.IsDirty(root) is False
+
+    addNode(db, 'added', op_depth=1, repos_id=None, repos_path=None, revision=None)
+    assert wcdb.IsDirty(root) is True
+    assert wcdb.IsDirty(os.path.join(root, 'sub')) is False
+
+    db.execute("INSERT INTO WORK_QUEUE (work) VALUES ('x')")
+    db.commit()
+    assert wcdb.IsDirty(root) is None
+
+
+def test_isDirtyProperties(tmpdir):
+    root = str(tmpdir)
+    db = createWc(root)
+    addNode(db, '', properties=b'(svn:ignore 3 *.o svn:eol-style 6 native)')
+
+    # a propset back to the pristine value, with the properties in another order
+    db.execute("INSERT INTO ACTUAL_NODE (wc_id, local_relpath, properties) VALUES (1, '', ?)",
+               (b'(svn:eol-style 6 native svn:ignore 3 *.o)',))
+    db.commit()
+    assert wcdb.IsDirty(root) is False
+
+    db.execute("UPDATE ACTUAL_NODE SET properties = ?", (b'(svn:eol-style 6 native svn:ignore 3 *.a)',))
+    db.commit()
+    assert wcdb.IsDirty(root) is True
+
+    db.execute("UPDATE ACTUAL_NODE SET properties = ?", (b'(svn:ignore 3 *.o svn:eol-style 6 native)',))
+    db.commit()
+    assert wcdb.IsDirty(root) is False
+
+    db.execute("UPDATE ACTUAL_NODE SET properties = ?", (b'(svn:ignore 3 *.o',))
+    db.commit()
+    assert wcdb.IsDirty(root) is None
+
+
+def test_isDirtyWithExternals(tmpdir):
+    root = str(tmpdir)
+    db = createWc(root)
+    addNode(db, '')
+    os.mkdir(os.path.join(root, 'sub'))
+    addNode(db, 'sub')
+    assert wcdb.IsDirty(root) is False
+
+    # the modifications inside a dir external are only known to svn status
+    db.execute("""INSERT INTO EXTERNALS (wc_id, local_relpath, parent_relpath, repos_id, presence, kind,
+                  def_local_relpath, def_repos_relpath) VALUES (1, 'sub/ext', 'sub', 1, 'normal', 'dir', 'sub', 'lib')""")
+    db.commit()
+    assert wcdb.IsDirty(root) is None
+    assert wcdb.IsDirty(os.path.join(root, 'sub')) is None
+    db.execute("DELETE FROM EXTERNALS")
+    db.commit()
+
+    # so are the ones of a file external
+    addFile(db, root, 'file.txt', b'external', file_external=1)
+    assert wcdb.IsDirty(root) is None
+    assert wcdb.IsDirty(os.path.join(root, 'sub')) is False
+
+
+def test_getDirProperties(tmpdir):
+    root = str(tmpdir)
+    db = createWc(root)
+    addNode(db, '', properties=b'(svn:ignore 10 *.o\nbuild\n svn:externals 12 ^/lib@10 lib)')
+    addNode(db, 'sub', properties=b'(svn:mergeinfo 0 )')
+    addNode(db, 'sub/deep', properties=b'(svn:externals 11 ^/tools bin)')
+    addNode(db, 'gone', properties=b'(svn:ignore 1 x)')
+    addNode(db, 'gone', op_depth=1, presence='base-deleted')
+    db.execute("INSERT INTO ACTUAL_NODE (wc_id, local_relpath, properties) VALUES (1, 'sub', ?)",
+               (b'(svn:ignore 4 *.so)',))
+    db.commit()
+    db.close()
+
+    assert wcdb.GetDirProperties(root) == [
+        ('', {'svn:ignore': '*.o\nbuild\n', 'svn:externals': '^/lib@10 lib'}),
+        ('sub', {'svn:ignore': '*.so'}),
+        ('sub/deep', {'svn:externals': '^/tools bin'})]
+    assert wcdb.GetDirProperties(os.path.join(root, 'sub'), names=('svn:externals',)) == [
+        ('deep', {'svn:externals': '^/tools bin'})]
+
+
+def test_iterSvnExternalsFromLocalSvnWc(tmpdir, monkeypatch):
+    from git_svn import svn
+    root = str(tmpdir)
+    db = createWc(root)
+    addNode(db, '', properties=b'(svn:externals 26 ^/lib@10 lib\n\n^/doc@3 doc\n)')
+    addNode(db, 'sub', properties=b'(svn:externals 11 ^/tools bin)')
+    db.close()
+
+    monkeypatch.chdir(root)
+    externals = svn.IterSvnExternalsFromLocalSvnWc()
+    first = next(externals)
+    assert (first.svnWCFolderPath, first.path) == ('.', 'lib')
+    assert [(e.svnWCFolderPath, e.path) for e in externals] == [('.', 'doc'), ('sub', 'bin')]